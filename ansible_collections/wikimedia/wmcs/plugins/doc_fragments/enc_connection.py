@@ -0,0 +1,105 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    DOCUMENTATION = r'''
+options:
+  enc_pool_maxsize:
+    description:
+      - Maximum number of connections to keep open to the enc service.
+    required: false
+    type: int
+    default: 10
+  enc_keep_alive:
+    description:
+      - Reuse the connections to the enc service between requests.
+    required: false
+    type: bool
+    default: true
+  enc_connect_timeout:
+    description:
+      - Seconds to wait for the connection to the enc service to be established.
+    required: false
+    type: float
+    default: 10
+  enc_read_timeout:
+    description:
+      - Seconds to wait for the enc service to send a response.
+    required: false
+    type: float
+    default: 60
+  enc_cache_dir:
+    description:
+      - Directory to cache the enc responses in, on the host running the
+        module. Disabled if not set.
+      - Entries are revalidated with the enc using conditional requests once
+        they are older than I(enc_cache_ttl), and the ones related to a prefix
+        are dropped whenever its hiera is updated.
+    required: false
+    type: path
+  enc_cache_ttl:
+    description:
+      - Seconds a cached enc response is used without revalidating it.
+    required: false
+    type: int
+    default: 300
+  enc_cache_max_entries:
+    description:
+      - Maximum number of responses to keep in the cache, the least recently
+        used ones are removed first.
+    required: false
+    type: int
+    default: 1000
+  enc_retries:
+    description:
+      - Times to retry the read requests to the enc on connection errors or
+        429/5xx responses, waiting a jittered exponential backoff between
+        them. Updates are never retried.
+    required: false
+    type: int
+    default: 3
+  enc_backoff_factor:
+    description:
+      - Base seconds for the backoff between retries, the wait before the
+        retry number N is a random time between 0 and
+        I(enc_backoff_factor) * 2^N.
+    required: false
+    type: float
+    default: 0.5
+  enc_max_backoff:
+    description:
+      - Maximum seconds to wait between retries, for both the backoff and the
+        Retry-After header sent by the enc.
+    required: false
+    type: float
+    default: 30
+  enc_circuit_breaker_threshold:
+    description:
+      - Number of consecutive failed requests to the enc after which any new
+        request will fail right away, without contacting it, for
+        I(enc_circuit_breaker_reset) seconds. Set to 0 to disable.
+    required: false
+    type: int
+    default: 5
+  enc_circuit_breaker_reset:
+    description:
+      - Seconds to wait before trying to contact the enc again after the
+        circuit breaker opened.
+    required: false
+    type: float
+    default: 30
+'''
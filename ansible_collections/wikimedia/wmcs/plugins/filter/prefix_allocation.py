@@ -0,0 +1,83 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import re
+
+from ansible.errors import AnsibleFilterError
+
+# openstack.cloud.server_info hides the project name in the returned data
+MASKED_PROJECT = "********"
+
+
+def prefix_allocation(servers, prefix, project=None, count=1):
+    """
+    Index the given openstack servers (as returned by
+    openstack.cloud.server_info) named <prefix>-<number> in a single pass.
+
+    Returns a dict with:
+    * indices(list[int]): sorted numeric suffixes of the existing servers.
+    * last_instance(str): name of the server with the highest suffix.
+    * template(dict): that same server, to copy the image, flavor... from.
+    * next_index(int): first suffix after the highest one.
+    * next_names(list[str]): count names for new servers, starting at
+        next_index.
+    * gaps(list[int]): missing suffixes between the lowest and the highest.
+
+    The numbers are compared as numbers, so <prefix>-10 comes after
+    <prefix>-9. If project is passed, it's used to unmask the server names.
+    Servers not matching the prefix (ex. <prefix>-proxy-1) are ignored.
+    """
+    if count < 1:
+        raise AnsibleFilterError(f"prefix_allocation count must be at least 1, got {count}")
+
+    name_regex = re.compile(rf"^{re.escape(prefix)}-(\d+)$")
+    indices = []
+    template = None
+    last_index = None
+    last_instance = None
+    for server in servers:
+        name = server["name"]
+        if project is not None:
+            name = name.replace(MASKED_PROJECT, project)
+
+        match = name_regex.match(name)
+        if not match:
+            continue
+
+        index = int(match.group(1))
+        indices.append(index)
+        if last_index is None or index > last_index:
+            last_index = index
+            last_instance = name
+            template = server
+
+    indices.sort()
+    next_index = (last_index or 0) + 1
+    existing = set(indices)
+    gaps = [index for index in range(indices[0], last_index) if index not in existing] if indices else []
+    return {
+        "indices": indices,
+        "last_instance": last_instance,
+        "template": template,
+        "next_index": next_index,
+        "next_names": [f"{prefix}-{next_index + offset}" for offset in range(count)],
+        "gaps": gaps,
+    }
+
+
+class FilterModule:
+    def filters(self):
+        return {
+            "prefix_allocation": prefix_allocation,
+        }
@@ -0,0 +1,261 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = '''
+---
+author:
+  - David Caro (@david-caro)
+name: enc
+short_description: Build an inventory from the puppet enc
+description:
+  - Build an inventory from the prefixes and nodes configured in the puppet
+    enc of an openstack project.
+  - Every prefix in the enc that is an fqdn (node specific configuration) is
+    added as a host, along with any host passed in I(hosts).
+  - Each host is added to a group per puppet role (C(role_<role name>)) and
+    per matching prefix (C(prefix_<prefix>)), and gets the merged project,
+    prefix and node hiera in the C(enc_hiera) variable, and the roles in
+    C(enc_roles), that can be used with I(keyed_groups), I(groups) and
+    I(compose) to build more groups and variables.
+  - All the prefixes are fetched concurrently over a pooled connection, the
+    ones that are not found (ex. removed while building the inventory) are
+    skipped with a warning. When
+    I(enc_cache_dir) is set, the responses are stored there and revalidated
+    with conditional requests, so only the prefixes that changed since the
+    previous run are downloaded again.
+  - The configuration file name must end in C(enc.yml) or C(enc.yaml).
+extends_documentation_fragment:
+  - constructed
+  - inventory_cache
+options:
+  plugin:
+    description: Name of the plugin.
+    required: true
+    type: str
+    choices:
+      - wikimedia.wmcs.enc
+  enc_url:
+    description: Base url to the enc service
+    required: true
+    type: str
+  openstack_project:
+    description: Openstack project to get the inventory for
+    required: true
+    type: str
+  hosts:
+    description:
+      - Extra hosts (fqdns) to add to the inventory, even if they don't have
+        node specific configuration in the enc.
+    required: false
+    type: list
+    elements: str
+    default: []
+  max_workers:
+    description: Maximum number of requests to do at the same time to the enc.
+    required: false
+    type: int
+    default: 10
+  enc_connect_timeout:
+    description: Seconds to wait for the connection to the enc service to be established.
+    required: false
+    type: float
+    default: 10
+  enc_read_timeout:
+    description: Seconds to wait for the enc service to send a response.
+    required: false
+    type: float
+    default: 60
+  enc_cache_dir:
+    description:
+      - Directory to store the enc responses in, to revalidate them instead of
+        downloading them again on the next runs. Disabled if not set.
+    required: false
+    type: path
+  enc_cache_ttl:
+    description:
+      - Seconds a stored enc response is used without revalidating it.
+    required: false
+    type: int
+    default: 0
+  enc_cache_max_entries:
+    description:
+      - Maximum number of responses to keep in I(enc_cache_dir).
+    required: false
+    type: int
+    default: 1000
+'''
+
+EXAMPLES = '''
+# toolsbeta.enc.yml
+plugin: wikimedia.wmcs.enc
+enc_url: http://cloud-puppetmaster-03.cloudinfra.eqiad1.wikimedia.cloud:8101/v1
+openstack_project: toolsbeta
+enc_cache_dir: ~/.cache/wmcs-enc
+hosts:
+  - toolsbeta-test-k8s-etcd-4.toolsbeta.eqiad1.wikimedia.cloud
+keyed_groups:
+  - key: enc_hiera['profile::toolforge::k8s::etcd_nodes'] | default([]) | length > 0
+    prefix: has_etcd_nodes
+compose:
+  etcd_nodes: enc_hiera['profile::toolforge::k8s::etcd_nodes'] | default([])
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+
+from ansible.errors import AnsibleError
+from ansible.plugins.inventory import BaseInventoryPlugin, Cacheable, Constructable
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_cache import EncCache
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import (
+    EncConnection,
+    EncError,
+    EncNotFoundError,
+    parse_enc_response,
+)
+
+
+class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
+
+    NAME = 'wikimedia.wmcs.enc'
+
+    def verify_file(self, path):
+        return super().verify_file(path) and path.endswith(("enc.yml", "enc.yaml"))
+
+    def _get_connection(self):
+        cache = None
+        if self.get_option("enc_cache_dir"):
+            cache = EncCache(
+                cache_dir=self.get_option("enc_cache_dir"),
+                enc_url=self.get_option("enc_url"),
+                openstack_project=self.get_option("openstack_project"),
+                ttl=self.get_option("enc_cache_ttl"),
+                max_entries=self.get_option("enc_cache_max_entries"),
+            )
+
+        return EncConnection(
+            enc_url=self.get_option("enc_url"),
+            openstack_project=self.get_option("openstack_project"),
+            pool_maxsize=self.get_option("max_workers"),
+            connect_timeout=self.get_option("enc_connect_timeout"),
+            read_timeout=self.get_option("enc_read_timeout"),
+            cache=cache,
+        )
+
+    @staticmethod
+    def _get_prefix_data(conn, prefix):
+        hiera_data, _ = parse_enc_response(conn.get_prefix_hiera(prefix=prefix), nested_hiera=True)
+        roles_data, _ = parse_enc_response(conn.get_prefix_roles(prefix=prefix))
+        return {
+            "hiera": hiera_data.get("hiera") or {},
+            "roles": roles_data.get("roles") or [],
+        }
+
+    def _fetch_enc_data(self):
+        conn = self._get_connection()
+        try:
+            prefixes_data, _ = parse_enc_response(conn.list_prefixes())
+            project_data, _ = parse_enc_response(conn.get_project_hiera(), nested_hiera=True)
+            prefixes = [
+                prefix for prefix in (prefixes_data.get("prefixes") or [])
+                if prefix.strip()
+            ]
+            with ThreadPoolExecutor(max_workers=self.get_option("max_workers")) as executor:
+                futures = {
+                    prefix: executor.submit(self._get_prefix_data, conn=conn, prefix=prefix)
+                    for prefix in prefixes
+                }
+                prefixes_info = {}
+                for prefix, future in futures.items():
+                    try:
+                        prefixes_info[prefix] = future.result()
+                    except EncNotFoundError as error:
+                        # removed after listing them, don't break the whole inventory
+                        self.display.warning(f"Skipping the enc prefix {prefix}, it does not exist: {error}")
+
+        except EncError as error:
+            raise AnsibleError(f"Unable to retrieve the enc data: {error}")
+
+        return {
+            "project_hiera": project_data.get("hiera") or {},
+            "prefixes": prefixes_info,
+        }
+
+    def _populate(self, enc_data):
+        prefixes = enc_data["prefixes"]
+        # The enc treats the node specific config as a prefix with the fqdn as name
+        hosts = set(self.get_option("hosts"))
+        hosts.update(prefix for prefix in prefixes if "." in prefix)
+        # shortest (more generic) first, so the most specific ones override
+        # their hiera
+        plain_prefixes = sorted(
+            (prefix for prefix in prefixes if "." not in prefix),
+            key=len,
+        )
+
+        strict = self.get_option("strict")
+        for host in sorted(hosts):
+            hostname = host.split(".", 1)[0]
+            host_prefixes = [prefix for prefix in plain_prefixes if hostname.startswith(prefix)]
+            if host in prefixes:
+                host_prefixes.append(host)
+
+            hiera = dict(enc_data["project_hiera"])
+            roles = []
+            for prefix in host_prefixes:
+                hiera.update(prefixes[prefix]["hiera"])
+                roles.extend(role for role in prefixes[prefix]["roles"] if role not in roles)
+
+            self.inventory.add_host(host)
+            hostvars = {
+                "enc_hiera": hiera,
+                "enc_roles": roles,
+                "enc_prefixes": host_prefixes,
+            }
+            for var_name, var_value in hostvars.items():
+                self.inventory.set_variable(host, var_name, var_value)
+
+            for group_name in (
+                [f"role_{role}" for role in roles]
+                + [f"prefix_{prefix}" for prefix in host_prefixes if prefix != host]
+            ):
+                group = self.inventory.add_group(self._sanitize_group_name(group_name))
+                self.inventory.add_child(group, host)
+
+            self._set_composite_vars(self.get_option("compose"), hostvars, host, strict=strict)
+            self._add_host_to_composed_groups(self.get_option("groups"), hostvars, host, strict=strict)
+            self._add_host_to_keyed_groups(self.get_option("keyed_groups"), hostvars, host, strict=strict)
+
+    def parse(self, inventory, loader, path, cache=True):
+        super().parse(inventory, loader, path, cache=cache)
+        self._read_config_data(path)
+
+        cache_key = self.get_cache_key(path)
+        user_cache_setting = self.get_option("cache")
+        attempt_to_read_cache = user_cache_setting and cache
+        cache_needs_update = user_cache_setting and not cache
+
+        enc_data = None
+        if attempt_to_read_cache:
+            try:
+                enc_data = self._cache[cache_key]
+            except KeyError:
+                cache_needs_update = True
+
+        if enc_data is None:
+            enc_data = self._fetch_enc_data()
+
+        if cache_needs_update:
+            self._cache[cache_key] = enc_data
+
+        self._populate(enc_data)
@@ -0,0 +1,165 @@
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = '''
+---
+author:
+  - David Caro (@david-caro)
+name: enc_hiera
+short_description: Get hiera values from the puppet enc
+description:
+  - Get the values for the given hiera keys of a prefix (or the whole
+    openstack project) directly from the puppet enc, on the controller.
+  - The hiera of each prefix is retrieved only once per playbook run, and
+    reused for any later lookups of that same prefix.
+options:
+  _terms:
+    description: Hiera keys to get the values of.
+    required: false
+    type: list
+    elements: str
+  key:
+    description: Hiera key to get the value of, alternative to passing it as term.
+    required: false
+    type: str
+  enc_url:
+    description: Base url to the enc service
+    required: true
+    type: str
+  openstack_project:
+    description: Openstack project to get the hiera for
+    required: true
+    type: str
+  prefix:
+    description:
+      - Project specific prefix to get the hiera for, if not passed the
+        project wide hiera is used.
+    required: false
+    type: str
+  default:
+    description:
+      - Value to return for the keys that are not set (or if the prefix does
+        not exist), if not passed, missing keys are an error.
+    required: false
+    type: raw
+'''
+
+EXAMPLES = '''
+- name: Show the etcd nodes
+  debug:
+    msg: >-
+      {{
+        lookup(
+          'wikimedia.wmcs.enc_hiera',
+          'profile::toolforge::k8s::etcd_nodes',
+          enc_url=enc_url,
+          openstack_project=openstack_project,
+          prefix=toolforge_etcd_prefix,
+          default=[],
+        )
+      }}
+'''
+
+RETURN = '''
+_raw:
+  description: Values of the requested hiera keys.
+  type: list
+  elements: raw
+'''
+
+import os
+
+from ansible import constants as C
+from ansible.errors import AnsibleError, AnsibleLookupError
+from ansible.plugins.lookup import LookupBase
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_cache import EncCache
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import (
+    EncConnection,
+    EncError,
+    EncNotFoundError,
+    parse_enc_response,
+)
+
+# Lookups are run in the forked workers, so on top of this in-process memo the
+# responses are stored in the run specific ansible local tmp dir, that is
+# shared by all the workers of the run and removed when it ends.
+_HIERA_MEMO = {}
+_RUN_CACHE_TTL = 60 * 60 * 24 * 365
+
+
+class LookupModule(LookupBase):
+
+    def _get_hiera(self, enc_url, openstack_project, prefix):
+        memo_key = (enc_url, openstack_project, prefix)
+        if memo_key not in _HIERA_MEMO:
+            conn = EncConnection(
+                enc_url=enc_url,
+                openstack_project=openstack_project,
+                cache=EncCache(
+                    cache_dir=os.path.join(C.DEFAULT_LOCAL_TMP, "wikimedia.wmcs.enc_hiera"),
+                    enc_url=enc_url,
+                    openstack_project=openstack_project,
+                    ttl=_RUN_CACHE_TTL,
+                ),
+            )
+            try:
+                if prefix:
+                    response = conn.get_prefix_hiera(prefix=prefix)
+                else:
+                    response = conn.get_project_hiera()
+                data, _ = parse_enc_response(response, nested_hiera=True)
+            except EncNotFoundError:
+                # not memoized, the prefix might be created later in the run
+                raise
+            except EncError as error:
+                raise AnsibleError(str(error))
+
+            _HIERA_MEMO[memo_key] = data["hiera"] or {}
+
+        return _HIERA_MEMO[memo_key]
+
+    def run(self, terms, variables=None, **kwargs):
+        self.set_options(var_options=variables, direct=kwargs)
+
+        keys = list(terms)
+        if self.get_option("key"):
+            keys.append(self.get_option("key"))
+        if not keys:
+            raise AnsibleLookupError("At least one hiera key must be passed.")
+
+        try:
+            hiera = self._get_hiera(
+                enc_url=self.get_option("enc_url"),
+                openstack_project=self.get_option("openstack_project"),
+                prefix=self.get_option("prefix"),
+            )
+        except EncNotFoundError as error:
+            if "default" not in kwargs:
+                raise AnsibleLookupError(str(error))
+            hiera = {}
+
+        values = []
+        for key in keys:
+            if key in hiera:
+                values.append(hiera[key])
+            elif "default" in kwargs:
+                values.append(self.get_option("default"))
+            else:
+                raise AnsibleLookupError(
+                    f"Hiera key {key} not found for prefix '{self.get_option('prefix')}' "
+                    f"in openstack project {self.get_option('openstack_project')}"
+                )
+
+        return values
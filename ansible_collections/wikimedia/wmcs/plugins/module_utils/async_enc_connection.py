@@ -0,0 +1,246 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import asyncio
+import time
+
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import (
+    DEFAULT_BACKOFF_FACTOR,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_MAX_BACKOFF,
+    DEFAULT_READ_TIMEOUT,
+    DEFAULT_RETRIES,
+    RETRYABLE_STATUSES,
+    EncError,
+    EncStats,
+    get_circuit_breaker,
+    get_retry_delay,
+)
+
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+DEFAULT_MAX_CONCURRENCY = 20
+
+
+class AsyncEncConnection:
+    """
+    Asyncio sibling of EncConnection, meant to fetch lots of prefixes/nodes at
+    once without having a thread per request.
+
+    It needs the aiohttp python library, that is not installed by default.
+
+    It retries the same way as EncConnection, and shares with it the circuit
+    breaker for the same enc_url. As the aiohttp responses can't be used once
+    the connection has been released, the methods return the body of the
+    response as a string instead of the response itself.
+
+    Use it as an async context manager so the underlying session gets closed:
+
+        async with AsyncEncConnection(enc_url, project) as conn:
+            results = await asyncio.gather(
+                *(conn.get_prefix_hiera(prefix) for prefix in prefixes)
+            )
+    """
+    def __init__(
+        self,
+        enc_url,
+        openstack_project,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        retries=DEFAULT_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        deadline=None,
+        circuit_breaker=None,
+        max_backoff=DEFAULT_MAX_BACKOFF,
+    ):
+        if not HAS_AIOHTTP:
+            raise EncError("The aiohttp python library is needed to use AsyncEncConnection")
+
+        self.enc_url = enc_url
+        self.openstack_project = openstack_project
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        # the deadline covers the whole request, including all the retries
+        self.deadline = deadline
+        self.stats = EncStats()
+        self.circuit_breaker = circuit_breaker or get_circuit_breaker(enc_url=enc_url)
+        self.timeout = aiohttp.ClientTimeout(
+            sock_connect=connect_timeout, sock_read=read_timeout
+        )
+        self._max_concurrency = max_concurrency
+        self._semaphore = None
+        self._session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        if self._session is None:
+            # The enc is a single host, so the semaphore effectively limits the
+            # concurrent requests per host, the connector limit just makes sure
+            # we don't open more connections than that.
+            # Created here so they are bound to the running loop.
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self._max_concurrency),
+                timeout=self.timeout,
+            )
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _do_request(self, method, url, retry, data=None):
+        """
+        Same as EncConnection._request, but returning the status and the body.
+        """
+        await self.open()
+        attempt = 0
+        while True:
+            if self.circuit_breaker.is_open():
+                raise EncError(
+                    f"Too many consecutive errors contacting the enc at {self.enc_url}, "
+                    f"not trying again for {self.circuit_breaker.reset}s"
+                )
+
+            error = None
+            status = None
+            headers = None
+            text = None
+            start = time.perf_counter()
+            try:
+                async with self._semaphore:
+                    async with self._session.request(method, url, data=data) as response:
+                        status = response.status
+                        headers = response.headers
+                        text = await response.text()
+            except aiohttp.ClientError as request_error:
+                error = request_error
+
+            failed = error is not None or status in RETRYABLE_STATUSES
+            self.stats.record_request(latency=time.perf_counter() - start, failed=failed)
+            if not failed:
+                self.circuit_breaker.record_success()
+                return status, text
+
+            self.circuit_breaker.record_failure()
+            if not retry or attempt >= self.retries:
+                if error is not None:
+                    raise EncError(f"Error contacting the enc at {url}: {error}")
+                return status, text
+
+            await asyncio.sleep(get_retry_delay(
+                attempt=attempt,
+                backoff_factor=self.backoff_factor,
+                retry_after=headers.get("Retry-After") if headers is not None else None,
+                max_backoff=self.max_backoff,
+            ))
+            attempt += 1
+            self.stats.record_retry()
+
+    async def _request(self, method, url, retry=True, data=None, error_msg=""):
+        try:
+            status, text = await asyncio.wait_for(
+                self._do_request(method=method, url=url, retry=retry, data=data),
+                timeout=self.deadline,
+            )
+        except asyncio.TimeoutError:
+            raise EncError(f"{error_msg}\nDeadline of {self.deadline}s exceeded")
+        except EncError as error:
+            raise EncError(f"{error_msg}\n{error}")
+
+        if status >= 400:
+            raise EncError(f"{error_msg}\n<Response [{status}]>")
+
+        return text
+
+    async def get_project_hiera(self) -> str:
+        # the api expects an empty space as prefix to get the global openstack_project
+        # data
+        return await self.get_prefix_hiera(prefix=" ")
+
+    async def get_prefix_hiera(self, prefix: str) -> str:
+        return await self._request(
+            method="GET",
+            url="{0}/{1}/prefix/{2}/hiera".format(
+                self.enc_url,
+                self.openstack_project,
+                prefix,
+            ),
+            error_msg=(
+                f"Unable to get prefix data for "
+                f"enc_url='{self.enc_url}', "
+                f"prefix='{prefix}', "
+                f"openstack_project='{self.openstack_project}'"
+            ),
+        )
+
+    async def set_prefix_hiera(self, prefix: str, data: str) -> str:
+        # not retried, we can't know if a failed post was applied or not
+        return await self._request(
+            method="POST",
+            url="{0}/{1}/prefix/{2}/hiera".format(
+                self.enc_url,
+                self.openstack_project,
+                prefix,
+            ),
+            retry=False,
+            data=data,
+            error_msg=(
+                f"Unable to set prefix data for "
+                f"enc_url='{self.enc_url}', "
+                f"prefix='{prefix}', "
+                f"openstack_project='{self.openstack_project}'"
+            ),
+        )
+
+    async def get_node_consolidated_info(self, fqdn: str) -> str:
+        """
+        This gives the results of applying all the openstack_project + prefix + node
+        configs, ready to be used by puppet.
+        """
+        return await self._request(
+            method="GET",
+            url="{0}/{1}/node/{2}".format(
+                self.enc_url,
+                self.openstack_project,
+                fqdn,
+            ),
+            error_msg=(
+                f"Unable to get node info data for "
+                f"enc_url='{self.enc_url}', "
+                f"fqdn='{fqdn}', "
+                f"openstack_project='{self.openstack_project}'"
+            ),
+        )
+
+    async def get_node_info(self, fqdn: str) -> str:
+        """
+        This gives only the specific hiera for the host, that will override
+        the ones for the prefix and openstack_project.
+        """
+        # Yep, we treat the hostname as a prefix itself
+        return await self._request(
+            method="GET",
+            url="{0}/{1}/prefix/{2}".format(
+                self.enc_url,
+                self.openstack_project,
+                fqdn,
+            ),
+            error_msg=(
+                f"Unable to get node info data for "
+                f"enc_url='{self.enc_url}', "
+                f"fqdn='{fqdn}', "
+                f"openstack_project='{self.openstack_project}'"
+            ),
+        )
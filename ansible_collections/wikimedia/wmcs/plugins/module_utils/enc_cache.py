@@ -0,0 +1,188 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+import requests
+
+DEFAULT_CACHE_TTL = 300
+DEFAULT_CACHE_MAX_ENTRIES = 1000
+# the cache dir might be shared with other files (ex. ~/.cache), only
+# these are ours
+PROJECT_DIR_REGEX = re.compile(r"^[0-9a-f]{40}$")
+ENTRY_FILE_REGEX = re.compile(r"^[a-z_]+-[0-9a-f]{40}\.json$")
+
+
+def _hash(value: str) -> str:
+    return hashlib.sha1(value.encode("utf-8")).hexdigest()
+
+
+class EncCache:
+    """
+    Simple on-disk cache for the enc responses.
+
+    Each entry is a json file under:
+        <cache_dir>/<hash(enc_url + openstack_project)>/<kind>-<hash(name)>.json
+
+    The entries are considered fresh for ttl seconds since they were stored (or
+    last revalidated), after that they are revalidated with a conditional
+    request if the enc sent an ETag or Last-Modified header, or fetched again
+    otherwise.
+
+    The mtime of the file is bumped on every hit, so when there's more than
+    max_entries in the whole cache dir the least recently used ones get
+    removed. Only the files following the layout above are counted and
+    removed, anything else in cache_dir is left alone.
+    """
+    def __init__(
+        self,
+        cache_dir,
+        enc_url,
+        openstack_project,
+        ttl=DEFAULT_CACHE_TTL,
+        max_entries=DEFAULT_CACHE_MAX_ENTRIES,
+    ):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.project_dir = os.path.join(
+            self.cache_dir, _hash(f"{enc_url} {openstack_project}")
+        )
+
+    def _entry_path(self, kind: str, name: str) -> str:
+        return os.path.join(self.project_dir, f"{kind}-{_hash(name)}.json")
+
+    def get(self, kind: str, name: str):
+        path = self._entry_path(kind=kind, name=name)
+        try:
+            with open(path) as entry_fd:
+                entry = json.load(entry_fd)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return entry
+
+    def is_fresh(self, entry) -> bool:
+        return time.time() - entry["stored_at"] < self.ttl
+
+    @staticmethod
+    def get_conditional_headers(entry):
+        headers = {}
+        if not entry:
+            return headers
+
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+        return headers
+
+    def put(self, kind: str, name: str, response: requests.Response):
+        entry = {
+            "url": response.url,
+            "stored_at": time.time(),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content": response.content.decode("utf-8"),
+        }
+        self._write(path=self._entry_path(kind=kind, name=name), entry=entry)
+        self._evict()
+        return entry
+
+    def touch(self, kind: str, name: str, entry):
+        """Mark the entry as fresh again, used when the enc replies 304."""
+        entry["stored_at"] = time.time()
+        self._write(path=self._entry_path(kind=kind, name=name), entry=entry)
+
+    def invalidate(self, kind: str, name: str = None):
+        """Remove the given entry, or all the entries of that kind if no name is passed."""
+        if name is not None:
+            paths = [self._entry_path(kind=kind, name=name)]
+        elif os.path.isdir(self.project_dir):
+            paths = [
+                os.path.join(self.project_dir, file_name)
+                for file_name in os.listdir(self.project_dir)
+                if file_name.startswith(f"{kind}-")
+            ]
+        else:
+            paths = []
+
+        for path in paths:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def to_response(entry) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry["url"]
+        response.encoding = "utf-8"
+        response._content = entry["content"].encode("utf-8")
+        return response
+
+    def _write(self, path: str, entry):
+        os.makedirs(self.project_dir, exist_ok=True)
+        # write + rename so concurrent readers never see half written entries
+        fd, tmp_path = tempfile.mkstemp(dir=self.project_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as entry_fd:
+                json.dump(entry, entry_fd)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def _get_entry_paths(self):
+        try:
+            project_dirs = [
+                os.path.join(self.cache_dir, dir_name)
+                for dir_name in os.listdir(self.cache_dir)
+                if PROJECT_DIR_REGEX.match(dir_name)
+            ]
+        except FileNotFoundError:
+            return []
+
+        paths = []
+        for project_dir in project_dirs:
+            try:
+                file_names = os.listdir(project_dir)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+            paths.extend(
+                os.path.join(project_dir, file_name)
+                for file_name in file_names
+                if ENTRY_FILE_REGEX.match(file_name)
+            )
+
+        return paths
+
+    def _evict(self):
+        entries = []
+        for path in self._get_entry_paths():
+            try:
+                entries.append((os.stat(path).st_mtime, path))
+            except FileNotFoundError:
+                pass
+
+        if len(entries) <= self.max_entries:
+            return
+
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_entries]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
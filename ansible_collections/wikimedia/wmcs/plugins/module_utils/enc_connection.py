@@ -1,30 +1,441 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
+import random
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from ansible_collections.wikimedia.wmcs.plugins.module_utils import yaml_utils
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_cache import (
+    DEFAULT_CACHE_MAX_ENTRIES,
+    DEFAULT_CACHE_TTL,
+    EncCache,
+)
+
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 60
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_MAX_BACKOFF = 30
+DEFAULT_CIRCUIT_BREAKER_THRESHOLD = 5
+DEFAULT_CIRCUIT_BREAKER_RESET = 30
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+# Sessions are shared per (enc_url, pool size, keep alive) so every
+# EncConnection in the same process reuses the already open connections instead
+# of doing a new TCP/TLS handshake per request.
+_SESSIONS = {}
+# Same for the circuit breakers, so all the connections to the same enc (ex.
+# the threads of a bulk module) stop as soon as it's detected as broken.
+_CIRCUIT_BREAKERS = {}
 
 
 class EncError(Exception):
     pass
 
 
+class EncNotFoundError(EncError):
+    pass
+
+
+# the request never reached the enc (ex. the circuit breaker is open), so
+# even a POST can't have been applied
+class EncRequestNotSentError(EncError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Fail fast after threshold consecutive failed requests, until reset
+    seconds have passed, then let a single trial request through (half
+    open), the rest keep failing fast until it succeeds, closing the
+    breaker, or fails, opening it again right away.
+    """
+    def __init__(self, threshold=DEFAULT_CIRCUIT_BREAKER_THRESHOLD, reset=DEFAULT_CIRCUIT_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset = reset
+        self.consecutive_failures = 0
+        self.opened_at = None
+        # when the half open trial request was let through, if any
+        self.trial_started_at = None
+        self._lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return False
+
+            now = time.monotonic()
+            if self.trial_started_at is not None:
+                # in case the trial request never reported back
+                if now - self.trial_started_at < self.reset:
+                    return True
+            elif now - self.opened_at < self.reset:
+                return True
+
+            self.trial_started_at = now
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_started_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.trial_started_at is not None or (
+                self.threshold and self.consecutive_failures >= self.threshold
+            ):
+                self.opened_at = time.monotonic()
+                self.trial_started_at = None
+
+
+class EncStats:
+    """Counters for the requests done to the enc, to report in the module results."""
+    def __init__(self):
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.cache_hits = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self._lock = threading.Lock()
+
+    def record_request(self, latency, failed):
+        with self._lock:
+            self.requests += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            if failed:
+                self.failures += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def record_cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def to_dict(self):
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "cache_hits": self.cache_hits,
+            "total_latency": self.total_latency,
+            "max_latency": self.max_latency,
+        }
+
+
+def get_retry_delay(attempt, backoff_factor, retry_after=None, max_backoff=DEFAULT_MAX_BACKOFF):
+    """
+    Seconds to wait before retrying, the Retry-After header value if the
+    enc sent one in seconds, exponential backoff with full jitter otherwise.
+
+    Never more than max_backoff, so a bogus Retry-After can't stall the task.
+    """
+    if retry_after and retry_after.isdigit():
+        return min(int(retry_after), max_backoff)
+
+    return random.uniform(0, min(backoff_factor * (2 ** attempt), max_backoff))
+
+
+def get_common_enc_args_specs(**extra_args):
+    args = {
+        "enc_url": {"type": "str", "required": True},
+        "openstack_project": {"type": "str", "required": True},
+        "enc_pool_maxsize": {"type": "int", "required": False, "default": DEFAULT_POOL_MAXSIZE},
+        "enc_keep_alive": {"type": "bool", "required": False, "default": True},
+        "enc_connect_timeout": {"type": "float", "required": False, "default": DEFAULT_CONNECT_TIMEOUT},
+        "enc_read_timeout": {"type": "float", "required": False, "default": DEFAULT_READ_TIMEOUT},
+        "enc_cache_dir": {"type": "path", "required": False, "default": None},
+        "enc_cache_ttl": {"type": "int", "required": False, "default": DEFAULT_CACHE_TTL},
+        "enc_cache_max_entries": {"type": "int", "required": False, "default": DEFAULT_CACHE_MAX_ENTRIES},
+        "enc_retries": {"type": "int", "required": False, "default": DEFAULT_RETRIES},
+        "enc_backoff_factor": {"type": "float", "required": False, "default": DEFAULT_BACKOFF_FACTOR},
+        "enc_max_backoff": {"type": "float", "required": False, "default": DEFAULT_MAX_BACKOFF},
+        "enc_circuit_breaker_threshold": {
+            "type": "int", "required": False, "default": DEFAULT_CIRCUIT_BREAKER_THRESHOLD
+        },
+        "enc_circuit_breaker_reset": {
+            "type": "float", "required": False, "default": DEFAULT_CIRCUIT_BREAKER_RESET
+        },
+    }
+    args.update(extra_args)
+    return args
+
+
+def parse_enc_response(response: requests.Response, nested_hiera: bool = False):
+    """
+    Parse the yaml body of an enc response, and the yaml string under the
+    'hiera' key too if nested_hiera is True.
+
+    Returns a tuple with the parsed data and the seconds it took to parse it.
+    """
+    start = time.perf_counter()
+    try:
+        data = yaml_utils.load(response.content)
+        if nested_hiera:
+            data["hiera"] = yaml_utils.load(data["hiera"])
+    except Exception as error:
+        raise EncError(
+            "Error parsing response from the enc backend: %s\nResponse:\n%s" % (
+                error,
+                response.raw,
+            ),
+        )
+
+    return data, time.perf_counter() - start
+
+
+def get_session(enc_url, pool_maxsize=DEFAULT_POOL_MAXSIZE, keep_alive=True):
+    session_key = (enc_url, pool_maxsize, keep_alive)
+    if session_key not in _SESSIONS:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not keep_alive:
+            session.headers["Connection"] = "close"
+
+        _SESSIONS[session_key] = session
+
+    return _SESSIONS[session_key]
+
+
+def get_circuit_breaker(
+    enc_url,
+    threshold=DEFAULT_CIRCUIT_BREAKER_THRESHOLD,
+    reset=DEFAULT_CIRCUIT_BREAKER_RESET,
+):
+    breaker_key = (enc_url, threshold, reset)
+    if breaker_key not in _CIRCUIT_BREAKERS:
+        _CIRCUIT_BREAKERS[breaker_key] = CircuitBreaker(threshold=threshold, reset=reset)
+
+    return _CIRCUIT_BREAKERS[breaker_key]
+
+
+def get_enc_connection(module_params, **overrides):
+    """
+    Build an EncConnection from the module params generated with
+    get_common_enc_args_specs.
+    """
+    cache = None
+    if module_params.get("enc_cache_dir"):
+        cache = EncCache(
+            cache_dir=module_params.get("enc_cache_dir"),
+            enc_url=module_params.get("enc_url"),
+            openstack_project=module_params.get("openstack_project"),
+            ttl=module_params.get("enc_cache_ttl"),
+            max_entries=module_params.get("enc_cache_max_entries"),
+        )
+
+    kwargs = {
+        "enc_url": module_params.get("enc_url"),
+        "openstack_project": module_params.get("openstack_project"),
+        "pool_maxsize": module_params.get("enc_pool_maxsize"),
+        "keep_alive": module_params.get("enc_keep_alive"),
+        "connect_timeout": module_params.get("enc_connect_timeout"),
+        "read_timeout": module_params.get("enc_read_timeout"),
+        "cache": cache,
+        "retries": module_params.get("enc_retries"),
+        "backoff_factor": module_params.get("enc_backoff_factor"),
+        "max_backoff": module_params.get("enc_max_backoff"),
+        "circuit_breaker": get_circuit_breaker(
+            enc_url=module_params.get("enc_url"),
+            threshold=module_params.get("enc_circuit_breaker_threshold"),
+            reset=module_params.get("enc_circuit_breaker_reset"),
+        ),
+    }
+    kwargs.update(overrides)
+    return EncConnection(**kwargs)
+
+
 class EncConnection:
-    def __init__(self, enc_url, openstack_project):
+    def __init__(
+        self,
+        enc_url,
+        openstack_project,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        keep_alive=True,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        session=None,
+        cache=None,
+        retries=DEFAULT_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR,
+        circuit_breaker=None,
+        max_backoff=DEFAULT_MAX_BACKOFF,
+    ):
         self.enc_url = enc_url
         self.openstack_project = openstack_project
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache = cache
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.stats = EncStats()
+        self.session = session or get_session(
+            enc_url=enc_url, pool_maxsize=pool_maxsize, keep_alive=keep_alive
+        )
+        self.circuit_breaker = circuit_breaker or get_circuit_breaker(enc_url=enc_url)
+
+    def _request(self, method, url, retry, **kwargs) -> requests.Response:
+        """
+        Do the request, retrying with jittered exponential backoff (see
+        get_retry_delay) on connection errors and 429/5xx responses if retry
+        is True (it should only be for idempotent requests).
+        """
+        attempt = 0
+        while True:
+            if self.circuit_breaker.is_open():
+                raise EncRequestNotSentError(
+                    f"Too many consecutive errors contacting the enc at {self.enc_url}, "
+                    f"not trying again for {self.circuit_breaker.reset}s"
+                )
+
+            error = None
+            response = None
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            except requests.RequestException as request_error:
+                error = request_error
+
+            failed = error is not None or response.status_code in RETRYABLE_STATUSES
+            self.stats.record_request(latency=time.perf_counter() - start, failed=failed)
+            if not failed:
+                self.circuit_breaker.record_success()
+                return response
+
+            self.circuit_breaker.record_failure()
+            if not retry or attempt >= self.retries:
+                if isinstance(error, requests.ConnectTimeout):
+                    raise EncRequestNotSentError(f"Error contacting the enc at {url}: {error}")
+                if error is not None:
+                    raise EncError(f"Error contacting the enc at {url}: {error}")
+                return response
+
+            time.sleep(get_retry_delay(
+                attempt=attempt,
+                backoff_factor=self.backoff_factor,
+                retry_after=response.headers.get("Retry-After") if response is not None else None,
+                max_backoff=self.max_backoff,
+            ))
+            attempt += 1
+            self.stats.record_retry()
+
+    def _get(self, url, headers=None) -> requests.Response:
+        return self._request("GET", url, retry=True, headers=headers)
+
+    def _cached_get(self, url, cache_kind, cache_name, use_cache=True) -> requests.Response:
+        """
+        If use_cache is False, the cached entry will be always revalidated with
+        the enc, even if it's still fresh.
+        """
+        if self.cache is None:
+            return self._get(url)
+
+        entry = self.cache.get(kind=cache_kind, name=cache_name)
+        if entry and use_cache and self.cache.is_fresh(entry):
+            self.stats.record_cache_hit()
+            return self.cache.to_response(entry)
+
+        response = self._get(url, headers=self.cache.get_conditional_headers(entry))
+        if response.status_code == 304 and entry:
+            self.stats.record_cache_hit()
+            self.cache.touch(kind=cache_kind, name=cache_name, entry=entry)
+            return self.cache.to_response(entry)
+
+        if response.ok:
+            self.cache.put(kind=cache_kind, name=cache_name, response=response)
+
+        return response
+
+    def _post(self, url, data) -> requests.Response:
+        # not retried, we can't know if a failed post was applied or not
+        return self._request("POST", url, retry=False, data=data)
+
+    def list_prefixes(self) -> requests.Response:
+        response = self._cached_get(
+            "{0}/{1}/prefix".format(
+                self.enc_url,
+                self.openstack_project,
+            ),
+            cache_kind="prefixes",
+            cache_name="",
+        )
+        if not response.ok:
+            raise EncError(
+                f"Unable to list prefixes for "
+                f"enc_url='{self.enc_url}', "
+                f"openstack_project='{self.openstack_project}'"
+                f"\n{response}"
+            )
+
+        return response
+
+    def get_prefix_roles(self, prefix: str) -> requests.Response:
+        response = self._cached_get(
+            "{0}/{1}/prefix/{2}/roles".format(
+                self.enc_url,
+                self.openstack_project,
+                prefix,
+            ),
+            cache_kind="prefix_roles",
+            cache_name=prefix,
+        )
+        if response.status_code == 404:
+            raise EncNotFoundError(
+                f"Prefix not found "
+                f"enc_url='{self.enc_url}', "
+                f"prefix='{prefix}', "
+                f"openstack_project='{self.openstack_project}'"
+                f"\n{response}"
+            )
+
+        if not response.ok:
+            raise EncError(
+                f"Unable to get prefix roles for "
+                f"enc_url='{self.enc_url}', "
+                f"prefix='{prefix}', "
+                f"openstack_project='{self.openstack_project}'"
+                f"\n{response}"
+            )
+
+        return response
 
     def get_project_hiera(self) -> requests.Response:
         # the api expects an empty space as prefix to get the global openstack_project
         # data
         return self.get_prefix_hiera(prefix=" ")
 
-    def get_prefix_hiera(self, prefix: str) -> requests.Response:
-        response = requests.get(
+    def get_prefix_hiera(self, prefix: str, use_cache: bool = True) -> requests.Response:
+        response = self._cached_get(
             "{0}/{1}/prefix/{2}/hiera".format(
                 self.enc_url,
                 self.openstack_project,
                 prefix,
-            )
+            ),
+            cache_kind="prefix_hiera",
+            cache_name=prefix,
+            use_cache=use_cache,
         )
+        if response.status_code == 404:
+            raise EncNotFoundError(
+                f"Prefix not found "
+                f"enc_url='{self.enc_url}', "
+                f"prefix='{prefix}', "
+                f"openstack_project='{self.openstack_project}'"
+                f"\n{response}"
+            )
+
         if not response.ok:
             raise EncError(
                 f"Unable to get prefix data for "
@@ -37,7 +448,7 @@ class EncConnection:
         return response
 
     def set_prefix_hiera(self, prefix: str, data: str) -> requests.Response:
-        response = requests.post(
+        response = self._post(
             "{0}/{1}/prefix/{2}/hiera".format(
                 self.enc_url,
                 self.openstack_project,
@@ -45,6 +456,11 @@ class EncConnection:
             ),
             data,
         )
+        if self.cache is not None:
+            # invalidate even on failure, we don't know if it was partially
+            # applied
+            self.invalidate_cache(prefix=prefix)
+
         if not response.ok:
             raise EncError(
                 f"Unable to set prefix data for "
@@ -57,17 +473,32 @@ class EncConnection:
 
         return response
 
+    def invalidate_cache(self, prefix: str):
+        """
+        Remove the cached entries that might change when updating the given
+        prefix hiera.
+        """
+        self.cache.invalidate(kind="prefix_hiera", name=prefix)
+        self.cache.invalidate(kind="prefix", name=prefix)
+        # setting the hiera for a non-existing prefix creates it
+        self.cache.invalidate(kind="prefixes", name="")
+        # the consolidated node info merges the project and prefixes hiera, so
+        # any of them might have changed
+        self.cache.invalidate(kind="node")
+
     def get_node_consolidated_info(self, fqdn: str) -> requests.Response:
         """
         This gives the results of applying all the openstack_project + prefix + node
         configs, ready to be used by puppet.
         """
-        response = requests.get(
+        response = self._cached_get(
             "{0}/{1}/node/{2}".format(
                 self.enc_url,
                 self.openstack_project,
                 fqdn,
-            )
+            ),
+            cache_kind="node",
+            cache_name=fqdn,
         )
         if not response.ok:
             raise EncError(
@@ -86,12 +517,14 @@ class EncConnection:
         the ones for the prefix and openstack_project.
         """
         # Yep, we treat the hostname as a prefix itself
-        response = requests.get(
+        response = self._cached_get(
             "{0}/{1}/prefix/{2}".format(
                 self.enc_url,
                 self.openstack_project,
                 fqdn,
-            )
+            ),
+            cache_kind="prefix",
+            cache_name=fqdn,
         )
         if not response.ok:
             raise EncError(
@@ -0,0 +1,112 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import copy
+
+from ansible_collections.wikimedia.wmcs.plugins.module_utils import yaml_utils
+
+HIERA_OPERATIONS = ("set", "append_unique", "remove")
+
+
+class HieraOperationError(Exception):
+    pass
+
+
+def get_hiera_operations_spec():
+    return {
+        "type": "list",
+        "elements": "dict",
+        "required": False,
+        "options": {
+            "op": {"type": "str", "required": True, "choices": list(HIERA_OPERATIONS)},
+            "key": {"type": "str", "required": True, "no_log": False},
+            "value": {"type": "raw", "required": False},
+        },
+    }
+
+
+def validate_hiera_operations(operations):
+    """
+    For when the operations can't be validated by the module argument spec
+    (ex. nested inside a dict).
+    """
+    if not isinstance(operations, list):
+        raise HieraOperationError(f"The hiera operations must be a list, got: {operations}")
+
+    for operation in operations:
+        if not isinstance(operation, dict):
+            raise HieraOperationError(f"Each hiera operation must be a dict, got: {operation}")
+        if operation.get("op") not in HIERA_OPERATIONS:
+            raise HieraOperationError(
+                f"Hiera operation must be one of {HIERA_OPERATIONS}, got: {operation}"
+            )
+        if not isinstance(operation.get("key"), str):
+            raise HieraOperationError(f"Hiera operation without a valid key: {operation}")
+
+
+def _as_list(value):
+    if isinstance(value, list):
+        return value
+    return [value]
+
+
+def apply_hiera_operations(hiera, operations):
+    """
+    Apply the given key level operations to the hiera dict, returning a new
+    dict (the passed one is not modified).
+
+    Each operation is a dict with:
+    * op: one of:
+      * set: set the key to the value.
+      * append_unique: append the value (or each of the elements if it's a
+        list) to the list under the key, if not there already. Creates the list
+        if the key is not there.
+      * remove: remove the key, or if a value is passed, remove the value (or
+        each of the elements if it's a list) from the list under the key.
+    * key: hiera key to change.
+    * value: value for the operation.
+    """
+    new_hiera = copy.deepcopy(hiera) if hiera else {}
+    for operation in operations:
+        op = operation["op"]
+        key = operation["key"]
+        value = operation.get("value")
+
+        if op == "set":
+            new_hiera[key] = value
+
+        elif op == "append_unique":
+            current_value = new_hiera.get(key, [])
+            if not isinstance(current_value, list):
+                raise HieraOperationError(
+                    f"Unable to append to hiera key {key}, it's not a list: {current_value}"
+                )
+            for elem in _as_list(value):
+                if elem not in current_value:
+                    current_value.append(elem)
+            new_hiera[key] = current_value
+
+        elif op == "remove":
+            if key not in new_hiera:
+                continue
+
+            if value is None:
+                del new_hiera[key]
+                continue
+
+            current_value = new_hiera[key]
+            if not isinstance(current_value, list):
+                raise HieraOperationError(
+                    f"Unable to remove values from hiera key {key}, it's not a list: {current_value}"
+                )
+            to_remove = _as_list(value)
+            new_hiera[key] = [elem for elem in current_value if elem not in to_remove]
+
+        else:
+            raise HieraOperationError(f"Unknown hiera operation {op}")
+
+    return new_hiera
+
+
+def dump_hiera(hiera) -> str:
+    """Same format as the to_nice_yaml filter."""
+    return yaml_utils.dump(hiera, default_flow_style=False, indent=4, allow_unicode=True)
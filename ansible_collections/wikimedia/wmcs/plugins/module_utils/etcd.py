@@ -1,6 +1,38 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
-import requests
+import abc
+import hashlib
+import json
+import re
+import time
+
+try:
+    import requests
+    HAS_REQUESTS = True
+except ImportError:
+    HAS_REQUESTS = False
+
+ETCDCTL_V3_ENV = {"ETCDCTL_API": "3"}
+ETCD_CLIENTS = ("auto", "gateway", "etcdctl")
+DEFAULT_GATEWAY_TIMEOUT = 10
+ADDED_MEMBER_ID_REGEX = re.compile(r"with ID ([0-9a-f]+)")
+# <memberid>[<status>]: <key>=<value> <key>=<value>...
+# where the '[<status>]' bit might not be there
+MEMBER_LINE_REGEX = re.compile(r"^\s*(?P<member_id>[0-9a-f]+)(?:\[(?P<status>[^\]]*)\])?:(?P<fields>.*)$")
+MEMBER_FIELD_REGEX = re.compile(r"(?P<key>[^\s=]+)=(?P<value>\S*)")
+# each condition implies the previous ones
+WAIT_FOR_CONDITIONS = ("started", "healthy", "leader_known")
+DEFAULT_WAIT_TIMEOUT = 120
+DEFAULT_WAIT_INITIAL_DELAY = 0.5
+DEFAULT_WAIT_MAX_DELAY = 10
+DEFAULT_SNAPSHOT_MAX_AGE = 300
+
+# probed only once per module run, see get_etcdctl_api_version
+_ETCDCTL_API_VERSION = None
+
+
+class EtcdError(Exception):
+    pass
 
 
 def get_common_etcdctl_args_specs(**extra_args):
@@ -9,12 +41,37 @@ def get_common_etcdctl_args_specs(**extra_args):
         "cert_file": {"type": "str", "required": True},
         "key_file": {"type": "str", "required": True},
         "ca_file": {"type": "str", "required": False, "default": "/etc/etcd/ssl/ca.pem"},
+        "client": {"type": "str", "required": False, "default": "auto", "choices": list(ETCD_CLIENTS)},
     }
     args.update(extra_args)
     return args
 
 
-def get_etcdctl_args(module_params, extra_args):
+def get_wait_for_args_specs():
+    return {
+        "wait_for": {"type": "str", "required": False, "choices": list(WAIT_FOR_CONDITIONS)},
+        "wait_timeout": {"type": "int", "required": False, "default": DEFAULT_WAIT_TIMEOUT},
+    }
+
+
+def get_snapshot_args_specs():
+    return {
+        "members_snapshot": {"type": "dict", "required": False},
+        "snapshot_max_age": {"type": "int", "required": False, "default": DEFAULT_SNAPSHOT_MAX_AGE},
+    }
+
+
+def get_etcdctl_args(module_params, extra_args, api_version=2):
+    if api_version >= 3:
+        return [
+            "etcdctl",
+            "--endpoints", module_params.get('endpoints'),
+            "--cacert", module_params.get('ca_file'),
+            "--cert", module_params.get('cert_file'),
+            "--key", module_params.get('key_file'),
+            *extra_args
+        ]
+
     return [
         "etcdctl",
         "--endpoints", module_params.get('endpoints'),
@@ -25,6 +82,49 @@ def get_etcdctl_args(module_params, extra_args):
     ]
 
 
+def get_etcdctl_api_version(module):
+    """
+    Check if the installed etcdctl supports the v3 api (and its json output),
+    returns 3 if so, 2 otherwise.
+    """
+    global _ETCDCTL_API_VERSION
+    if _ETCDCTL_API_VERSION is None:
+        rc, out, _ = module.run_command(args=["etcdctl", "version"], environ_update=ETCDCTL_V3_ENV)
+        if rc == 0 and re.search(r"^API version: 3", out, re.MULTILINE):
+            _ETCDCTL_API_VERSION = 3
+        else:
+            _ETCDCTL_API_VERSION = 2
+
+    return _ETCDCTL_API_VERSION
+
+
+def run_etcdctl(module, extra_args, endpoints=None):
+    """
+    Run etcdctl with the right flags and environment for its api version.
+
+    If endpoints is passed, it's used instead of the endpoints module param.
+    """
+    api_version = get_etcdctl_api_version(module)
+    module_params = module.params
+    if endpoints is not None:
+        module_params = dict(module.params, endpoints=endpoints)
+
+    args = get_etcdctl_args(
+        module_params=module_params, extra_args=extra_args, api_version=api_version
+    )
+    environ_update = ETCDCTL_V3_ENV if api_version >= 3 else {}
+    rc, out, err = module.run_command(args=args, environ_update=environ_update)
+    return args, rc, out, err
+
+
+def member_id_to_str(member_id):
+    """
+    The v3 api gives the ids as integers (or stringified integers in the json
+    gateway), the rest of the tools use hex strings.
+    """
+    return format(int(member_id), "x")
+
+
 def to_simple_type(maybe_not_string):
     """
     Simple type interpolation, as etcdctl member list does not return json (yet)
@@ -34,58 +134,658 @@ def to_simple_type(maybe_not_string):
     elif maybe_not_string == "false":
         return False
 
-    try:
+    # cheaper than catching the ValueError from int() for every non int value
+    if maybe_not_string.isdigit() or (
+        maybe_not_string[:1] == "-" and maybe_not_string[1:].isdigit()
+    ):
         return int(maybe_not_string)
-    except ValueError:
-        pass
 
     return maybe_not_string
 
 
-def get_cluster_info(module):
-    args = get_etcdctl_args(
-        module_params=module.params, extra_args=["member", "list"]
-    )
-    rc, out, err = module.run_command(args=args)
-    structured_result = {}
-    if rc == 0:
-        for line in out.split('\n'):
+class EtcdMemberRecord:
+    """
+    A member parsed from the etcdctl v2 member list text output.
+
+    The values of the fields are kept as strings, and only converted (see
+    to_simple_type) when requested.
+    """
+    __slots__ = ("member_id", "status", "raw_fields")
+
+    def __init__(self, member_id, status, raw_fields):
+        self.member_id = member_id
+        self.status = status
+        self.raw_fields = raw_fields
+
+    def get(self, key, default=None):
+        if key not in self.raw_fields:
+            return default
+
+        return to_simple_type(self.raw_fields[key])
+
+    def to_dict(self):
+        struct_elem = {key: to_simple_type(value) for key, value in self.raw_fields.items()}
+        struct_elem["member_id"] = self.member_id
+        struct_elem["status"] = self.status
+        return struct_elem
+
+
+def parse_member_list(lines):
+    """
+    Parse the etcdctl v2 member list text output, yielding an
+    EtcdMemberRecord per member.
+
+    Accepts either the whole output as a string or any iterable of lines (ex.
+    an open file), so big saved outputs don't have to be loaded in memory at
+    once.
+
+    Raises EtcdError if any line can't be parsed.
+    """
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+
+    line_match = MEMBER_LINE_REGEX.match
+    find_fields = MEMBER_FIELD_REGEX.findall
+    for line in lines:
+        match = line_match(line)
+        if match is None:
             if not line.strip():
                 continue
 
-            # <memberid>[<status>]: <key>=<value> <key>=<value>...
-            # where value might be the string "true" or a stringified int "42"
-            # and the '[<status>]' bit might not be there
-            # peerURLs and memberid are the only key that seems to be there always
-            split_info = [
-                [to_simple_type(subelem) for subelem in elem.split('=')]
-                for elem in line.split()
-            ]
-            struct_elem = dict(split_info[1:])
-
-            first_part = split_info[0][0][:-1]
-            if '[' in first_part:
-                member_id = first_part.split('[', 1)[0]
-                status = first_part.split('[', 1)[1][:-1]
-            else:
-                member_id = first_part
-                status = "up"
-
-            struct_elem['member_id'] = member_id
-            struct_elem['status'] = status
-
-            if 'peerURLs' not in struct_elem:
-                module.fail_json(
-                    msg=(
-                        "Unable to parse etcdctl output (missing peerURLs for "
-                        f"member line):\nParsed: {struct_elem}\nLine: {line}\n"
-                        f"Full output: {out}"
-                    ),
-                    args=args,
-                    out=out,
-                    err=err,
-                    rc=rc,
+            raise EtcdError(f"Unable to parse etcdctl member line: {line}")
+
+        member_id, status, fields = match.groups()
+        raw_fields = dict(find_fields(fields))
+        # peerURLs and memberid are the only key that seems to be there always
+        if "peerURLs" not in raw_fields:
+            raise EtcdError(f"Unable to parse etcdctl output (missing peerURLs for member line): {line}")
+
+        yield EtcdMemberRecord(
+            member_id=member_id,
+            status=status if status is not None else "up",
+            raw_fields=raw_fields,
+        )
+
+
+def _normalize_member(member):
+    return {
+        "ID": member_id_to_str(member["ID"]),
+        "name": member.get("name", ""),
+        "peerURLs": member.get("peerURLs", []),
+        "clientURLs": member.get("clientURLs", []),
+    }
+
+
+def members_to_cluster_info(members, leader_id):
+    """Convert a member list to the dict format returned by the modules."""
+    structured_result = {}
+    for member in members:
+        # same format as the etcdctl v2 text output, a member that has not
+        # started yet has no name and no clientURLs
+        struct_elem = {
+            "member_id": member["ID"],
+            "status": "up" if member["name"] else "unstarted",
+            "peerURLs": ",".join(member["peerURLs"]),
+            "isLeader": member["ID"] == leader_id,
+        }
+        if member["name"]:
+            struct_elem["name"] = member["name"]
+        if member["clientURLs"]:
+            struct_elem["clientURLs"] = ",".join(member["clientURLs"])
+
+        structured_result[member["ID"]] = struct_elem
+
+    return structured_result
+
+
+def _cluster_info_to_members(cluster_info):
+    return [
+        {
+            "ID": member["member_id"],
+            "name": member.get("name", ""),
+            "peerURLs": str(member["peerURLs"]).split(","),
+            "clientURLs": str(member["clientURLs"]).split(",") if "clientURLs" in member else [],
+        }
+        for member in cluster_info.values()
+    ]
+
+
+class EtcdClient(abc.ABC):
+    """
+    Common interface for the different ways of talking to etcd.
+
+    The members are returned as dicts like the v3 api ones, but with the hex
+    string ids:
+        {"ID": "5208bbf5c00e7cdf", "name": "...", "peerURLs": [...], "clientURLs": [...]}
+    """
+
+    @abc.abstractmethod
+    def get_members(self):
+        pass
+
+    @abc.abstractmethod
+    def get_leader_id(self):
+        pass
+
+    def get_members_and_leader(self):
+        return self.get_members(), self.get_leader_id()
+
+    @abc.abstractmethod
+    def add_member(self, name, peer_url):
+        """Returns the new member and the raw output of the operation."""
+
+    @abc.abstractmethod
+    def update_member(self, member_id, peer_url):
+        """Returns the raw output of the operation."""
+
+    @abc.abstractmethod
+    def remove_member(self, member_id):
+        """Returns the raw output of the operation."""
+
+    @abc.abstractmethod
+    def is_member_healthy(self, member):
+        """True if any of the client urls of the given member reports healthy."""
+
+    def get_cluster_info(self, members=None, leader_id=None):
+        """
+        The members and leader_id can be passed to avoid fetching them again
+        if they were already retrieved.
+        """
+        if members is None:
+            members = self.get_members()
+            leader_id = self.get_leader_id()
+
+        return members_to_cluster_info(members=members, leader_id=leader_id)
+
+
+class EtcdctlClient(EtcdClient):
+    """Forks etcdctl for each operation."""
+
+    def __init__(self, module):
+        self.module = module
+        self.api_version = get_etcdctl_api_version(module)
+
+    def _run(self, extra_args, ignore_errors=False):
+        args, rc, out, err = run_etcdctl(module=self.module, extra_args=extra_args)
+        if rc != 0 and not ignore_errors:
+            raise EtcdError(
+                f"Command {args} failed with rc={rc}:\nstdout:\n{out}\nstderr:\n{err}"
+            )
+        return rc, out
+
+    def _peer_url_args(self, peer_url):
+        if self.api_version >= 3:
+            return [f"--peer-urls={peer_url}"]
+
+        return [peer_url]
+
+    def get_members(self):
+        if self.api_version < 3:
+            return _cluster_info_to_members(self.get_cluster_info())
+
+        _, out = self._run(["member", "list", "-w", "json"])
+        try:
+            return [_normalize_member(member) for member in json.loads(out).get("members", [])]
+        except ValueError as error:
+            raise EtcdError(f"Unable to parse the etcd member list: {error}\n{out}")
+
+    def get_leader_id(self):
+        if self.api_version < 3:
+            return next(
+                (
+                    member["member_id"]
+                    for member in self.get_cluster_info().values()
+                    if member.get("isLeader")
+                ),
+                None,
+            )
+
+        rc, out = self._run(["endpoint", "status", "-w", "json"], ignore_errors=True)
+        if rc != 0:
+            return None
+
+        try:
+            return next(
+                (
+                    member_id_to_str(status["Status"]["leader"])
+                    for status in json.loads(out)
+                    if status.get("Status", {}).get("leader")
+                ),
+                None,
+            )
+        except ValueError:
+            return None
+
+    def get_members_and_leader(self):
+        if self.api_version >= 3:
+            return super().get_members_and_leader()
+
+        # both come from the same text output, parse it only once
+        cluster_info = _get_cluster_info_text(self.module)
+        return _cluster_info_to_members(cluster_info), next(
+            (member["member_id"] for member in cluster_info.values() if member.get("isLeader")),
+            None,
+        )
+
+    def get_cluster_info(self, members=None, leader_id=None):
+        if self.api_version >= 3 or members is not None:
+            return super().get_cluster_info(members=members, leader_id=leader_id)
+
+        return _get_cluster_info_text(self.module)
+
+    def add_member(self, name, peer_url):
+        if self.api_version >= 3:
+            _, out = self._run(["member", "add", name, *self._peer_url_args(peer_url), "-w", "json"])
+            try:
+                return _normalize_member(json.loads(out)["member"]), out
+            except (ValueError, KeyError) as error:
+                raise EtcdError(f"Unable to parse the etcd member add output: {error}\n{out}")
+
+        _, out = self._run(["member", "add", name, *self._peer_url_args(peer_url)])
+        # Added member named <name> with ID <member_id> to cluster
+        match = ADDED_MEMBER_ID_REGEX.search(out)
+        if not match:
+            raise EtcdError(f"Unable to find the new member id in the etcd member add output:\n{out}")
+
+        return {"ID": match.group(1), "name": "", "peerURLs": [peer_url], "clientURLs": []}, out
+
+    def update_member(self, member_id, peer_url):
+        _, out = self._run(["member", "update", member_id, *self._peer_url_args(peer_url)])
+        return out
+
+    def remove_member(self, member_id):
+        _, out = self._run(["member", "remove", member_id])
+        return out
+
+    def is_member_healthy(self, member):
+        if not member["clientURLs"]:
+            return False
+
+        if self.api_version >= 3:
+            _, rc, _, _ = run_etcdctl(
+                module=self.module,
+                extra_args=["endpoint", "health"],
+                endpoints=",".join(member["clientURLs"]),
+            )
+            return rc == 0
+
+        # member <member_id> is healthy: got healthy result from <client_url>
+        _, out = self._run(["cluster-health"], ignore_errors=True)
+        return f"member {member['ID']} is healthy" in out
+
+
+class EtcdGatewayClient(EtcdClient):
+    """
+    Talks directly to the etcd v3 grpc json gateway, reusing the same TLS
+    connection for all the requests instead of forking etcdctl.
+    """
+
+    def __init__(self, endpoints, cert_file, key_file, ca_file, timeout=DEFAULT_GATEWAY_TIMEOUT):
+        if not HAS_REQUESTS:
+            raise EtcdError("The requests python library is needed to use the etcd json gateway")
+
+        self.endpoints = [endpoint.rstrip("/") for endpoint in endpoints.split(",") if endpoint]
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.cert = (cert_file, key_file)
+        self.session.verify = ca_file
+        self._api_prefix = None
+        # the endpoint that responded last, to avoid retrying dead ones
+        self._current_endpoint = 0
+
+    def _request(self, method, path, endpoint=None, **kwargs):
+        endpoints = [endpoint] if endpoint else (
+            self.endpoints[self._current_endpoint:] + self.endpoints[:self._current_endpoint]
+        )
+        errors = []
+        for candidate in endpoints:
+            try:
+                response = self.session.request(
+                    method, f"{candidate}{path}", timeout=self.timeout, **kwargs
                 )
-            structured_result[struct_elem['member_id']] = struct_elem
+            # OSError for problems loading the certificates
+            except (requests.RequestException, OSError) as error:
+                errors.append(f"{candidate}: {error}")
+                continue
+
+            if endpoint is None:
+                self._current_endpoint = self.endpoints.index(candidate)
+
+            if not response.ok:
+                raise EtcdError(f"Request to {candidate}{path} failed: {response.status_code} {response.text}")
+
+            try:
+                return response.json()
+            except ValueError as error:
+                raise EtcdError(f"Unable to parse the response from {candidate}{path}: {error}\n{response.text}")
+
+        raise EtcdError("Unable to contact any etcd endpoint:\n" + "\n".join(errors))
+
+    def get_version(self, endpoint=None):
+        return self._request("GET", "/version", endpoint=endpoint)
+
+    @property
+    def api_prefix(self):
+        if self._api_prefix is None:
+            version = self.get_version().get("etcdserver", "")
+            match = re.match(r"(\d+)\.(\d+)", version)
+            major_minor = (int(match.group(1)), int(match.group(2))) if match else (0, 0)
+            if major_minor >= (3, 4):
+                self._api_prefix = "/v3"
+            elif major_minor >= (3, 3):
+                self._api_prefix = "/v3beta"
+            elif major_minor >= (3, 2):
+                self._api_prefix = "/v3alpha"
+            else:
+                raise EtcdError(f"The etcd json gateway needs etcd >= 3.2, got: {version}")
+
+        return self._api_prefix
+
+    def _post(self, path, data=None, endpoint=None):
+        return self._request("POST", f"{self.api_prefix}{path}", endpoint=endpoint, json=data or {})
+
+    def get_members(self):
+        return [
+            _normalize_member(member)
+            for member in self._post("/cluster/member/list").get("members", [])
+        ]
+
+    def get_status(self, endpoint=None):
+        return self._post("/maintenance/status", endpoint=endpoint)
+
+    def get_health(self, endpoint=None):
+        # not part of the grpc gateway, so there's no api prefix
+        return self._request("GET", "/health", endpoint=endpoint)
+
+    def get_leader_id(self):
+        try:
+            leader = self.get_status().get("leader")
+        except EtcdError:
+            return None
+
+        return member_id_to_str(leader) if leader else None
+
+    def add_member(self, name, peer_url):
+        # the name is only set once the new member starts
+        response = self._post("/cluster/member/add", {"peerURLs": [peer_url]})
+        return _normalize_member(response["member"]), json.dumps(response)
+
+    def update_member(self, member_id, peer_url):
+        response = self._post(
+            "/cluster/member/update",
+            {"ID": str(int(member_id, 16)), "peerURLs": [peer_url]},
+        )
+        return json.dumps(response)
+
+    def remove_member(self, member_id):
+        response = self._post("/cluster/member/remove", {"ID": str(int(member_id, 16))})
+        return json.dumps(response)
+
+    def is_member_healthy(self, member):
+        for client_url in member["clientURLs"]:
+            try:
+                health = self.get_health(endpoint=client_url.rstrip("/"))
+            except EtcdError:
+                continue
+
+            if str(health.get("health")).lower() == "true":
+                return True
+
+        return False
+
+
+def probe_endpoint(endpoint, cert_file, key_file, ca_file, timeout=DEFAULT_GATEWAY_TIMEOUT):
+    """
+    Check the health and status of a single etcd endpoint, never raises, any
+    error is reported in the 'error' key of the result.
+
+    The latency is the round trip of the /health request, the elapsed time
+    covers the whole probe. The timeout is for the whole probe, each of its
+    requests only gets the time left.
+    """
+    result = {
+        "endpoint": endpoint,
+        "healthy": False,
+        "latency": None,
+        "elapsed": None,
+        "member_id": None,
+        "leader": None,
+        "is_leader": False,
+        "raft_index": None,
+        "raft_term": None,
+        "db_size": None,
+        "version": None,
+        "error": None,
+    }
+    start = time.monotonic()
+    deadline = start + timeout
+
+    def get_time_left():
+        time_left = deadline - time.monotonic()
+        if time_left <= 0:
+            raise EtcdError(f"Probe went over the deadline of {timeout}s")
+
+        return time_left
+
+    try:
+        client = EtcdGatewayClient(
+            endpoints=endpoint,
+            cert_file=cert_file,
+            key_file=key_file,
+            ca_file=ca_file,
+            timeout=timeout,
+        )
+        # gets the version, done here so it's not part of the status request
+        client.api_prefix
+
+        client.timeout = get_time_left()
+        health_start = time.monotonic()
+        health = client.get_health()
+        result["latency"] = time.monotonic() - health_start
+
+        client.timeout = get_time_left()
+        status = client.get_status()
+        member_id = status.get("header", {}).get("member_id")
+        leader = status.get("leader")
+        result.update({
+            "member_id": member_id_to_str(member_id) if member_id else None,
+            "leader": member_id_to_str(leader) if leader else None,
+            "is_leader": bool(leader) and leader == member_id,
+            "raft_index": int(status.get("raftIndex", 0)),
+            "raft_term": int(status.get("raftTerm", 0)),
+            "db_size": int(status.get("dbSize", 0)),
+            "version": status.get("version"),
+        })
+        # the health endpoint returns the string "true" (as in etcdctl
+        # output), some versions return the bool
+        result["healthy"] = str(health.get("health")).lower() == "true" and bool(leader)
+        if not result["healthy"]:
+            result["error"] = health.get("reason") or "Endpoint reported unhealthy or without leader"
+    except EtcdError as error:
+        result["error"] = str(error)
+
+    result["elapsed"] = time.monotonic() - start
+    if result["elapsed"] > timeout and result["healthy"]:
+        result["healthy"] = False
+        result["error"] = f"Probe took {result['elapsed']:.3f}s, over the deadline of {timeout}s"
+
+    return result
+
+
+def check_members_ready(client, wait_for, member_ids=None):
+    """
+    Check if the given members (all of them if member_ids is None) meet the
+    wait_for condition.
+
+    Returns a tuple with True/False and the reason why they are not ready.
+    """
+    members = client.get_members()
+    if member_ids is not None:
+        known_ids = {member["ID"] for member in members}
+        missing_ids = [member_id for member_id in member_ids if member_id not in known_ids]
+        if missing_ids:
+            return False, f"Members {missing_ids} are not part of the cluster"
+
+        members = [member for member in members if member["ID"] in member_ids]
+
+    # a member that has not started yet has no name and no clientURLs
+    unstarted = [member["ID"] for member in members if not member["name"] or not member["clientURLs"]]
+    if unstarted:
+        return False, f"Members {unstarted} have not started yet"
+
+    if wait_for == "started":
+        return True, ""
+
+    unhealthy = [member["ID"] for member in members if not client.is_member_healthy(member)]
+    if unhealthy:
+        return False, f"Members {unhealthy} are not healthy"
+
+    if wait_for == "healthy":
+        return True, ""
+
+    if client.get_leader_id() is None:
+        return False, "The cluster has no leader"
+
+    return True, ""
+
+
+def wait_for_members(
+    client,
+    wait_for,
+    member_ids=None,
+    timeout=DEFAULT_WAIT_TIMEOUT,
+    initial_delay=DEFAULT_WAIT_INITIAL_DELAY,
+    max_delay=DEFAULT_WAIT_MAX_DELAY,
+):
+    """
+    Poll the cluster with exponential backoff until the members meet the
+    wait_for condition (see check_members_ready), raises EtcdError if they
+    don't after timeout seconds.
+
+    Returns the seconds it took.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = initial_delay
+    while True:
+        try:
+            ready, reason = check_members_ready(client=client, wait_for=wait_for, member_ids=member_ids)
+        except EtcdError as error:
+            # the cluster might be unavailable for a bit while the members join
+            ready, reason = False, str(error)
+
+        if ready:
+            return time.monotonic() - start
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise EtcdError(f"Timed out after {timeout}s waiting for the members to be {wait_for}: {reason}")
+
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+
+def get_members_hash(members):
+    return hashlib.sha1(
+        json.dumps(sorted(members, key=lambda member: member["ID"]), sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def make_snapshot(endpoints, members, leader_id):
+    """
+    Snapshot of the cluster membership, returned by the modules so the
+    following tasks can pass it back in members_snapshot and skip listing
+    the members again.
+    """
+    return {
+        "endpoints": endpoints,
+        "members": members,
+        "leader_id": leader_id,
+        "members_hash": get_members_hash(members),
+        "taken_at": time.time(),
+    }
+
+
+def load_snapshot(module):
+    """
+    Returns the members_snapshot passed to the module if it's for the same
+    endpoints, not older than snapshot_max_age and not corrupted, None
+    otherwise.
+
+    Only for modules that don't change the membership, the snapshot is
+    trusted on its age alone, as no cheap call tells if the membership
+    changed (the revision is only for the keys, and the raft index changes
+    with any write).
+    """
+    snapshot = module.params.get("members_snapshot")
+    if not snapshot:
+        return None
+
+    try:
+        if (
+            snapshot["endpoints"] != module.params.get("endpoints")
+            or time.time() - float(snapshot["taken_at"]) > module.params.get("snapshot_max_age")
+            or get_members_hash(snapshot["members"]) != snapshot["members_hash"]
+        ):
+            return None
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    return snapshot
+
+
+def get_etcd_client(module):
+    """
+    Get the client to use depending on the 'client' param, when 'auto' the
+    json gateway is used if it responds, etcdctl otherwise.
+    """
+    client = module.params.get("client", "etcdctl")
+    if client in ("auto", "gateway"):
+        try:
+            gateway_client = EtcdGatewayClient(
+                endpoints=module.params.get("endpoints"),
+                cert_file=module.params.get("cert_file"),
+                key_file=module.params.get("key_file"),
+                ca_file=module.params.get("ca_file"),
+            )
+            # make sure it works
+            gateway_client.api_prefix
+            return gateway_client
+        except EtcdError as error:
+            if client == "gateway":
+                module.fail_json(msg=f"Unable to use the etcd json gateway: {error}")
+
+    return EtcdctlClient(module)
+
+
+def _get_cluster_info_text(module):
+    args, rc, out, err = run_etcdctl(module=module, extra_args=["member", "list"])
+    structured_result = {}
+    if rc == 0:
+        try:
+            for record in parse_member_list(out):
+                structured_result[record.member_id] = record.to_dict()
+        except EtcdError as error:
+            module.fail_json(
+                msg=f"{error}\nFull output: {out}",
+                args=args,
+                out=out,
+                err=err,
+                rc=rc,
+            )
 
     return structured_result
+
+
+def get_cluster_info(module, client=None):
+    """
+    Uses the json gateway or the structured json output of etcdctl when
+    available, falling back to parsing the etcdctl v2 text output otherwise.
+    """
+    if client is None:
+        client = get_etcd_client(module)
+
+    try:
+        return client.get_cluster_info()
+    except EtcdError as error:
+        module.fail_json(msg=f"Unable to get the etcd cluster info: {error}")
@@ -0,0 +1,30 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import yaml
+
+# libyaml's C implementation is several times faster than the pure python one,
+# but it might not be compiled in the pyyaml package we get.
+try:
+    from yaml import CSafeLoader as SafeLoader
+    from yaml import CSafeDumper as SafeDumper
+    HAS_LIBYAML = True
+except ImportError:
+    from yaml import SafeLoader
+    from yaml import SafeDumper
+    HAS_LIBYAML = False
+
+YAMLError = yaml.YAMLError
+
+
+def load(stream):
+    """
+    Load a yaml document using the fastest safe loader available.
+
+    stream can be a str or bytes (utf-8/16 encoded), passing the bytes directly
+    avoids creating an extra decoded copy of big documents.
+    """
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def dump(data, **kwargs):
+    return yaml.dump(data, Dumper=SafeDumper, **kwargs)
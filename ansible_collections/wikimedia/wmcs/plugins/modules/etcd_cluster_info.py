@@ -42,6 +42,59 @@ options:
     description: Path to the key file to use
     type: str
     required: true
+  client:
+    description:
+      - How to talk to etcd, C(gateway) uses the etcd v3 json gateway
+        directly (reusing the same connection for all the requests),
+        C(etcdctl) runs the etcdctl command, and C(auto) uses the gateway if
+        it responds, etcdctl otherwise.
+    type: str
+    required: false
+    default: auto
+    choices:
+      - auto
+      - gateway
+      - etcdctl
+  member_id:
+    description:
+      - Id of the member to wait for when using I(wait_for), if not passed
+        all the members are waited for.
+    type: str
+    required: false
+  wait_for:
+    description:
+      - Wait until the members (or the given I(member_id)) is in the given state, polling the cluster
+        with exponential backoff, each state implies the previous ones.
+      - C(started) means that the member joined the cluster and got a name
+        and client urls, C(healthy) that its client urls report healthy, and
+        C(leader_known) that the cluster has a leader too.
+      - If not set, it does not wait.
+    type: str
+    required: false
+    choices:
+      - started
+      - healthy
+      - leader_known
+  wait_timeout:
+    description:
+      - Maximum number of seconds to wait for I(wait_for), the module fails
+        if the condition is not met in time.
+    type: int
+    required: false
+    default: 120
+  members_snapshot:
+    description:
+      - The I(snapshot) returned by a previous task, if it's for the
+        same I(endpoints) and not older than I(snapshot_max_age), it's used
+        instead of listing the members again.
+      - Ignored when using I(wait_for).
+    type: dict
+    required: false
+  snapshot_max_age:
+    description: Maximum age in seconds of I(members_snapshot) to use it.
+    type: int
+    required: false
+    default: 300
 
 requirements:
   - "python >= 3.6"
@@ -56,6 +109,16 @@ EXAMPLES = '''
     cert_file: /etc/etcd/ssl/tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud.pem
     key_file: /etc/etcd/ssl/tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud.priv
 
+- name: Wait for a newly added member to be healthy
+  delegate_to: tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud
+  wikimedia.wmcs.etcd_cluster_info:
+    endpoints: https://tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud:2379
+    cert_file: /etc/etcd/ssl/tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud.pem
+    key_file: /etc/etcd/ssl/tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud.priv
+    member_id: 5208bbf5c00e7cdf
+    wait_for: healthy
+    wait_timeout: 300
+
 '''
 
 RETURN = '''
@@ -86,6 +149,34 @@ members:
             description: Current status of the node.
             type: str
             sample: "up"
+snapshot:
+    description: |
+        Snapshot of the membership, to pass in
+        members_snapshot to the next tasks.
+    returned: On success
+    type: dict
+    contains:
+        endpoints:
+            description: The endpoints the snapshot was taken from.
+            type: str
+        members:
+            description: The members, as returned by the etcd v3 api but with hex ids.
+            type: list
+            elements: dict
+        leader_id:
+            description: Id of the leader, if known.
+            type: str
+        members_hash:
+            description: Hash of the members, to check that the snapshot is not corrupted.
+            type: str
+        taken_at:
+            description: Unix timestamp of when the snapshot was taken.
+            type: float
+wait_elapsed:
+    description: Seconds spent waiting for the I(wait_for) condition.
+    returned: When using wait_for
+    type: float
+    sample: 3.52
 '''
 
 __metaclass__ = type
@@ -93,8 +184,16 @@ import yaml
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.common.text.converters import jsonify
 from ansible_collections.wikimedia.wmcs.plugins.module_utils.etcd import (
+    EtcdError,
     get_common_etcdctl_args_specs,
     get_cluster_info,
+    get_etcd_client,
+    get_snapshot_args_specs,
+    get_wait_for_args_specs,
+    load_snapshot,
+    make_snapshot,
+    members_to_cluster_info,
+    wait_for_members,
 )
 
 
@@ -102,11 +201,50 @@ def main():
     """ Module entry point """
 
     module = AnsibleModule(
-        get_common_etcdctl_args_specs(),
+        get_common_etcdctl_args_specs(
+            member_id={"type": "str", "required": False},
+            **get_wait_for_args_specs(),
+            **get_snapshot_args_specs(),
+        ),
         supports_check_mode=True,
     )
-    cluster_info = get_cluster_info(module=module)
-    module.exit_json(changed=False, members=cluster_info)
+    member_id = module.params.get("member_id")
+    wait_for = module.params.get("wait_for")
+
+    snapshot = None if wait_for else load_snapshot(module)
+    if snapshot:
+        module.exit_json(
+            changed=False,
+            members=members_to_cluster_info(members=snapshot["members"], leader_id=snapshot["leader_id"]),
+            snapshot=snapshot,
+        )
+
+    client = get_etcd_client(module)
+    result = {}
+    if wait_for:
+        try:
+            result["wait_elapsed"] = wait_for_members(
+                client=client,
+                wait_for=wait_for,
+                member_ids=[member_id] if member_id else None,
+                timeout=module.params.get("wait_timeout"),
+            )
+        except EtcdError as error:
+            module.fail_json(msg=str(error), members=get_cluster_info(module=module, client=client))
+
+    try:
+        members, leader_id = client.get_members_and_leader()
+    except EtcdError as error:
+        module.fail_json(msg=f"Unable to get the etcd cluster info: {error}")
+
+    module.exit_json(
+        changed=False,
+        members=members_to_cluster_info(members=members, leader_id=leader_id),
+        snapshot=make_snapshot(
+            endpoints=module.params.get("endpoints"), members=members, leader_id=leader_id
+        ),
+        **result,
+    )
 
 
 if __name__ == '__main__':
@@ -0,0 +1,248 @@
+#!/usr/bin/python
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import (absolute_import, division, print_function)
+
+DOCUMENTATION = '''
+---
+author:
+  - David Caro (@david-caro)
+module: etcd_endpoint_health
+short_description: Probe the health of all the etcd cluster endpoints at once
+description:
+  - Gets the member list from the given endpoints and probes the client url
+    of every started member concurrently through the etcd v3 json gateway,
+    reporting health, leader, raft index/term, db size and latency for each.
+  - Needs etcd >= 3.2.
+
+options:
+  endpoints:
+    description:
+      - Comma-separated list of endpoints to connect to (already existing etcd
+        members), Note that there should be no spaces!
+    type: str
+    required: true
+  ca_file:
+    description: Path to the ca file to use
+    type: str
+    required: false
+    default: /etc/etcd/ssl/ca.pem
+  cert_file:
+    description: Path to the cert file to use
+    type: str
+    required: true
+  key_file:
+    description: Path to the key file to use
+    type: str
+    required: true
+  discover_members:
+    description:
+      - If true, probe the client urls of all the cluster members, if false
+        only the given I(endpoints) are probed.
+      - If the member list can't be retrieved, only the given I(endpoints)
+        are probed.
+    type: bool
+    required: false
+    default: true
+  max_workers:
+    description: Maximum number of endpoints to probe at the same time, must be at least 1.
+    type: int
+    required: false
+    default: 10
+  timeout:
+    description:
+      - Deadline in seconds for each probe, an endpoint that takes longer
+        than that is reported as unhealthy.
+    type: int
+    required: false
+    default: 5
+
+requirements:
+  - "python >= 3.6"
+  - "requests"
+'''
+
+EXAMPLES = '''
+- name: Check the health of the whole cluster, note the delegate_to and the ca_file/cert_file
+  delegate_to: tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud
+  wikimedia.wmcs.etcd_endpoint_health:
+    endpoints: https://tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud:2379
+    ca_file: /etc/etcd/ssl/ca.pem
+    cert_file: /etc/etcd/ssl/tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud.pem
+    key_file: /etc/etcd/ssl/tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud.priv
+  register: etcd_health
+
+'''
+
+RETURN = '''
+healthy:
+    description: True if all the probed endpoints are healthy and agree on the leader.
+    returned: On success
+    type: bool
+leader:
+    description: |
+        Member id of the leader, if all the endpoints that have one agree on
+        it, null otherwise.
+    returned: On success
+    type: str
+    sample: "5208bbf5c00e7cdf"
+unstarted_members:
+    description: Peer urls of the members that have been added but not started yet.
+    returned: On success
+    type: list
+    elements: str
+discovery_error:
+    description: Why the member list could not be retrieved, if it could not.
+    returned: When the member list could not be retrieved
+    type: str
+endpoints:
+    description: Dictionary with the probe results, keyed by endpoint.
+    returned: On success
+    type: complex
+    contains:
+        healthy:
+            description: True if the endpoint is healthy, has a leader and replied in time.
+            type: bool
+        latency:
+            description: Round trip time in seconds of the health request.
+            type: float
+            sample: 0.0042
+        elapsed:
+            description: Seconds spent on the whole probe.
+            type: float
+            sample: 0.0131
+        member_id:
+            description: Id of the member behind the endpoint.
+            type: str
+            sample: "5208bbf5c00e7cdf"
+        leader:
+            description: Id of the leader according to this member.
+            type: str
+            sample: "5208bbf5c00e7cdf"
+        is_leader:
+            description: True if this member is the leader.
+            type: bool
+        raft_index:
+            description: Current raft index of the member.
+            type: int
+            sample: 123
+        raft_term:
+            description: Current raft term of the member.
+            type: int
+            sample: 3
+        db_size:
+            description: Size of the backend database in bytes.
+            type: int
+            sample: 20480
+        version:
+            description: Version of the etcd server.
+            type: str
+            sample: "3.4.13"
+        error:
+            description: Why the endpoint is not healthy, null if it is.
+            type: str
+'''
+
+__metaclass__ = type
+from concurrent.futures import ThreadPoolExecutor
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.etcd import (
+    HAS_REQUESTS,
+    EtcdError,
+    EtcdGatewayClient,
+    get_common_etcdctl_args_specs,
+    probe_endpoint,
+)
+
+
+def get_endpoints_to_probe(module):
+    """
+    Returns the endpoints to probe, the peer urls of the unstarted members
+    and the error getting the member list if any.
+    """
+    endpoints = [endpoint.rstrip("/") for endpoint in module.params.get("endpoints").split(",") if endpoint]
+    if not module.params.get("discover_members"):
+        return endpoints, [], None
+
+    try:
+        members = EtcdGatewayClient(
+            endpoints=module.params.get("endpoints"),
+            cert_file=module.params.get("cert_file"),
+            key_file=module.params.get("key_file"),
+            ca_file=module.params.get("ca_file"),
+            timeout=module.params.get("timeout"),
+        ).get_members()
+    except EtcdError as error:
+        return endpoints, [], str(error)
+
+    unstarted_members = []
+    for member in members:
+        if not member["clientURLs"]:
+            unstarted_members.extend(member["peerURLs"])
+        for client_url in member["clientURLs"]:
+            if client_url.rstrip("/") not in endpoints:
+                endpoints.append(client_url.rstrip("/"))
+
+    return endpoints, unstarted_members, None
+
+
+def main():
+    """ Module entry point """
+
+    argument_spec = get_common_etcdctl_args_specs(
+        discover_members={"type": "bool", "required": False, "default": True},
+        max_workers={"type": "int", "required": False, "default": 10},
+        timeout={"type": "int", "required": False, "default": 5},
+    )
+    # this module only uses the json gateway
+    del argument_spec["client"]
+    module = AnsibleModule(
+        argument_spec,
+        supports_check_mode=True,
+    )
+    if not HAS_REQUESTS:
+        module.fail_json(msg="The requests python library is needed for this module")
+    if module.params.get("max_workers") < 1:
+        module.fail_json(msg=f"max_workers must be at least 1, got {module.params.get('max_workers')}")
+
+    endpoints, unstarted_members, discovery_error = get_endpoints_to_probe(module=module)
+
+    with ThreadPoolExecutor(max_workers=module.params.get("max_workers")) as executor:
+        futures = {
+            endpoint: executor.submit(
+                probe_endpoint,
+                endpoint=endpoint,
+                cert_file=module.params.get("cert_file"),
+                key_file=module.params.get("key_file"),
+                ca_file=module.params.get("ca_file"),
+                timeout=module.params.get("timeout"),
+            )
+            for endpoint in endpoints
+        }
+        results = {endpoint: future.result() for endpoint, future in futures.items()}
+
+    leaders = {result["leader"] for result in results.values() if result["leader"]}
+    leader = leaders.pop() if len(leaders) == 1 else None
+    extra_results = {"discovery_error": discovery_error} if discovery_error else {}
+    module.exit_json(
+        changed=False,
+        healthy=bool(results) and leader is not None and all(result["healthy"] for result in results.values()),
+        leader=leader,
+        unstarted_members=unstarted_members,
+        endpoints=results,
+        **extra_results,
+    )
+
+
+if __name__ == '__main__':
+    main()
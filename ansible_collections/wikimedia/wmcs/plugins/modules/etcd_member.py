@@ -42,6 +42,19 @@ options:
     description: Path to the key file to use
     required: true
     type: str
+  client:
+    description:
+      - How to talk to etcd, C(gateway) uses the etcd v3 json gateway
+        directly (reusing the same connection for all the requests),
+        C(etcdctl) runs the etcdctl command, and C(auto) uses the gateway if
+        it responds, etcdctl otherwise.
+    required: false
+    type: str
+    default: auto
+    choices:
+      - auto
+      - gateway
+      - etcdctl
   ensure:
     description: absent or present (default)
     required: false
@@ -61,6 +74,39 @@ options:
     required: false
     type: str
     default: ""
+  refresh_members:
+    description:
+      - Retrieve the list of members again after changing it, to return it
+        in I(members). Otherwise I(members) is only returned when nothing
+        changed.
+    required: false
+    type: bool
+    default: false
+  wait_for:
+    description:
+      - When I(ensure=present), wait until the member is in the given state,
+        polling the cluster with exponential backoff, each state implies the
+        previous ones.
+      - C(started) means that the member joined the cluster and got a name
+        and client urls, C(healthy) that its client urls report healthy, and
+        C(leader_known) that the cluster has a leader too.
+      - Note that a new member only starts once etcd is running on it, so
+        when adding one you probably want to use it in
+        M(wikimedia.wmcs.etcd_cluster_info) after starting etcd instead.
+      - If not set, it does not wait.
+    type: str
+    required: false
+    choices:
+      - started
+      - healthy
+      - leader_known
+  wait_timeout:
+    description:
+      - Maximum number of seconds to wait for I(wait_for), the module fails
+        if the condition is not met in time.
+    type: int
+    required: false
+    default: 120
 
 requirements:
   - "python >= 3.6"
@@ -83,13 +129,44 @@ EXAMPLES = '''
 RETURN = '''
 new_member_id:
     description: |
-        The id of the new member (or the existing one if it was already there).
+        The id of the new member (or the existing one if it was already
+        there, or was updated/removed).
     returned: On success
     type: str
     sample: "a35238e603a2372c"
+wait_elapsed:
+    description: Seconds spent waiting for the I(wait_for) condition.
+    returned: When using wait_for with ensure=present
+    type: float
+    sample: 3.52
+snapshot:
+    description: |
+        Snapshot of the membership after the change (as reported by the change itself), to pass in
+        members_snapshot to the next M(wikimedia.wmcs.etcd_cluster_info) tasks. This module always
+        lists the members before changing them, as a stale snapshot could add or remove the wrong
+        members.
+    returned: On success
+    type: dict
+    contains:
+        endpoints:
+            description: The endpoints the snapshot was taken from.
+            type: str
+        members:
+            description: The members, as returned by the etcd v3 api but with hex ids.
+            type: list
+            elements: dict
+        leader_id:
+            description: Id of the leader, if known.
+            type: str
+        members_hash:
+            description: Hash of the members, to check that the snapshot is not corrupted.
+            type: str
+        taken_at:
+            description: Unix timestamp of when the snapshot was taken.
+            type: float
 members:
     description: Dictionary with the list of members and some info.
-    returned: On success
+    returned: When nothing changed, or refresh_members is true
     type: complex
     contains:
         clientURLs:
@@ -119,9 +196,13 @@ members:
 __metaclass__ = type
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.wikimedia.wmcs.plugins.module_utils.etcd import (
+    EtcdError,
     get_common_etcdctl_args_specs,
-    get_etcdctl_args,
-    get_cluster_info,
+    get_etcd_client,
+    get_wait_for_args_specs,
+    make_snapshot,
+    members_to_cluster_info,
+    wait_for_members,
 )
 
 
@@ -141,6 +222,27 @@ def get_member_or_none(members, member_name, member_peer_url):
     )
 
 
+def get_changed_members(members, leader_id, action, member_id, new_member=None, peer_url=None):
+    """
+    Apply the change locally to the members list, so there's no need to
+    list them again after changing them.
+    """
+    if action == "add":
+        return members + [new_member], leader_id
+
+    if action == "update":
+        return [
+            dict(member, peerURLs=[peer_url]) if member["ID"] == member_id else member
+            for member in members
+        ], leader_id
+
+    # removing the leader triggers an election
+    return (
+        [member for member in members if member["ID"] != member_id],
+        None if member_id == leader_id else leader_id,
+    )
+
+
 def main():
     """ Module entry point """
 
@@ -154,69 +256,128 @@ def main():
             },
             member_fqdn={"type": "str", "required": True},
             member_peer_url={"type": "str", "required": False, "default": ""},
+            refresh_members={"type": "bool", "required": False, "default": False},
+            **get_wait_for_args_specs(),
         ),
         supports_check_mode=True,
     )
     ensure = module.params.get("ensure")
     member_fqdn = module.params.get("member_fqdn")
     member_peer_url = module.params.get("member_peer_url")
+    refresh_members = module.params.get("refresh_members")
+    wait_for = module.params.get("wait_for")
     if not member_peer_url:
         member_peer_url = f"https://{member_fqdn}:2380"
 
-    before_members = get_cluster_info(module)
+    endpoints = module.params.get("endpoints")
+    client = get_etcd_client(module)
+    try:
+        members, leader_id = client.get_members_and_leader()
+    except EtcdError as error:
+        module.fail_json(msg=f"Unable to get the etcd cluster info: {error}")
+    snapshot = make_snapshot(endpoints=endpoints, members=members, leader_id=leader_id)
+
+    before_members = members_to_cluster_info(members=members, leader_id=leader_id)
     current_entry = get_member_or_none(
         members=before_members,
         member_name=member_fqdn,
         member_peer_url=member_peer_url,
     )
-    extra_args = None
     if ensure == "present":
         if current_entry and current_entry['peerURLs'] == member_peer_url:
-            module.exit_json(
-                changed=False,
-                new_member_id=current_entry['member_id'],
-                members=before_members,
-                stdout="Already there",
-                stderr="",
-                rc=0,
-            )
+            action = None
         elif current_entry and current_entry['peerURLs'] != member_peer_url:
-            extra_args = ["member", "update", current_entry["member_id"], member_peer_url]
+            action = "update"
         else:
-            extra_args = ["member", "add", member_fqdn, member_peer_url]
+            action = "add"
 
     else:
         if not current_entry:
             module.exit_json(
                 changed=False,
                 members=before_members,
+                snapshot=snapshot,
                 stdout="Already not there.",
                 stderr="",
                 rc=0,
             )
 
-        extra_args = ["member", "remove", current_entry['member_id']]
+        action = "remove"
 
-    if extra_args is None:
-        module.fail_json(
-            changed=False,
+    if module.check_mode and action:
+        module.exit_json(
+            changed=True,
+            new_member_id=current_entry["member_id"] if current_entry else None,
             members=before_members,
-            stdout="This should never happen.",
+            snapshot=snapshot,
+            stdout="",
+            stderr="",
+            rc=0,
         )
 
-    args = get_etcdctl_args(
-        module_params=module.params,
-        extra_args=extra_args,
-    )
-    rc, out, err = module.run_command(args=args)
-    # unfortunately, this command does not give the member_id, but only the new
-    # name, that then member list does not show, so we have to diff before and
-    # after to find out which one is the new member id
-    after_members = get_cluster_info(module)
-    new_member_id = list(set(after_members.keys()) - set(before_members.keys()))[0]
-    module.exit_json(
-        changed=True, new_member_id=new_member_id, members=after_members, stdout=out, stderr=err, rc=rc
-    )
+    if action is None:
+        result = {
+            "changed": False,
+            "new_member_id": current_entry['member_id'],
+            "members": before_members,
+            "snapshot": snapshot,
+            "stdout": "Already there",
+            "stderr": "",
+            "rc": 0,
+        }
+    else:
+        new_member = None
+        try:
+            if action == "add":
+                new_member, out = client.add_member(name=member_fqdn, peer_url=member_peer_url)
+                new_member_id = new_member["ID"]
+            elif action == "update":
+                out = client.update_member(member_id=current_entry["member_id"], peer_url=member_peer_url)
+                new_member_id = current_entry["member_id"]
+            else:
+                out = client.remove_member(member_id=current_entry["member_id"])
+                new_member_id = current_entry["member_id"]
+        except EtcdError as error:
+            module.fail_json(msg=str(error), members=before_members)
+
+        if refresh_members:
+            try:
+                members, leader_id = client.get_members_and_leader()
+            except EtcdError as error:
+                module.fail_json(msg=f"Unable to get the etcd cluster info: {error}")
+        else:
+            members, leader_id = get_changed_members(
+                members=members,
+                leader_id=leader_id,
+                action=action,
+                member_id=new_member_id,
+                new_member=new_member,
+                peer_url=member_peer_url,
+            )
+
+        result = {
+            "changed": True,
+            "new_member_id": new_member_id,
+            "snapshot": make_snapshot(endpoints=endpoints, members=members, leader_id=leader_id),
+            "stdout": out,
+            "stderr": "",
+            "rc": 0,
+        }
+        if refresh_members:
+            result["members"] = members_to_cluster_info(members=members, leader_id=leader_id)
+
+    if wait_for and ensure == "present" and not module.check_mode:
+        try:
+            result["wait_elapsed"] = wait_for_members(
+                client=client,
+                wait_for=wait_for,
+                member_ids=[result["new_member_id"]],
+                timeout=module.params.get("wait_timeout"),
+            )
+        except EtcdError as error:
+            module.fail_json(msg=str(error), **result)
+
+    module.exit_json(**result)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,415 @@
+#!/usr/bin/python
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import (absolute_import, division, print_function)
+
+DOCUMENTATION = '''
+---
+author:
+  - David Caro (@david-caro)
+module: etcd_members
+short_description: Reconcile the etcd cluster members with a desired list
+description:
+  - Given the full list of members the cluster should have, computes the
+    changes needed from a single member list and applies them one at a time,
+    waiting for the cluster to be ready between steps, so quorum is never at
+    risk.
+  - The changes are applied in this order, the removal of members that
+    never started first (they don't count towards the quorum, and would make
+    the wait before the other steps fail), then peer url updates, and then
+    adding the new members interleaved with removing the old ones, so the
+    cluster does not shrink while replacing members. The members behind
+    I(endpoints) and the leader are removed last, after all the additions.
+  - Note that new members have to be started (etcd running on them and
+    trying to join) for the wait between steps to succeed.
+
+options:
+  endpoints:
+    description:
+      - Comma-separated list of endpoints to connect to (already existing etcd
+        members), Note that there should be no spaces!
+    type: str
+    required: true
+  ca_file:
+    description: Path to the ca file to use
+    type: str
+    required: false
+    default: /etc/etcd/ssl/ca.pem
+  cert_file:
+    description: Path to the cert file to use
+    type: str
+    required: true
+  key_file:
+    description: Path to the key file to use
+    type: str
+    required: true
+  client:
+    description:
+      - How to talk to etcd, C(gateway) uses the etcd v3 json gateway
+        directly (reusing the same connection for all the requests),
+        C(etcdctl) runs the etcdctl command, and C(auto) uses the gateway if
+        it responds, etcdctl otherwise.
+    type: str
+    required: false
+    default: auto
+    choices:
+      - auto
+      - gateway
+      - etcdctl
+  members:
+    description: Desired members of the cluster.
+    type: list
+    elements: dict
+    required: true
+    suboptions:
+      fqdn:
+        description: FQDN of the member, used as name.
+        type: str
+        required: true
+      peer_url:
+        description:
+          - Peer url of the member, if not passed it will use
+            https://<fqdn>:2380.
+        type: str
+        required: false
+  remove_unlisted:
+    description: Remove the members of the cluster that are not in I(members).
+    type: bool
+    required: false
+    default: true
+  wait_for:
+    description:
+      - State the cluster members have to be in before each change, and
+        after adding the last new member.
+      - See M(wikimedia.wmcs.etcd_cluster_info) for the meaning of each.
+    type: str
+    required: false
+    default: healthy
+    choices:
+      - started
+      - healthy
+      - leader_known
+  wait_timeout:
+    description:
+      - Maximum number of seconds to wait for I(wait_for) on each step, the
+        module fails (without applying the rest of the plan) if the
+        condition is not met in time.
+    type: int
+    required: false
+    default: 120
+
+requirements:
+  - "python >= 3.6"
+'''
+
+EXAMPLES = '''
+- name: Replace tools-k8s-etcd-1 with tools-k8s-etcd-4, note the delegate_to and the ca_file/cert_file
+  delegate_to: tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud
+  wikimedia.wmcs.etcd_members:
+    endpoints: https://tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud:2379
+    ca_file: /etc/etcd/ssl/ca.pem
+    cert_file: /etc/etcd/ssl/tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud.pem
+    key_file: /etc/etcd/ssl/tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud.priv
+    members:
+      - fqdn: tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud
+      - fqdn: tools-k8s-etcd-3.toolsbeta.eqiad1.wikimedia.cloud
+      - fqdn: tools-k8s-etcd-4.toolsbeta.eqiad1.wikimedia.cloud
+    wait_timeout: 300
+
+'''
+
+RETURN = '''
+plan:
+    description: List of the changes needed, in the order they are applied.
+    returned: On success
+    type: list
+    elements: dict
+    sample:
+        - action: add
+          name: tools-k8s-etcd-4.toolsbeta.eqiad1.wikimedia.cloud
+          peer_url: https://tools-k8s-etcd-4.toolsbeta.eqiad1.wikimedia.cloud:2380
+          member_id: null
+        - action: remove
+          name: tools-k8s-etcd-1.toolsbeta.eqiad1.wikimedia.cloud
+          peer_url: https://tools-k8s-etcd-1.toolsbeta.eqiad1.wikimedia.cloud:2380
+          member_id: "5208bbf5c00e7cdf"
+results:
+    description: |
+        Result of each of the applied steps of the plan, with the member id
+        (the new one for additions), the output of the operation and the
+        seconds spent waiting for the cluster before it.
+    returned: When not in check mode
+    type: list
+    elements: dict
+    sample:
+        - action: add
+          name: tools-k8s-etcd-4.toolsbeta.eqiad1.wikimedia.cloud
+          peer_url: https://tools-k8s-etcd-4.toolsbeta.eqiad1.wikimedia.cloud:2380
+          member_id: "a35238e603a2372c"
+          stdout: "..."
+          wait_elapsed: 0.04
+members:
+    description: |
+        Dictionary with the list of members and some info after applying the
+        plan, same as M(wikimedia.wmcs.etcd_cluster_info) returns. It is
+        built from the applied plan, so the new members show as unstarted.
+    returned: On success
+    type: dict
+wait_elapsed:
+    description: Total seconds spent waiting for the cluster.
+    returned: When not in check mode
+    type: float
+    sample: 12.3
+'''
+
+__metaclass__ = type
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.etcd import (
+    EtcdError,
+    get_common_etcdctl_args_specs,
+    get_etcd_client,
+    get_wait_for_args_specs,
+    wait_for_members,
+)
+
+
+def get_plan(current_members, desired_members, remove_unlisted, endpoints, leader_id):
+    """
+    Compute the steps to go from current_members (as returned by
+    EtcdClient.get_members) to desired_members (list of {"fqdn", "peer_url"}).
+    """
+    updates = []
+    adds = []
+    matched_ids = set()
+    for desired in desired_members:
+        current = next(
+            (
+                member
+                for member in current_members
+                if member["ID"] not in matched_ids
+                and (
+                    member["name"] == desired["fqdn"]
+                    # in case the member is not started, it does not show
+                    # the name, just the peer url
+                    or not member["name"] and desired["peer_url"] in member["peerURLs"]
+                )
+            ),
+            None,
+        )
+        step = {"name": desired["fqdn"], "peer_url": desired["peer_url"]}
+        if current is None:
+            adds.append(dict(step, action="add", member_id=None))
+            continue
+
+        matched_ids.add(current["ID"])
+        if current["peerURLs"] != [desired["peer_url"]]:
+            updates.append(dict(step, action="update", member_id=current["ID"]))
+
+    unstarted_removals = []
+    removals = []
+    if remove_unlisted:
+        for member in current_members:
+            if member["ID"] in matched_ids:
+                continue
+
+            step = {
+                "action": "remove",
+                "name": member["name"],
+                "peer_url": ",".join(member["peerURLs"]),
+                "member_id": member["ID"],
+            }
+            if not member["clientURLs"]:
+                unstarted_removals.append(step)
+            else:
+                removals.append((
+                    any(client_url.rstrip("/") in endpoints for client_url in member["clientURLs"]),
+                    member["ID"] == leader_id,
+                    step,
+                ))
+
+    # the members we are talking to and the leader go last, after all the
+    # additions, as the steps after removing them would fail otherwise
+    removals = sorted(removals, key=lambda removal: removal[:2])
+    last_removals = [step for is_endpoint, is_leader, step in removals if is_endpoint or is_leader]
+    removals = [step for is_endpoint, is_leader, step in removals if not is_endpoint and not is_leader]
+
+    # the unstarted members go first, as the wait before the other steps
+    # requires all the members to be started
+    plan = unstarted_removals + updates
+    # add before removing, so the cluster never gets smaller while replacing
+    # members
+    while adds or removals:
+        if adds:
+            plan.append(adds.pop(0))
+        if removals:
+            plan.append(removals.pop(0))
+
+    return plan + last_removals
+
+
+def apply_plan(client, plan, wait_for, wait_timeout):
+    """
+    Apply the steps one by one, waiting for all the members to be ready
+    before each one (except when removing unstarted members, as they are
+    not ready by definition) and after the last addition.
+
+    Returns the list of results and raises EtcdError on failure, with the
+    results so far in the 'results' attribute.
+    """
+    results = []
+    for index, step in enumerate(plan):
+        result = {
+            "action": step["action"],
+            "name": step["name"],
+            "peer_url": step["peer_url"],
+            "wait_elapsed": 0,
+        }
+        try:
+            # only started members have a name
+            is_unstarted_removal = step["action"] == "remove" and not step["name"]
+            if not is_unstarted_removal:
+                result["wait_elapsed"] = wait_for_members(
+                    client=client, wait_for=wait_for, timeout=wait_timeout
+                )
+
+            if step["action"] == "add":
+                new_member, result["stdout"] = client.add_member(name=step["name"], peer_url=step["peer_url"])
+                result["member_id"] = new_member["ID"]
+            elif step["action"] == "update":
+                result["stdout"] = client.update_member(member_id=step["member_id"], peer_url=step["peer_url"])
+                result["member_id"] = step["member_id"]
+            else:
+                result["stdout"] = client.remove_member(member_id=step["member_id"])
+                result["member_id"] = step["member_id"]
+
+            results.append(result)
+            if step["action"] == "add" and index == len(plan) - 1:
+                result["wait_elapsed"] += wait_for_members(
+                    client=client, wait_for=wait_for, timeout=wait_timeout
+                )
+        except EtcdError as error:
+            error.results = results + [dict(result, error=str(error))]
+            raise
+
+    return results
+
+
+def get_applied_members(current_members, leader_id, results):
+    """
+    Get the members and leader id after applying the steps in results,
+    without asking the cluster, as the member behind the endpoints might be
+    the last one removed.
+
+    New members are returned as unstarted, as they were when added.
+    """
+    members = {member["ID"]: dict(member) for member in current_members}
+    for step in results:
+        if step["action"] == "add":
+            members[step["member_id"]] = {
+                "ID": step["member_id"],
+                "name": "",
+                "peerURLs": [step["peer_url"]],
+                "clientURLs": [],
+            }
+        elif step["action"] == "update":
+            members[step["member_id"]]["peerURLs"] = [step["peer_url"]]
+        else:
+            members.pop(step["member_id"], None)
+
+    return list(members.values()), leader_id if leader_id in members else None
+
+
+def main():
+    """ Module entry point """
+
+    wait_for_args = get_wait_for_args_specs()
+    wait_for_args["wait_for"]["default"] = "healthy"
+    module = AnsibleModule(
+        get_common_etcdctl_args_specs(
+            members={
+                "type": "list",
+                "elements": "dict",
+                "required": True,
+                "options": {
+                    "fqdn": {"type": "str", "required": True},
+                    "peer_url": {"type": "str", "required": False},
+                },
+            },
+            remove_unlisted={"type": "bool", "required": False, "default": True},
+            **wait_for_args,
+        ),
+        supports_check_mode=True,
+    )
+    desired_members = [
+        {
+            "fqdn": member["fqdn"],
+            "peer_url": member["peer_url"] or f"https://{member['fqdn']}:2380",
+        }
+        for member in module.params.get("members")
+    ]
+    if not desired_members:
+        module.fail_json(msg="Refusing to remove all the members of the cluster")
+
+    client = get_etcd_client(module)
+    try:
+        current_members = client.get_members()
+        leader_id = client.get_leader_id()
+    except EtcdError as error:
+        module.fail_json(msg=f"Unable to get the etcd members: {error}")
+
+    endpoints = [endpoint.rstrip("/") for endpoint in module.params.get("endpoints").split(",") if endpoint]
+    plan = get_plan(
+        current_members=current_members,
+        desired_members=desired_members,
+        remove_unlisted=module.params.get("remove_unlisted"),
+        endpoints=endpoints,
+        leader_id=leader_id,
+    )
+    if not plan or module.check_mode:
+        module.exit_json(
+            changed=bool(plan),
+            plan=plan,
+            members=client.get_cluster_info(members=current_members, leader_id=leader_id),
+        )
+
+    try:
+        results = apply_plan(
+            client=client,
+            plan=plan,
+            wait_for=module.params.get("wait_for"),
+            wait_timeout=module.params.get("wait_timeout"),
+        )
+    except EtcdError as error:
+        module.fail_json(
+            msg=str(error),
+            changed=any("stdout" in result for result in error.results),
+            plan=plan,
+            results=error.results,
+        )
+
+    members, leader_id = get_applied_members(
+        current_members=current_members,
+        leader_id=leader_id,
+        results=results,
+    )
+    module.exit_json(
+        changed=True,
+        plan=plan,
+        results=results,
+        wait_elapsed=sum(result["wait_elapsed"] for result in results),
+        members=client.get_cluster_info(members=members, leader_id=leader_id),
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -35,6 +35,27 @@ options:
     required: false
     type: str
     default: /etc/kubernetes/manifests/kube-apiserver.yaml
+  wait_for_healthy:
+    description:
+      - After changing the file, wait until the kubelet restarted the
+        apiserver with the new etcd servers and it reports healthy.
+    required: false
+    type: bool
+    default: false
+  healthz_url:
+    description:
+      - Url of the apiserver health endpoint to check when using
+        I(wait_for_healthy), the certificate is not validated.
+    required: false
+    type: str
+    default: https://127.0.0.1:6443/healthz
+  healthy_timeout:
+    description:
+      - Maximum number of seconds to wait for the apiserver to be healthy
+        when using I(wait_for_healthy).
+    required: false
+    type: int
+    default: 300
 
 requirements:
   - "python >= 3.6"
@@ -48,21 +69,131 @@ EXAMPLES = '''
         - https://tools-k8s-etcd-1.toolsbeta.eqiad1.wikimedia.cloud:2379
         - https://tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud:2379
     apiserver_yaml_path: /etcd/custompath/apiserver.yaml
+    wait_for_healthy: true
 '''
 
 RETURN = '''
+old_members:
+    description: The previous etcd servers argument.
+    returned: On success
+    type: str
+    sample: "--etcd-servers=https://tools-k8s-etcd-1.toolsbeta.eqiad1.wikimedia.cloud:2379"
+new_members:
+    description: The new etcd servers argument.
+    returned: On success
+    type: str
+    sample: "--etcd-servers=https://tools-k8s-etcd-1.toolsbeta.eqiad1.wikimedia.cloud:2379,https://tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud:2379"
+elapsed:
+    description: |
+        Seconds it took for the apiserver to be healthy again with the new
+        etcd servers.
+    returned: When the file changed and wait_for_healthy is true
+    type: float
+    sample: 23.4
 '''
 
 __metaclass__ = type
-import yaml
 import os
+import re
+import tempfile
+import time
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.common.text.converters import jsonify
+from ansible.module_utils.urls import open_url
 from ansible_collections.wikimedia.wmcs.plugins.module_utils.etcd import (
     get_common_etcdctl_args_specs,
     get_cluster_info,
 )
 
+HEALTHY_POLL_INTERVAL = 2
+# the '- --etcd-servers=<urls>' item of the apiserver command list, maybe quoted
+ETCD_SERVERS_ARG_REGEX = re.compile(
+    rb"""^(?P<prefix>[ \t]*-[ \t]+["']?)(?P<arg>--etcd-servers=[^\s"']*)(?P<suffix>["']?[ \t]*)$""",
+    re.MULTILINE,
+)
+
+
+def replace_etcd_servers_arg(manifest, new_arg):
+    """
+    Replace only the etcd servers arg in the manifest (bytes), keeping the
+    rest of the file (comments, ordering, quoting...) untouched, so the
+    kubelet does not see any other change.
+
+    Returns the old arg and the new manifest, or None and None if there's
+    not exactly one etcd servers arg.
+    """
+    matches = list(ETCD_SERVERS_ARG_REGEX.finditer(manifest))
+    if len(matches) != 1:
+        return None, None
+
+    match = matches[0]
+    new_manifest = manifest[:match.start("arg")] + new_arg.encode("utf-8") + manifest[match.end("arg"):]
+    return match.group("arg").decode("utf-8"), new_manifest
+
+
+def write_atomically(module, path, content):
+    # the kubelet ignores hidden files in the manifests dir, so it will not
+    # try to start the temporary file as a pod
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_fd:
+            tmp_fd.write(content)
+        module.atomic_move(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def is_apiserver_running_with_arg(arg):
+    """Check if there's a kube-apiserver process running with the given arg."""
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as cmdline_fd:
+                cmdline = cmdline_fd.read().decode("utf-8", "replace").split("\0")
+        except OSError:
+            # the process went away
+            continue
+
+        if cmdline and os.path.basename(cmdline[0]) == "kube-apiserver" and arg in cmdline:
+            return True
+
+    return False
+
+
+def is_apiserver_healthy(healthz_url):
+    try:
+        response = open_url(healthz_url, validate_certs=False, timeout=5)
+        return response.getcode() == 200 and response.read().strip() == b"ok"
+    except Exception:
+        return False
+
+
+def wait_for_healthy_apiserver(module, etcd_servers_arg):
+    """
+    The kubelet takes a bit to notice the change and restart the apiserver,
+    so until there's a process running with the new arg, the health endpoint
+    is still the old apiserver one.
+    """
+    start = time.monotonic()
+    timeout = module.params.get("healthy_timeout")
+    while time.monotonic() - start < timeout:
+        if (
+            is_apiserver_running_with_arg(etcd_servers_arg)
+            and is_apiserver_healthy(module.params.get("healthz_url"))
+        ):
+            return time.monotonic() - start
+
+        time.sleep(HEALTHY_POLL_INTERVAL)
+
+    module.fail_json(
+        changed=True,
+        msg=f"Timed out after {timeout}s waiting for the apiserver to be healthy with {etcd_servers_arg}",
+    )
+
 
 def main():
     """ Module entry point """
@@ -70,6 +201,9 @@ def main():
     argument_spec = {
         "etcd_members": {"type": "list", "elements": "str", "required": True},
         "apiserver_yaml_path": {"type": "str", "required": False, "default": "/etc/kubernetes/manifests/kube-apiserver.yaml"},
+        "wait_for_healthy": {"type": "bool", "required": False, "default": False},
+        "healthz_url": {"type": "str", "required": False, "default": "https://127.0.0.1:6443/healthz"},
+        "healthy_timeout": {"type": "int", "required": False, "default": 300},
     }
     module = AnsibleModule(
         argument_spec,
@@ -80,31 +214,38 @@ def main():
     apiserver_yaml_path = module.params.get('apiserver_yaml_path')
 
     if not os.path.exists(apiserver_yaml_path):
-        module.fail_json(message=f"{apiserver_yaml_path} does not exist.")
+        module.fail_json(msg=f"{apiserver_yaml_path} does not exist.")
 
     new_etcd_members_arg = "--etcd-servers=" + ",".join(sorted(etcd_members))
-    apiserver_yaml = yaml.load(open(apiserver_yaml_path))
-
-    # we expect the container to be the first and only in the spec
-    command_args = apiserver_yaml['spec']['containers'][0]['command']
-    for index, arg in enumerate(command_args):
-        if arg.startswith('--etcd-servers='):
-            if arg == new_etcd_members_arg:
-                module.exit_json(changed=False, old_members=arg, new_members=new_etcd_members_arg)
-            else:
-                command_args[index] = new_etcd_members_arg
-                with open(apiserver_yaml_path, 'w') as apiserver_fd:
-                    apiserver_fd.write(yaml.dump(apiserver_yaml))
-
-                module.exit_json(changed=True, old_members=arg, new_members=new_etcd_members_arg)
-
-    module.fail_json(
-        changed=False,
-        message=(
-            "Unable to find the etcd-servers command arg in the "
-            f"{apiserver_yaml_path} definition file"
-        ),
-    )
+    with open(apiserver_yaml_path, "rb") as apiserver_fd:
+        manifest = apiserver_fd.read()
+
+    old_etcd_members_arg, new_manifest = replace_etcd_servers_arg(manifest=manifest, new_arg=new_etcd_members_arg)
+    if new_manifest is None:
+        module.fail_json(
+            changed=False,
+            msg=(
+                "Unable to find exactly one etcd-servers command arg in the "
+                f"{apiserver_yaml_path} definition file"
+            ),
+        )
+
+    result = {"old_members": old_etcd_members_arg, "new_members": new_etcd_members_arg}
+    # any rewrite of the file restarts the apiserver, so don't touch it unless
+    # needed
+    if new_manifest == manifest:
+        module.exit_json(changed=False, **result)
+
+    if module.check_mode:
+        module.exit_json(changed=True, **result)
+
+    write_atomically(module=module, path=apiserver_yaml_path, content=new_manifest)
+    if module.params.get("wait_for_healthy"):
+        result["elapsed"] = wait_for_healthy_apiserver(
+            module=module, etcd_servers_arg=new_etcd_members_arg
+        )
+
+    module.exit_json(changed=True, **result)
 
 
 if __name__ == '__main__':
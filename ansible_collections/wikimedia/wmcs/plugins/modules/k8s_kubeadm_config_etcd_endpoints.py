@@ -0,0 +1,148 @@
+#!/usr/bin/python
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import (absolute_import, division, print_function)
+
+DOCUMENTATION = '''
+---
+author:
+  - David Caro (@david-caro)
+module: k8s_kubeadm_config_etcd_endpoints
+short_description: Update the etcd endpoints in the kubeadm-config configmap.
+description:
+  - Update the external etcd endpoints in the ClusterConfiguration of the
+    kubeadm-config configmap, using kubectl on a k8s control node.
+  - The configmap is retrieved once, and only replaced if the endpoints
+    changed. The replace uses the retrieved resource version, so it fails
+    instead of overwriting any change done in between.
+
+options:
+  etcd_members:
+    description:
+      - List of endpoints (full url) for each of the etcd members.
+    required: true
+    type: list
+    elements: str
+  namespace:
+    description: Namespace of the configmap.
+    required: false
+    type: str
+    default: kube-system
+  configmap:
+    description: Name of the configmap.
+    required: false
+    type: str
+    default: kubeadm-config
+  kubeconfig:
+    description:
+      - Path to the kubeconfig file to use, if not passed kubectl uses its
+        default one.
+    required: false
+    type: str
+
+requirements:
+  - "python >= 3.6"
+  - "kubectl"
+'''
+
+EXAMPLES = '''
+- name: Update etcd members in the kubeadm config
+  become: true
+  delegate_to: tools-k8s-control-2.toolsbeta.eqiad1.wikimedia.cloud
+  wikimedia.wmcs.k8s_kubeadm_config_etcd_endpoints:
+    etcd_members:
+        - https://tools-k8s-etcd-1.toolsbeta.eqiad1.wikimedia.cloud:2379
+        - https://tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud:2379
+'''
+
+RETURN = '''
+old_endpoints:
+    description: The etcd endpoints before the change.
+    returned: On success
+    type: list
+    elements: str
+    sample:
+        - https://tools-k8s-etcd-1.toolsbeta.eqiad1.wikimedia.cloud:2379
+new_endpoints:
+    description: The etcd endpoints after the change.
+    returned: On success
+    type: list
+    elements: str
+    sample:
+        - https://tools-k8s-etcd-1.toolsbeta.eqiad1.wikimedia.cloud:2379
+        - https://tools-k8s-etcd-2.toolsbeta.eqiad1.wikimedia.cloud:2379
+'''
+
+__metaclass__ = type
+import json
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.wikimedia.wmcs.plugins.module_utils import yaml_utils
+
+
+def run_kubectl(module, args, data=None):
+    kubectl_args = ["kubectl", f"--namespace={module.params.get('namespace')}"]
+    if module.params.get("kubeconfig"):
+        kubectl_args.append(f"--kubeconfig={module.params.get('kubeconfig')}")
+
+    rc, out, err = module.run_command(args=kubectl_args + args, data=data)
+    if rc != 0:
+        module.fail_json(
+            msg=f"Command {kubectl_args + args} failed",
+            rc=rc,
+            stdout=out,
+            stderr=err,
+        )
+
+    return out
+
+
+def main():
+    """ Module entry point """
+
+    argument_spec = {
+        "etcd_members": {"type": "list", "elements": "str", "required": True},
+        "namespace": {"type": "str", "required": False, "default": "kube-system"},
+        "configmap": {"type": "str", "required": False, "default": "kubeadm-config"},
+        "kubeconfig": {"type": "str", "required": False},
+    }
+    module = AnsibleModule(
+        argument_spec,
+        supports_check_mode=True,
+    )
+
+    new_endpoints = sorted(module.params.get("etcd_members"))
+    out = run_kubectl(module=module, args=["get", "configmap", module.params.get("configmap"), "--output=json"])
+    try:
+        configmap = json.loads(out)
+        # the cluster configuration is a yaml document inside the configmap
+        cluster_config = yaml_utils.load(configmap["data"]["ClusterConfiguration"])
+        external_etcd = cluster_config["etcd"]["external"]
+    except (ValueError, KeyError, TypeError, yaml_utils.YAMLError) as error:
+        module.fail_json(msg=f"Unable to find the external etcd config in the configmap: {error}", stdout=out)
+
+    old_endpoints = external_etcd.get("endpoints", [])
+    result = {"old_endpoints": old_endpoints, "new_endpoints": new_endpoints}
+    if sorted(old_endpoints) == new_endpoints:
+        module.exit_json(changed=False, **result)
+
+    if module.check_mode:
+        module.exit_json(changed=True, **result)
+
+    external_etcd["endpoints"] = new_endpoints
+    configmap["data"]["ClusterConfiguration"] = yaml_utils.dump(cluster_config, default_flow_style=False)
+    run_kubectl(module=module, args=["replace", "--filename=-"], data=json.dumps(configmap))
+    module.exit_json(changed=True, **result)
+
+
+if __name__ == '__main__':
+    main()
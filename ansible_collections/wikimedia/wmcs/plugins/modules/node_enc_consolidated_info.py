@@ -21,6 +21,9 @@ module: node_enc_consolidated_info
 short_description: Get information from the puppet enc about a host
 description:
   - Get information from the puppet enc
+  - When passing I(fqdns), all the nodes are fetched concurrently in a single
+    module invocation, and the errors are reported per node instead of failing
+    on the first one.
 
 options:
   enc_url:
@@ -33,9 +36,28 @@ options:
     required: true
     type: str
   fqdn:
-    description: FQDN of the node to retrieve the hiera and roles from
-    required: true
+    description:
+      - FQDN of the node to retrieve the hiera and roles from
+      - Mutually exclusive with I(fqdns).
+    required: false
     type: str
+  fqdns:
+    description:
+      - List of FQDNs of the nodes to retrieve the hiera and roles from.
+      - Mutually exclusive with I(fqdn).
+    required: false
+    type: list
+    elements: str
+  max_workers:
+    description:
+      - Maximum number of nodes to fetch at the same time when using I(fqdns),
+        must be at least 1.
+    required: false
+    type: int
+    default: 10
+
+extends_documentation_fragment:
+  - wikimedia.wmcs.enc_connection
 
 requirements:
   - "python >= 3.6"
@@ -48,51 +70,148 @@ EXAMPLES = '''
     openstack_project: my_project
     fqdn: toolsbeta-proxy-1.toolsbeta.eqiad1.wikimedia.cloud
 
+- name: Fetch hiera data for many openstack vms at once
+  wikimedia.wmcs.node_enc_consolidated_info:
+    enc_url: http://example.enc:8180/v1
+    openstack_project: my_project
+    fqdns:
+      - toolsbeta-proxy-1.toolsbeta.eqiad1.wikimedia.cloud
+      - toolsbeta-proxy-2.toolsbeta.eqiad1.wikimedia.cloud
+    max_workers: 20
+
 '''
 
 RETURN = '''
+enc_stats:
+    description: Counters for the requests done to the enc.
+    returned: On success
+    type: dict
+    sample:
+        requests: 2
+        retries: 1
+        failures: 1
+        cache_hits: 0
+        total_latency: 0.0451
+        max_latency: 0.0302
+enc_data:
+    description: |
+        The consolidated enc data for the node, or when using fqdns, a
+        dictionary with the enc data for each node that could be retrieved,
+        keyed by fqdn.
+    returned: On success
+    type: dict
+errors:
+    description: |
+        Dictionary with the error message for each node that could not be
+        retrieved, keyed by fqdn.
+    returned: When using fqdns
+    type: dict
+    sample:
+        toolsbeta-proxy-2.toolsbeta.eqiad1.wikimedia.cloud: "Unable to get node info data for..."
+parse_time:
+    description: |
+        Seconds spent parsing the enc responses (added up for all the nodes
+        when using fqdns).
+    returned: On success
+    type: float
+    sample: 0.0123
 '''
 
 __metaclass__ = type
-import yaml
+from concurrent.futures import ThreadPoolExecutor
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.common.text.converters import jsonify
-from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import EncConnection
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import (
+    EncError,
+    get_common_enc_args_specs,
+    get_enc_connection,
+    parse_enc_response,
+)
+
+
+def get_node_data(conn, fqdn):
+    res = conn.get_node_consolidated_info(fqdn=fqdn)
+    return parse_enc_response(res)
+
+
+def get_many_nodes_data(conn, fqdns, max_workers):
+    nodes_data = {}
+    errors = {}
+    parse_time = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            fqdn: executor.submit(get_node_data, conn=conn, fqdn=fqdn)
+            for fqdn in set(fqdns)
+        }
+        for fqdn, future in futures.items():
+            try:
+                nodes_data[fqdn], node_parse_time = future.result()
+                parse_time += node_parse_time
+            except Exception as error:
+                errors[fqdn] = str(error)
+
+    return nodes_data, errors, parse_time
 
 
 def main():
     """ Module entry point """
 
-    argument_spec = {
-        "enc_url": {"type": "str", "required": True},
-        "openstack_project": {"type": "str", "required": True},
-        "fqdn": {"type": "str", "required": True},
-    }
+    argument_spec = get_common_enc_args_specs(
+        fqdn={"type": "str", "required": False},
+        fqdns={"type": "list", "elements": "str", "required": False},
+        max_workers={"type": "int", "required": False, "default": 10},
+    )
     module = AnsibleModule(
         argument_spec,
+        mutually_exclusive=[("fqdn", "fqdns")],
+        required_one_of=[("fqdn", "fqdns")],
         supports_check_mode=True,
     )
 
-    enc_url = module.params.get('enc_url')
     openstack_project = module.params.get('openstack_project')
     fqdn = module.params.get('fqdn')
+    fqdns = module.params.get('fqdns')
+    max_workers = module.params.get('max_workers')
+    if max_workers < 1:
+        module.fail_json(msg=f"max_workers must be at least 1, got {max_workers}")
+
+    if fqdns is not None:
+        # make sure the pool can hold a connection per worker, so they don't
+        # have to reconnect
+        conn = get_enc_connection(
+            module_params=module.params,
+            pool_maxsize=max(max_workers, module.params.get('enc_pool_maxsize')),
+        )
+        nodes_data, errors, parse_time = get_many_nodes_data(conn=conn, fqdns=fqdns, max_workers=max_workers)
+        module.exit_json(
+            changed=False,
+            enc_data=nodes_data,
+            errors=errors,
+            parse_time=parse_time,
+            fqdns=fqdns,
+            openstack_project=openstack_project,
+            enc_stats=conn.stats.to_dict(),
+        )
 
-    conn = EncConnection(enc_url=enc_url, openstack_project=openstack_project)
-    res = conn.get_node_consolidated_info(fqdn=fqdn)
-    if res.status_code != 200:
-        module.fail_json("Error trying to contact the enc backend: %s" % res.raw)
-
+    conn = get_enc_connection(module_params=module.params)
     try:
-        data = yaml.load(res.text)
-    except Exception as error:
-        module.fail_json(
-            "Error parsing response from the enc backend: %s\nResponse:\n%s" % (
-                error,
-                res.raw,
-            ),
-        )
+        res = conn.get_node_consolidated_info(fqdn=fqdn)
+    except EncError as error:
+        module.fail_json(str(error), enc_stats=conn.stats.to_dict())
 
-    module.exit_json(changed=False, enc_data=data, fqdn=fqdn, openstack_project=openstack_project)
+    try:
+        data, parse_time = parse_enc_response(res)
+    except EncError as error:
+        module.fail_json(str(error), enc_stats=conn.stats.to_dict())
+
+    module.exit_json(
+        changed=False,
+        enc_data=data,
+        parse_time=parse_time,
+        fqdn=fqdn,
+        openstack_project=openstack_project,
+        enc_stats=conn.stats.to_dict(),
+    )
 
 
 if __name__ == '__main__':
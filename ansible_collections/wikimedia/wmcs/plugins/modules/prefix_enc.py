@@ -21,6 +21,8 @@ module: prefix_enc
 short_description: Set information from the puppet enc for the prefix
 description:
   - Set information from the puppet enc for the prefix
+  - The current hiera for the prefix is retrieved and compared with the new
+    one, and only if they differ the new one is uploaded.
 
 options:
   enc_url:
@@ -37,9 +39,46 @@ options:
     required: true
     type: str
   data:
-    description: Hiera data to set (a string in yaml format)
-    required: true
+    description:
+      - Hiera data to set (a string in yaml format), replaces the whole
+        document.
+      - Mutually exclusive with I(operations).
+    required: false
     type: str
+  operations:
+    description:
+      - List of key level changes to apply to the current hiera, in order.
+      - Mutually exclusive with I(data).
+    required: false
+    type: list
+    elements: dict
+    suboptions:
+      op:
+        description:
+          - C(set) sets the key to the value.
+          - C(append_unique) appends the value (or each of the values if it's
+            a list) to the list under the key if it's not there yet, creating
+            it if needed.
+          - C(remove) removes the key, or if a value is passed, removes the
+            value (or each of the values if it's a list) from the list under
+            the key.
+        required: true
+        type: str
+        choices:
+          - set
+          - append_unique
+          - remove
+      key:
+        description: Hiera key to change.
+        required: true
+        type: str
+      value:
+        description: Value for the operation.
+        required: false
+        type: raw
+
+extends_documentation_fragment:
+  - wikimedia.wmcs.enc_connection
 
 requirements:
   - "python >= 3.6"
@@ -57,53 +96,141 @@ EXAMPLES = '''
             208.80.154.135: 208.80.154.135
         http_proxy: ''
 
+- name: Add a new etcd node to the prefix hiera
+  wikimedia.wmcs.prefix_enc:
+    enc_url: http://example.enc:8180/v1
+    openstack_project: my_project
+    prefix: toolsbeta-test-k8s-etcd
+    operations:
+      - op: append_unique
+        key: profile::toolforge::k8s::etcd_nodes
+        value: toolsbeta-test-k8s-etcd-4.toolsbeta.eqiad1.wikimedia.cloud
+      - op: remove
+        key: profile::toolforge::k8s::etcd_nodes
+        value: toolsbeta-test-k8s-etcd-1.toolsbeta.eqiad1.wikimedia.cloud
+
 '''
 
 RETURN = '''
+enc_stats:
+    description: Counters for the requests done to the enc.
+    returned: On success
+    type: dict
+    sample:
+        requests: 2
+        retries: 1
+        failures: 1
+        cache_hits: 0
+        total_latency: 0.0451
+        max_latency: 0.0302
+result:
+    description: Response from the enc to the update, empty if nothing changed.
+    returned: On success
+    type: dict
+hiera:
+    description: The resulting hiera for the prefix.
+    returned: On success
+    type: dict
+parse_time:
+    description: Seconds spent parsing the enc responses.
+    returned: On success
+    type: float
+    sample: 0.0123
 '''
 
 __metaclass__ = type
-import yaml
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.common.text.converters import jsonify
-from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import EncConnection
+from ansible_collections.wikimedia.wmcs.plugins.module_utils import yaml_utils
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import (
+    EncError,
+    EncNotFoundError,
+    get_common_enc_args_specs,
+    get_enc_connection,
+    parse_enc_response,
+)
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_hiera import (
+    HieraOperationError,
+    apply_hiera_operations,
+    dump_hiera,
+    get_hiera_operations_spec,
+)
 
 
 def main():
     """ Module entry point """
 
-    argument_spec = {
-        "enc_url": {"type": "str", "required": True},
-        "openstack_project": {"type": "str", "required": True},
-        "prefix": {"type": "str", "required": True},
-        "data": {"type": "str", "required": True},
-    }
+    argument_spec = get_common_enc_args_specs(
+        prefix={"type": "str", "required": True},
+        data={"type": "str", "required": False},
+        operations=get_hiera_operations_spec(),
+    )
     module = AnsibleModule(
         argument_spec,
+        mutually_exclusive=[("data", "operations")],
+        required_one_of=[("data", "operations")],
         supports_check_mode=True,
     )
 
-    enc_url = module.params.get('enc_url')
     openstack_project = module.params.get('openstack_project')
     prefix = module.params.get('prefix')
     data = module.params.get('data')
+    operations = module.params.get('operations')
 
-    conn = EncConnection(enc_url=enc_url, openstack_project=openstack_project)
-    res = conn.set_prefix_hiera(prefix=prefix, data=data)
-    if res.status_code != 200:
-        module.fail_json("Error trying to contact the enc backend: %s" % res.raw)
+    conn = get_enc_connection(module_params=module.params)
+    try:
+        # never trust the cache here, we are going to write the result back
+        current_res = conn.get_prefix_hiera(prefix=prefix, use_cache=False)
+        current_data, parse_time = parse_enc_response(current_res, nested_hiera=True)
+        current_hiera = current_data["hiera"] or {}
+    except EncNotFoundError:
+        # it will be created
+        current_hiera = {}
+        parse_time = 0
+    except EncError as error:
+        module.fail_json(str(error), enc_stats=conn.stats.to_dict())
 
     try:
-        data = yaml.load(res.text)
-    except Exception as error:
-        module.fail_json(
-            "Error parsing response from the enc backend: %s\nResponse:\n%s" % (
-                error,
-                res.raw,
-            ),
+        if operations is not None:
+            new_hiera = apply_hiera_operations(hiera=current_hiera, operations=operations)
+            data = dump_hiera(new_hiera)
+        else:
+            new_hiera = yaml_utils.load(data) or {}
+    except (HieraOperationError, yaml_utils.YAMLError) as error:
+        module.fail_json(f"Unable to generate the new hiera for prefix {prefix}: {error}")
+
+    changed = new_hiera != current_hiera
+    diff = {
+        "before": dump_hiera(current_hiera),
+        "after": dump_hiera(new_hiera),
+    }
+    if not changed or module.check_mode:
+        module.exit_json(
+            changed=changed,
+            result={},
+            hiera=new_hiera,
+            diff=diff,
+            parse_time=parse_time,
+            prefix=prefix,
+            openstack_project=openstack_project,
+            enc_stats=conn.stats.to_dict(),
         )
 
-    module.exit_json(changed=False, result=data, prefix=prefix, openstack_project=openstack_project)
+    try:
+        res = conn.set_prefix_hiera(prefix=prefix, data=data)
+        result, set_parse_time = parse_enc_response(res)
+    except EncError as error:
+        module.fail_json(str(error), enc_stats=conn.stats.to_dict())
+
+    module.exit_json(
+        changed=True,
+        result=result,
+        hiera=new_hiera,
+        diff=diff,
+        parse_time=parse_time + set_parse_time,
+        prefix=prefix,
+        openstack_project=openstack_project,
+        enc_stats=conn.stats.to_dict(),
+    )
 
 
 if __name__ == '__main__':
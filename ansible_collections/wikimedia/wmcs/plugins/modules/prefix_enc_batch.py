@@ -0,0 +1,248 @@
+#!/usr/bin/python
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+from __future__ import (absolute_import, division, print_function)
+
+DOCUMENTATION = '''
+---
+author:
+  - David Caro (@david-caro)
+module: prefix_enc_batch
+short_description: Apply hiera changes to several prefixes of the puppet enc at once
+description:
+  - Apply key level hiera changes to several prefixes at once.
+  - All the current prefixes hiera are fetched concurrently, the changes are
+    applied, and only the prefixes that changed are uploaded, again
+    concurrently.
+
+options:
+  enc_url:
+    description:
+      - Base url to the enc service
+    required: true
+    type: str
+  openstack_project:
+    description: Openstack project to get info for
+    required: true
+    type: str
+  prefixes:
+    description:
+      - Dictionary with the prefix as key, and the list of operations to apply
+        to its hiera as value.
+      - See the I(operations) option of M(wikimedia.wmcs.prefix_enc) for the
+        format of the operations.
+    required: true
+    type: dict
+  max_workers:
+    description: Maximum number of prefixes to fetch/update at the same time, must be at least 1.
+    required: false
+    type: int
+    default: 10
+
+extends_documentation_fragment:
+  - wikimedia.wmcs.enc_connection
+
+requirements:
+  - "python >= 3.6"
+'''
+
+EXAMPLES = '''
+- name: Add the new nodes to the etcd and control prefixes
+  wikimedia.wmcs.prefix_enc_batch:
+    enc_url: http://example.enc:8180/v1
+    openstack_project: my_project
+    prefixes:
+      toolsbeta-test-k8s-etcd:
+        - op: append_unique
+          key: profile::toolforge::k8s::etcd_nodes
+          value: toolsbeta-test-k8s-etcd-4.toolsbeta.eqiad1.wikimedia.cloud
+      toolsbeta-test-k8s-control:
+        - op: append_unique
+          key: profile::toolforge::k8s::etcd_nodes
+          value: toolsbeta-test-k8s-etcd-4.toolsbeta.eqiad1.wikimedia.cloud
+
+'''
+
+RETURN = '''
+enc_stats:
+    description: Counters for the requests done to the enc.
+    returned: On success
+    type: dict
+    sample:
+        requests: 2
+        retries: 1
+        failures: 1
+        cache_hits: 0
+        total_latency: 0.0451
+        max_latency: 0.0302
+prefixes:
+    description: Summary of the changes for each prefix, keyed by prefix.
+    returned: On success
+    type: complex
+    contains:
+        changed:
+            description: |
+                If the hiera for the prefix was changed. Also true when the
+                update failed after being sent, as the enc might have applied
+                it anyhow.
+            type: bool
+        hiera:
+            description: The resulting hiera for the prefix.
+            type: dict
+        error:
+            description: Error message if the prefix could not be updated.
+            type: str
+            returned: On error
+parse_time:
+    description: Seconds spent parsing the enc responses, for all the prefixes.
+    returned: On success
+    type: float
+    sample: 0.0123
+'''
+
+__metaclass__ = type
+from concurrent.futures import ThreadPoolExecutor
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import (
+    EncNotFoundError,
+    EncRequestNotSentError,
+    get_common_enc_args_specs,
+    get_enc_connection,
+    parse_enc_response,
+)
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_hiera import (
+    HieraOperationError,
+    apply_hiera_operations,
+    dump_hiera,
+    validate_hiera_operations,
+)
+
+
+def get_new_hiera(conn, prefix, operations):
+    # never trust the cache here, we are going to write the result back
+    try:
+        res = conn.get_prefix_hiera(prefix=prefix, use_cache=False)
+        current_data, parse_time = parse_enc_response(res, nested_hiera=True)
+        current_hiera = current_data["hiera"] or {}
+    except EncNotFoundError:
+        # it will be created
+        current_hiera = {}
+        parse_time = 0
+
+    new_hiera = apply_hiera_operations(hiera=current_hiera, operations=operations)
+    return current_hiera, new_hiera, parse_time
+
+
+def set_new_hiera(conn, prefix, new_hiera):
+    res = conn.set_prefix_hiera(prefix=prefix, data=dump_hiera(new_hiera))
+    return parse_enc_response(res)
+
+
+def main():
+    """ Module entry point """
+
+    argument_spec = get_common_enc_args_specs(
+        prefixes={"type": "dict", "required": True},
+        max_workers={"type": "int", "required": False, "default": 10},
+    )
+    module = AnsibleModule(
+        argument_spec,
+        supports_check_mode=True,
+    )
+
+    openstack_project = module.params.get('openstack_project')
+    prefixes = module.params.get('prefixes')
+    max_workers = module.params.get('max_workers')
+    if max_workers < 1:
+        module.fail_json(msg=f"max_workers must be at least 1, got {max_workers}")
+
+    for prefix, operations in prefixes.items():
+        try:
+            validate_hiera_operations(operations)
+        except HieraOperationError as error:
+            module.fail_json(f"Invalid operations for prefix {prefix}: {error}")
+
+    # make sure the pool can hold a connection per worker, so they don't have
+    # to reconnect
+    conn = get_enc_connection(
+        module_params=module.params,
+        pool_maxsize=max(max_workers, module.params.get('enc_pool_maxsize')),
+    )
+    summary = {}
+    diff = {"before": {}, "after": {}}
+    parse_time = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        get_futures = {
+            prefix: executor.submit(get_new_hiera, conn=conn, prefix=prefix, operations=operations)
+            for prefix, operations in prefixes.items()
+        }
+        to_update = {}
+        for prefix, future in get_futures.items():
+            try:
+                current_hiera, new_hiera, prefix_parse_time = future.result()
+            except Exception as error:
+                summary[prefix] = {"changed": False, "error": str(error)}
+                continue
+
+            parse_time += prefix_parse_time
+            changed = new_hiera != current_hiera
+            summary[prefix] = {"changed": changed, "hiera": new_hiera}
+            if changed:
+                diff["before"][prefix] = dump_hiera(current_hiera)
+                diff["after"][prefix] = dump_hiera(new_hiera)
+                to_update[prefix] = new_hiera
+
+        if not module.check_mode:
+            set_futures = {
+                prefix: executor.submit(set_new_hiera, conn=conn, prefix=prefix, new_hiera=new_hiera)
+                for prefix, new_hiera in to_update.items()
+            }
+            for prefix, future in set_futures.items():
+                try:
+                    _, prefix_parse_time = future.result()
+                    parse_time += prefix_parse_time
+                except EncRequestNotSentError as error:
+                    summary[prefix]["changed"] = False
+                    summary[prefix]["error"] = str(error)
+                except Exception as error:
+                    # it might have been applied before failing, so it stays
+                    # as changed
+                    summary[prefix]["error"] = str(error)
+
+    changed = any(prefix_summary["changed"] for prefix_summary in summary.values())
+    errors = {
+        prefix: prefix_summary["error"]
+        for prefix, prefix_summary in summary.items()
+        if "error" in prefix_summary
+    }
+    if errors:
+        module.fail_json(
+            f"Unable to update some of the prefixes: {errors}",
+            changed=changed,
+            prefixes=summary,
+            openstack_project=openstack_project,
+            enc_stats=conn.stats.to_dict(),
+        )
+
+    module.exit_json(
+        changed=changed,
+        prefixes=summary,
+        diff=diff,
+        parse_time=parse_time,
+        openstack_project=openstack_project,
+        enc_stats=conn.stats.to_dict(),
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -37,6 +37,9 @@ options:
     required: true
     type: str
 
+extends_documentation_fragment:
+  - wikimedia.wmcs.enc_connection
+
 requirements:
   - "python >= 3.6"
 '''
@@ -50,58 +53,68 @@ EXAMPLES = '''
 '''
 
 RETURN = '''
+enc_stats:
+    description: Counters for the requests done to the enc.
+    returned: On success
+    type: dict
+    sample:
+        requests: 2
+        retries: 1
+        failures: 1
+        cache_hits: 0
+        total_latency: 0.0451
+        max_latency: 0.0302
+parse_time:
+    description: Seconds spent parsing the enc response.
+    returned: On success
+    type: float
+    sample: 0.0123
 '''
 
 __metaclass__ = type
-import yaml
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.common.text.converters import jsonify
-from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import EncConnection
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import (
+    EncError,
+    get_common_enc_args_specs,
+    get_enc_connection,
+    parse_enc_response,
+)
 
 
 def main():
     """ Module entry point """
 
-    argument_spec = {
-        "enc_url": {"type": "str", "required": True},
-        "openstack_project": {"type": "str", "required": True},
-        "prefix": {"type": "str", "required": True},
-    }
+    argument_spec = get_common_enc_args_specs(
+        prefix={"type": "str", "required": True},
+    )
     module = AnsibleModule(
         argument_spec,
         supports_check_mode=True,
     )
 
-    enc_url = module.params.get('enc_url')
     openstack_project = module.params.get('openstack_project')
     prefix = module.params.get('prefix')
 
-    conn = EncConnection(enc_url=enc_url, openstack_project=openstack_project)
-    res = conn.get_prefix_hiera(prefix=prefix)
-    if res.status_code != 200:
-        module.fail_json("Error trying to contact the enc backend: %s" % res.raw)
-
+    conn = get_enc_connection(module_params=module.params)
     try:
-        data = yaml.load(res.text)
-    except Exception as error:
-        module.fail_json(
-            "Error parsing response from the enc backend: %s\nResponse:\n%s" % (
-                error,
-                res.raw,
-            ),
-        )
+        res = conn.get_prefix_hiera(prefix=prefix)
+    except EncError as error:
+        module.fail_json(str(error), enc_stats=conn.stats.to_dict())
 
     try:
-        data["hiera"] = yaml.load(data["hiera"])
-    except Exception as error:
-        module.fail_json(
-            "Error parsing response from the enc backend: %s\nResponse:\n%s" % (
-                error,
-                res.raw,
-            ),
-        )
-
-    module.exit_json(changed=False, enc_data=data, prefix=prefix, openstack_project=openstack_project)
+        data, parse_time = parse_enc_response(res, nested_hiera=True)
+    except EncError as error:
+        module.fail_json(str(error), enc_stats=conn.stats.to_dict())
+
+    module.exit_json(
+        changed=False,
+        enc_data=data,
+        parse_time=parse_time,
+        prefix=prefix,
+        openstack_project=openstack_project,
+        enc_stats=conn.stats.to_dict(),
+    )
 
 
 if __name__ == '__main__':
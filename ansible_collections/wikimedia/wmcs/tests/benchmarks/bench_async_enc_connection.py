@@ -0,0 +1,96 @@
+"""
+Compare fetching the hiera of many prefixes with EncConnection, sequentially
+and with a thread pool, against AsyncEncConnection, using an in-process stub
+enc that adds some latency to each response.
+
+Run from the directory containing ansible_collections:
+
+    python -m ansible_collections.wikimedia.wmcs.tests.benchmarks.bench_async_enc_connection \\
+        [--prefixes N] [--latency SECONDS] [--concurrency N]
+"""
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.async_enc_connection import AsyncEncConnection
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import EncConnection
+from ansible_collections.wikimedia.wmcs.tests.unit.plugins.module_utils.stub_http_server import StubHttpServer
+
+
+def timed(start, function, *args):
+    function(*args)
+    return time.perf_counter() - start
+
+
+async def async_timed(start, coroutine):
+    await coroutine
+    return time.perf_counter() - start
+
+
+def report(name, elapsed, latencies):
+    latencies = sorted(latencies)
+    print(
+        f"{name:>22}: {len(latencies)} prefixes in {elapsed:.3f}s "
+        f"({len(latencies) / elapsed:.1f} req/s), "
+        f"latency p50={statistics.median(latencies) * 1000:.1f}ms "
+        f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prefixes", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    def slow_route(method, path, body):
+        time.sleep(args.latency)
+        return 200, "hiera: 'key: value'\n", {}
+
+    prefixes = [f"prefix-{index}" for index in range(args.prefixes)]
+    server = StubHttpServer().start()
+    for prefix in prefixes:
+        server.add_route("GET", f"/benchproject/prefix/{prefix}/hiera", slow_route)
+
+    try:
+        connection = EncConnection(
+            enc_url=server.url,
+            openstack_project="benchproject",
+            pool_maxsize=args.concurrency,
+        )
+
+        start = time.perf_counter()
+        latencies = [timed(time.perf_counter(), connection.get_prefix_hiera, prefix) for prefix in prefixes]
+        report("sequential", time.perf_counter() - start, latencies)
+
+        # from here on, the latencies include the time waiting for a free
+        # thread/slot, as all the requests are submitted at once
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            latencies = list(executor.map(lambda prefix: timed(start, connection.get_prefix_hiera, prefix), prefixes))
+        report(f"{args.concurrency} threads", time.perf_counter() - start, latencies)
+
+        async def run_async(start):
+            async with AsyncEncConnection(
+                enc_url=server.url,
+                openstack_project="benchproject",
+                max_concurrency=args.concurrency,
+            ) as async_connection:
+                return await asyncio.gather(
+                    *(async_timed(start, async_connection.get_prefix_hiera(prefix)) for prefix in prefixes)
+                )
+
+        start = time.perf_counter()
+        latencies = asyncio.run(run_async(start))
+        report(f"async, {args.concurrency} concurrent", time.perf_counter() - start, latencies)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Compare doing the enc requests with a new connection each time (what the
+module-level requests.get does) against the pooled keep-alive session that
+EncConnection uses, against a local stub enc.
+
+Pass --certfile and --keyfile to serve over https, to also account for the
+TLS handshakes, ex. with a self-signed certificate:
+
+    openssl req -x509 -newkey rsa:2048 -nodes -subj /CN=127.0.0.1 -keyout key.pem -out cert.pem
+
+Run from the directory containing ansible_collections:
+
+    python -m ansible_collections.wikimedia.wmcs.tests.benchmarks.bench_enc_connection [--requests N]
+"""
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import argparse
+import time
+
+import requests
+
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import EncConnection, get_session
+from ansible_collections.wikimedia.wmcs.tests.unit.plugins.module_utils.stub_http_server import StubHttpServer
+
+HIERA_PATH = "/benchproject/prefix/myprefix/hiera"
+
+
+def run(name, server, do_request, num_requests):
+    connections_before = server.connections
+    start = time.perf_counter()
+    for _ in range(num_requests):
+        do_request()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:>20}: {num_requests} requests in {elapsed:.3f}s "
+        f"({elapsed / num_requests * 1000:.3f}ms/request), "
+        f"{server.connections - connections_before} connections"
+    )
+
+
+def set_verify(session, verify):
+    session.verify = verify
+    # otherwise REQUESTS_CA_BUNDLE takes precedence over session.verify
+    session.trust_env = verify
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--certfile")
+    parser.add_argument("--keyfile")
+    args = parser.parse_args()
+
+    server = StubHttpServer()
+    # the certificate is self-signed
+    verify = not args.certfile
+    if args.certfile:
+        server.enable_tls(certfile=args.certfile, keyfile=args.keyfile)
+        requests.packages.urllib3.disable_warnings()
+
+    server.start()
+    server.add_route("GET", HIERA_PATH, (200, "hiera: 'key: value'\n", {}))
+    try:
+        run(
+            name="requests.get",
+            server=server,
+            do_request=lambda: requests.get(f"{server.url}{HIERA_PATH}", timeout=10, verify=verify),
+            num_requests=args.requests,
+        )
+        no_keep_alive = EncConnection(
+            enc_url=server.url,
+            openstack_project="benchproject",
+            session=get_session(enc_url=server.url, keep_alive=False),
+        )
+        set_verify(no_keep_alive.session, verify)
+        run(
+            name="no keep-alive",
+            server=server,
+            do_request=lambda: no_keep_alive.get_prefix_hiera(prefix="myprefix"),
+            num_requests=args.requests,
+        )
+        pooled = EncConnection(enc_url=server.url, openstack_project="benchproject")
+        set_verify(pooled.session, verify)
+        run(
+            name="pooled session",
+            server=server,
+            do_request=lambda: pooled.get_prefix_hiera(prefix="myprefix"),
+            num_requests=args.requests,
+        )
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Compare the cost of what etcd_member does (list, add, list, and a remove to
+leave the cluster as it was) forking a process and opening a new connection
+for each operation, against EtcdGatewayClient reusing one connection, using
+a local fake etcd json gateway.
+
+Without --etcdctl, each operation forks `cat` on a canned member list, as a
+lower bound of the fork+exec cost, and does the request with a new
+connection. With --etcdctl, each operation runs that etcdctl binary against
+the fake gateway (only the v3 api with -w json is supported).
+
+Pass --certfile and --keyfile to serve over https, to also account for the
+TLS handshakes, see bench_enc_connection.py.
+
+Run from the directory containing ansible_collections:
+
+    python -m ansible_collections.wikimedia.wmcs.tests.benchmarks.bench_etcd_gateway [--rounds N]
+"""
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import argparse
+import json
+import os
+import subprocess
+import tempfile
+import time
+
+import requests
+
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.etcd import EtcdGatewayClient
+from ansible_collections.wikimedia.wmcs.tests.unit.plugins.module_utils.fake_etcd_gateway import FakeEtcdGateway
+from ansible_collections.wikimedia.wmcs.tests.unit.plugins.module_utils.stub_http_server import StubHttpServer
+
+
+def get_members():
+    return [
+        {
+            "ID": str(index + 1),
+            "name": f"etcd-{index}",
+            "peerURLs": [f"https://etcd-{index}:2380"],
+            "clientURLs": [f"https://etcd-{index}:2379"],
+        }
+        for index in range(3)
+    ]
+
+
+def run(name, server, do_round, rounds):
+    connections_before = server.connections
+    start = time.perf_counter()
+    for _ in range(rounds):
+        do_round()
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:>16}: {rounds} rounds in {elapsed:.3f}s "
+        f"({elapsed / rounds * 1000:.3f}ms/round), "
+        f"{server.connections - connections_before} connections"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--etcdctl")
+    parser.add_argument("--certfile")
+    parser.add_argument("--keyfile")
+    args = parser.parse_args()
+
+    server = StubHttpServer()
+    # the certificate is self-signed
+    verify = not args.certfile
+    if args.certfile:
+        server.enable_tls(certfile=args.certfile, keyfile=args.keyfile)
+        requests.packages.urllib3.disable_warnings()
+
+    server.start()
+    gateway = FakeEtcdGateway(server=server, members=get_members())
+    api_url = f"{server.url}/v3"
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        members_file = os.path.join(tmp_dir, "members.json")
+        with open(members_file, "w") as members_fd:
+            json.dump({"members": gateway.members}, members_fd)
+
+        def fork(*etcdctl_args):
+            if args.etcdctl:
+                subprocess.run(
+                    [args.etcdctl, "--endpoints", server.url, "--insecure-skip-tls-verify", *etcdctl_args, "-w", "json"],
+                    env=dict(os.environ, ETCDCTL_API="3"),
+                    check=True,
+                    capture_output=True,
+                )
+            else:
+                subprocess.run(["cat", members_file], check=True, capture_output=True)
+
+        def forked_round():
+            fork("member", "list")
+            if not args.etcdctl:
+                requests.post(f"{api_url}/cluster/member/list", json={}, verify=verify)
+
+            fork("member", "add", "etcd-new", "--peer-urls=https://etcd-new:2380")
+            if not args.etcdctl:
+                new_member = requests.post(
+                    f"{api_url}/cluster/member/add", json={"peerURLs": ["https://etcd-new:2380"]}, verify=verify
+                ).json()["member"]
+            else:
+                new_member = gateway.members[-1]
+
+            fork("member", "list")
+            if not args.etcdctl:
+                requests.post(f"{api_url}/cluster/member/list", json={}, verify=verify)
+
+            fork("member", "remove", format(int(new_member["ID"]), "x"))
+            if not args.etcdctl:
+                requests.post(f"{api_url}/cluster/member/remove", json={"ID": new_member["ID"]}, verify=verify)
+
+        # the fake gateway does not check client certificates
+        client = EtcdGatewayClient(endpoints=server.url, cert_file=None, key_file=None, ca_file=None)
+        client.session.verify = verify
+        # otherwise REQUESTS_CA_BUNDLE takes precedence over session.verify
+        client.session.trust_env = verify
+
+        def gateway_round():
+            client.get_members()
+            new_member, _ = client.add_member(name="etcd-new", peer_url="https://etcd-new:2380")
+            client.get_members()
+            client.remove_member(member_id=new_member["ID"])
+
+        try:
+            run(name="etcdctl" if args.etcdctl else "fork + request", server=server, do_round=forked_round, rounds=args.rounds)
+            run(name="gateway client", server=server, do_round=gateway_round, rounds=args.rounds)
+        finally:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Compare the old etcdctl v2 member list parser (split + int() on every
+value, copied below as it was) against parse_member_list, over a synthetic
+member list output with thousands of lines, also streaming it from a file.
+
+Run from the directory containing ansible_collections:
+
+    python -m ansible_collections.wikimedia.wmcs.tests.benchmarks.bench_etcd_member_list [--lines N] [--rounds N]
+"""
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import argparse
+import os
+import tempfile
+import time
+
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.etcd import parse_member_list
+
+
+def old_to_simple_type(maybe_not_string):
+    if maybe_not_string == "true":
+        return True
+    elif maybe_not_string == "false":
+        return False
+
+    try:
+        return int(maybe_not_string)
+    except ValueError:
+        pass
+
+    return maybe_not_string
+
+
+def old_parse_member_list(out):
+    structured_result = {}
+    for line in out.split('\n'):
+        if not line.strip():
+            continue
+
+        split_info = [
+            [old_to_simple_type(subelem) for subelem in elem.split('=')]
+            for elem in line.split()
+        ]
+        struct_elem = dict(split_info[1:])
+
+        first_part = split_info[0][0][:-1]
+        if '[' in first_part:
+            member_id = first_part.split('[', 1)[0]
+            status = first_part.split('[', 1)[1][:-1]
+        else:
+            member_id = first_part
+            status = "up"
+
+        struct_elem['member_id'] = member_id
+        struct_elem['status'] = status
+
+        if 'peerURLs' not in struct_elem:
+            raise ValueError(f"Missing peerURLs for member line: {line}")
+
+        structured_result[struct_elem['member_id']] = struct_elem
+
+    return structured_result
+
+
+def new_parse_member_list(lines):
+    return {record.member_id: record.to_dict() for record in parse_member_list(lines)}
+
+
+def get_member_list_output(num_lines):
+    lines = []
+    for index in range(num_lines):
+        # always starts with a letter, the old parser turns digit only ids into ints
+        member_id = f"{0xa000000000000000 + index:x}"
+        if index % 10 == 9:
+            lines.append(f"{member_id}[unstarted]: peerURLs=https://etcd-{index}:2380")
+        else:
+            lines.append(
+                f"{member_id}: name=etcd-{index} peerURLs=https://etcd-{index}:2380 "
+                f"clientURLs=https://etcd-{index}:2379 isLeader={'true' if index == 0 else 'false'}"
+            )
+
+    return "\n".join(lines) + "\n"
+
+
+def run(name, parse, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = parse()
+    elapsed = time.perf_counter() - start
+    print(f"{name:>22}: {rounds} rounds in {elapsed:.3f}s ({elapsed / rounds * 1000:.3f}ms/parse)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    output = get_member_list_output(args.lines)
+    old_result = run("old parser", lambda: old_parse_member_list(output), args.rounds)
+    new_result = run("parse_member_list", lambda: new_parse_member_list(output), args.rounds)
+    run("records only", lambda: list(parse_member_list(output)), args.rounds)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_file = os.path.join(tmp_dir, "member_list.txt")
+        with open(output_file, "w") as output_fd:
+            output_fd.write(output)
+
+        def parse_file():
+            with open(output_file) as output_fd:
+                return new_parse_member_list(output_fd)
+
+        file_result = run("streamed from a file", parse_file, args.rounds)
+
+    if not old_result == new_result == file_result:
+        raise Exception("The parsers returned different results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import pytest
+
+from ansible_collections.wikimedia.wmcs.tests.unit.plugins.module_utils.stub_http_server import StubHttpServer
+
+
+@pytest.fixture
+def stub_server():
+    server = StubHttpServer().start()
+    yield server
+    server.stop()
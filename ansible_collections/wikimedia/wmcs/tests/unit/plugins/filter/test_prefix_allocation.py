@@ -0,0 +1,44 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import pytest
+from ansible.errors import AnsibleFilterError
+
+from ansible_collections.wikimedia.wmcs.plugins.filter.prefix_allocation import prefix_allocation
+
+
+def get_servers(*names):
+    return [{"name": name, "id": name} for name in names]
+
+
+def test_indexes_the_servers_numerically():
+    servers = get_servers("tools-etcd-9", "tools-etcd-10", "tools-etcd-7", "tools-etcd-proxy-1", "other-1")
+
+    allocation = prefix_allocation(servers, prefix="tools-etcd", count=2)
+
+    assert allocation["indices"] == [7, 9, 10]
+    assert allocation["last_instance"] == "tools-etcd-10"
+    assert allocation["template"] == {"name": "tools-etcd-10", "id": "tools-etcd-10"}
+    assert allocation["next_names"] == ["tools-etcd-11", "tools-etcd-12"]
+    assert allocation["gaps"] == [8]
+
+
+def test_unmasks_the_project():
+    servers = get_servers("********-test-etcd-1", "********-test-etcd-2")
+
+    allocation = prefix_allocation(servers, prefix="toolsbeta-test-etcd", project="toolsbeta")
+
+    assert allocation["indices"] == [1, 2]
+    assert allocation["last_instance"] == "toolsbeta-test-etcd-2"
+
+
+def test_no_servers():
+    allocation = prefix_allocation([], prefix="tools-etcd")
+
+    assert allocation["template"] is None
+    assert allocation["next_names"] == ["tools-etcd-1"]
+
+
+@pytest.mark.parametrize("count", [0, -1])
+def test_count_must_be_at_least_one(count):
+    with pytest.raises(AnsibleFilterError, match="must be at least 1"):
+        prefix_allocation(get_servers("tools-etcd-1"), prefix="tools-etcd", count=count)
@@ -0,0 +1,59 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import pytest
+from ansible.errors import AnsibleError
+from ansible.inventory.data import InventoryData
+from ansible.parsing.dataloader import DataLoader
+from ansible.plugins.loader import inventory_loader
+
+HOST = "tools-k8s-etcd-1.tools.eqiad1.wikimedia.cloud"
+
+
+def add_prefix(stub_server, prefix, hiera, roles):
+    stub_server.add_route("GET", f"/tools/prefix/{prefix}/hiera", (200, f"hiera: '{hiera}'\n", {}))
+    stub_server.add_route("GET", f"/tools/prefix/{prefix}/roles", (200, f"roles: {roles}\n", {}))
+
+
+@pytest.fixture
+def enc_server(stub_server):
+    stub_server.add_route("GET", "/tools/prefix", (200, f"prefixes: [tools-k8s-etcd, {HOST}, deleted]\n", {}))
+    add_prefix(stub_server, "%20", hiera="project_key: project", roles=[])
+    add_prefix(stub_server, "tools-k8s-etcd", hiera="prefix_key: prefix", roles=["role::etcd"])
+    add_prefix(stub_server, HOST, hiera="host_key: host", roles=[])
+    return stub_server
+
+
+def parse_inventory(stub_server, tmp_path):
+    config = tmp_path / "tools.enc.yml"
+    config.write_text(f"plugin: wikimedia.wmcs.enc\nenc_url: {stub_server.url}\nopenstack_project: tools\n")
+    inventory = InventoryData()
+    plugin = inventory_loader.get("wikimedia.wmcs.enc")
+    plugin.parse(inventory, DataLoader(), str(config), cache=False)
+    return inventory
+
+
+def test_builds_hosts_and_groups(enc_server, tmp_path):
+    inventory = parse_inventory(enc_server, tmp_path)
+
+    host_vars = inventory.get_host(HOST).vars
+    assert host_vars["enc_hiera"] == {"project_key": "project", "prefix_key": "prefix", "host_key": "host"}
+    assert host_vars["enc_roles"] == ["role::etcd"]
+    assert HOST in [host.name for host in inventory.groups["role_role__etcd"].get_hosts()]
+    assert HOST in [host.name for host in inventory.groups["prefix_tools_k8s_etcd"].get_hosts()]
+
+
+def test_missing_prefix_is_skipped_with_a_warning(enc_server, tmp_path, mocker):
+    warning_mock = mocker.patch("ansible.plugins.inventory.display.warning")
+
+    inventory = parse_inventory(enc_server, tmp_path)
+
+    assert list(inventory.hosts) == [HOST]
+    warning_mock.assert_called_once()
+    assert "Skipping the enc prefix deleted" in warning_mock.call_args.args[0]
+
+
+def test_other_errors_abort(enc_server, tmp_path):
+    enc_server.add_route("GET", "/tools/prefix/tools-k8s-etcd/roles", (500, "", {}))
+
+    with pytest.raises(AnsibleError, match="Unable to retrieve the enc data"):
+        parse_inventory(enc_server, tmp_path)
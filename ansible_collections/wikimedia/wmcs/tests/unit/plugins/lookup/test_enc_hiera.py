@@ -0,0 +1,58 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import pytest
+from ansible import constants as C
+from ansible.errors import AnsibleLookupError
+from ansible.plugins.loader import lookup_loader
+
+from ansible_collections.wikimedia.wmcs.plugins.lookup import enc_hiera
+
+HIERA_RESPONSE = "hiera: |\n  profile::etcd::nodes:\n  - etcd-1\n"
+
+
+@pytest.fixture
+def lookup(monkeypatch, tmp_path):
+    monkeypatch.setattr(C, "DEFAULT_LOCAL_TMP", str(tmp_path))
+    monkeypatch.setattr(enc_hiera, "_HIERA_MEMO", {})
+    return lookup_loader.get("wikimedia.wmcs.enc_hiera")
+
+
+def run_lookup(lookup, stub_server, terms, **kwargs):
+    return lookup.run(terms, enc_url=stub_server.url, openstack_project="testproject", **kwargs)
+
+
+def test_gets_the_prefix_hiera_values(lookup, stub_server):
+    stub_server.add_route("GET", "/testproject/prefix/etcd/hiera", (200, HIERA_RESPONSE, {}))
+
+    assert run_lookup(lookup, stub_server, ["profile::etcd::nodes"], prefix="etcd") == [["etcd-1"]]
+
+
+def test_missing_key_uses_the_default(lookup, stub_server):
+    stub_server.add_route("GET", "/testproject/prefix/etcd/hiera", (200, HIERA_RESPONSE, {}))
+
+    assert run_lookup(lookup, stub_server, ["missing"], prefix="etcd", default=[]) == [[]]
+
+
+def test_missing_key_without_default_fails(lookup, stub_server):
+    stub_server.add_route("GET", "/testproject/prefix/etcd/hiera", (200, HIERA_RESPONSE, {}))
+
+    with pytest.raises(AnsibleLookupError, match="Hiera key missing not found"):
+        run_lookup(lookup, stub_server, ["missing"], prefix="etcd")
+
+
+def test_missing_prefix_uses_the_default(lookup, stub_server):
+    assert run_lookup(
+        lookup, stub_server, ["profile::etcd::nodes", "other"], prefix="missing", default=None
+    ) == [None, None]
+
+
+def test_missing_prefix_without_default_fails(lookup, stub_server):
+    with pytest.raises(AnsibleLookupError, match="Prefix not found"):
+        run_lookup(lookup, stub_server, ["profile::etcd::nodes"], prefix="missing")
+
+
+def test_missing_prefix_is_not_memoized(lookup, stub_server):
+    run_lookup(lookup, stub_server, ["profile::etcd::nodes"], prefix="etcd", default=None)
+    stub_server.add_route("GET", "/testproject/prefix/etcd/hiera", (200, HIERA_RESPONSE, {}))
+
+    assert run_lookup(lookup, stub_server, ["profile::etcd::nodes"], prefix="etcd") == [["etcd-1"]]
@@ -0,0 +1,54 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import json
+
+
+class FakeEtcdGateway:
+    """
+    Routes for a StubHttpServer behaving like the etcd v3 json gateway of a
+    cluster, the member ids are integers as the gateway returns them.
+    """
+
+    def __init__(self, server, members, leader_id=None, version="3.4.15", api_prefix="/v3"):
+        self.server = server
+        self.members = members
+        self.leader_id = leader_id
+        self.next_id = 0xa0
+        server.add_route("GET", "/version", (200, json.dumps({"etcdserver": version}), {}))
+        server.add_route("GET", "/health", (200, json.dumps({"health": "true"}), {}))
+        for path, handler in (
+            ("/cluster/member/list", self.member_list),
+            ("/cluster/member/add", self.member_add),
+            ("/cluster/member/update", self.member_update),
+            ("/cluster/member/remove", self.member_remove),
+            ("/maintenance/status", self.status),
+        ):
+            server.add_route("POST", f"{api_prefix}{path}", self._json_handler(handler))
+
+    @staticmethod
+    def _json_handler(handler):
+        def _handle(method, path, body):
+            return 200, json.dumps(handler(json.loads(body or b"{}"))), {"Content-Type": "application/json"}
+
+        return _handle
+
+    def member_list(self, request):
+        return {"members": self.members}
+
+    def member_add(self, request):
+        member = {"ID": str(self.next_id), "peerURLs": request["peerURLs"]}
+        self.next_id += 1
+        self.members.append(member)
+        return {"member": member, "members": self.members}
+
+    def member_update(self, request):
+        member = next(member for member in self.members if member["ID"] == request["ID"])
+        member["peerURLs"] = request["peerURLs"]
+        return {"members": self.members}
+
+    def member_remove(self, request):
+        self.members[:] = [member for member in self.members if member["ID"] != request["ID"]]
+        return {"members": self.members}
+
+    def status(self, request):
+        return {"leader": self.leader_id} if self.leader_id else {}
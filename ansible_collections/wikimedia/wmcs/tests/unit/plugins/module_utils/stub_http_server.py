@@ -0,0 +1,104 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import ssl
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    # needed for keep-alive
+    protocol_version = "HTTP/1.1"
+    # the headers and the body are written separately, avoid waiting for the
+    # delayed ack of the client between them on reused connections
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0) or 0))
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path, body))
+            fault = self.server.faults.pop(0) if self.server.faults else None
+
+        if fault == "drop":
+            # close without answering, the client gets a connection error
+            self.close_connection = True
+            return
+
+        if fault is not None:
+            status, response_body, headers = fault, b"", {}
+        else:
+            route = self.server.routes.get((self.command, self.path))
+            if route is None:
+                status, response_body, headers = 404, b"not found", {}
+            elif callable(route):
+                status, response_body, headers = route(self.command, self.path, body)
+            else:
+                status, response_body, headers = route
+
+        if isinstance(response_body, str):
+            response_body = response_body.encode("utf-8")
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class StubHttpServer(ThreadingHTTPServer):
+    """
+    Local http server answering from a table of routes, with a queue of
+    faults (status codes or "drop" to close the connection without
+    answering) returned instead of the route for the next requests.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubRequestHandler)
+        self.lock = threading.Lock()
+        self.routes = {}
+        self.faults = []
+        self.requests = []
+        self.connections = 0
+        self.scheme = "http"
+
+    @property
+    def url(self):
+        return "%s://%s:%s" % (self.scheme, *self.server_address)
+
+    def enable_tls(self, certfile, keyfile):
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile=certfile, keyfile=keyfile)
+        self.socket = context.wrap_socket(self.socket, server_side=True)
+        self.scheme = "https"
+
+    def add_route(self, method, path, response):
+        """
+        response is either a (status, body, headers) tuple or a callable
+        getting the method, path and request body and returning one.
+        """
+        self.routes[(method, path)] = response
+
+    def inject_faults(self, *faults):
+        with self.lock:
+            self.faults.extend(faults)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,139 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import asyncio
+import threading
+import time
+
+import pytest
+
+from ansible_collections.wikimedia.wmcs.plugins.module_utils import enc_connection
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.async_enc_connection import AsyncEncConnection
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import CircuitBreaker, EncError
+
+pytest.importorskip("aiohttp")
+
+HIERA_PATH = "/testproject/prefix/myprefix/hiera"
+
+
+def get_connection(stub_server, **kwargs):
+    kwargs.setdefault("backoff_factor", 0)
+    kwargs.setdefault("circuit_breaker", CircuitBreaker())
+    return AsyncEncConnection(enc_url=stub_server.url, openstack_project="testproject", **kwargs)
+
+
+def run_with_connection(connection, coroutine_function):
+    async def _run():
+        async with connection:
+            return await coroutine_function(connection)
+
+    return asyncio.run(_run())
+
+
+@pytest.fixture
+def hiera_server(stub_server):
+    stub_server.add_route("GET", HIERA_PATH, (200, "hiera: 'key: value'\n", {}))
+    stub_server.add_route("POST", HIERA_PATH, (200, "", {}))
+    return stub_server
+
+
+def test_get_prefix_hiera(hiera_server):
+    connection = get_connection(hiera_server)
+
+    text = run_with_connection(connection, lambda conn: conn.get_prefix_hiera(prefix="myprefix"))
+
+    assert text == "hiera: 'key: value'\n"
+
+
+def test_concurrency_is_limited(stub_server):
+    in_flight = {"current": 0, "max": 0}
+    lock = threading.Lock()
+
+    def slow_route(method, path, body):
+        with lock:
+            in_flight["current"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["current"])
+        time.sleep(0.05)
+        with lock:
+            in_flight["current"] -= 1
+        return 200, "hiera: ''", {}
+
+    for index in range(10):
+        stub_server.add_route("GET", f"/testproject/prefix/prefix-{index}/hiera", slow_route)
+    connection = get_connection(stub_server, max_concurrency=3)
+
+    results = run_with_connection(
+        connection,
+        lambda conn: asyncio.gather(*(conn.get_prefix_hiera(prefix=f"prefix-{index}") for index in range(10))),
+    )
+
+    assert len(results) == 10
+    assert in_flight["max"] == 3
+
+
+def test_get_is_retried_like_the_sync_client(hiera_server):
+    hiera_server.inject_faults(503, 502, 429)
+    connection = get_connection(hiera_server, retries=3)
+
+    run_with_connection(connection, lambda conn: conn.get_prefix_hiera(prefix="myprefix"))
+
+    assert len(hiera_server.requests) == 4
+    stats = connection.stats.to_dict()
+    assert stats["requests"] == 4
+    assert stats["retries"] == 3
+    assert stats["failures"] == 3
+
+
+def test_get_is_retried_on_connection_errors(hiera_server):
+    # aiohttp retries once by itself dropped idempotent requests
+    hiera_server.inject_faults("drop", "drop", "drop")
+    connection = get_connection(hiera_server, retries=3)
+
+    text = run_with_connection(connection, lambda conn: conn.get_prefix_hiera(prefix="myprefix"))
+
+    assert text == "hiera: 'key: value'\n"
+    assert connection.stats.retries >= 1
+
+
+def test_get_fails_after_exhausting_the_retries(hiera_server):
+    hiera_server.inject_faults(503, 503)
+    connection = get_connection(hiera_server, retries=1)
+
+    with pytest.raises(EncError, match="Unable to get prefix data"):
+        run_with_connection(connection, lambda conn: conn.get_prefix_hiera(prefix="myprefix"))
+
+    assert len(hiera_server.requests) == 2
+
+
+def test_post_is_not_retried(hiera_server):
+    hiera_server.inject_faults(503)
+    connection = get_connection(hiera_server, retries=3)
+
+    with pytest.raises(EncError, match="Unable to set prefix data"):
+        run_with_connection(connection, lambda conn: conn.set_prefix_hiera(prefix="myprefix", data="hiera: ''"))
+
+    assert [request[0] for request in hiera_server.requests] == ["POST"]
+
+
+def test_deadline_covers_the_whole_request(stub_server):
+    def slow_route(method, path, body):
+        time.sleep(0.5)
+        return 200, "hiera: ''", {}
+
+    stub_server.add_route("GET", HIERA_PATH, slow_route)
+    connection = get_connection(stub_server, deadline=0.1)
+
+    with pytest.raises(EncError, match="Deadline of 0.1s exceeded"):
+        run_with_connection(connection, lambda conn: conn.get_prefix_hiera(prefix="myprefix"))
+
+
+def test_circuit_breaker_is_shared_with_the_sync_client(hiera_server):
+    breaker = enc_connection.get_circuit_breaker(enc_url=hiera_server.url)
+    for _ in range(breaker.threshold):
+        breaker.record_failure()
+    connection = AsyncEncConnection(enc_url=hiera_server.url, openstack_project="testproject")
+
+    with pytest.raises(EncError, match="Too many consecutive errors"):
+        run_with_connection(connection, lambda conn: conn.get_prefix_hiera(prefix="myprefix"))
+
+    assert connection.circuit_breaker is breaker
+    assert not hiera_server.requests
@@ -0,0 +1,73 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import os
+
+import requests
+
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_cache import EncCache
+
+
+def get_response(content):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = "http://enc.local/testproject/prefix"
+    response._content = content.encode("utf-8")
+    return response
+
+
+def get_cache(cache_dir, max_entries):
+    return EncCache(
+        cache_dir=str(cache_dir),
+        enc_url="http://enc.local",
+        openstack_project="testproject",
+        max_entries=max_entries,
+    )
+
+
+def set_mtime(cache, kind, name, mtime):
+    os.utime(cache._entry_path(kind=kind, name=name), (mtime, mtime))
+
+
+def test_evicts_the_least_recently_used_entries(tmp_path):
+    cache = get_cache(tmp_path, max_entries=2)
+    cache.put(kind="prefix_hiera", name="old", response=get_response("old"))
+    set_mtime(cache, kind="prefix_hiera", name="old", mtime=1000)
+    cache.put(kind="prefix_hiera", name="used", response=get_response("used"))
+    set_mtime(cache, kind="prefix_hiera", name="used", mtime=2000)
+
+    cache.put(kind="prefix_hiera", name="new", response=get_response("new"))
+
+    assert cache.get(kind="prefix_hiera", name="old") is None
+    assert cache.get(kind="prefix_hiera", name="used")["content"] == "used"
+    assert cache.get(kind="prefix_hiera", name="new")["content"] == "new"
+
+
+def test_eviction_counts_all_the_projects(tmp_path):
+    other_cache = EncCache(cache_dir=str(tmp_path), enc_url="http://enc.local", openstack_project="other")
+    other_cache.put(kind="prefix_hiera", name="other", response=get_response("other"))
+    set_mtime(other_cache, kind="prefix_hiera", name="other", mtime=1000)
+    cache = get_cache(tmp_path, max_entries=1)
+
+    cache.put(kind="prefix_hiera", name="new", response=get_response("new"))
+
+    assert other_cache.get(kind="prefix_hiera", name="other") is None
+    assert cache.get(kind="prefix_hiera", name="new")["content"] == "new"
+
+
+def test_eviction_leaves_foreign_files_alone(tmp_path):
+    foreign_files = [
+        tmp_path / "settings.json",
+        tmp_path / "some-tool" / "state.json",
+        tmp_path / ("a" * 40) / "notes.json",
+    ]
+    for foreign_file in foreign_files:
+        foreign_file.parent.mkdir(exist_ok=True)
+        foreign_file.write_text("{}")
+        os.utime(foreign_file, (1000, 1000))
+    cache = get_cache(tmp_path, max_entries=1)
+
+    cache.put(kind="prefix_hiera", name="first", response=get_response("first"))
+    cache.put(kind="prefix_hiera", name="second", response=get_response("second"))
+
+    assert all(foreign_file.exists() for foreign_file in foreign_files)
+    assert len(cache._get_entry_paths()) == 1
@@ -0,0 +1,256 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import threading
+import time
+from unittest import mock
+
+import pytest
+import requests
+
+from ansible_collections.wikimedia.wmcs.plugins.module_utils import enc_connection
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import (
+    CircuitBreaker,
+    EncConnection,
+    EncError,
+    EncNotFoundError,
+    EncRequestNotSentError,
+)
+
+HIERA_PATH = "/testproject/prefix/myprefix/hiera"
+
+
+def get_connection(stub_server, **kwargs):
+    kwargs.setdefault("backoff_factor", 0)
+    kwargs.setdefault("circuit_breaker", CircuitBreaker())
+    kwargs.setdefault("session", requests.Session())
+    return EncConnection(enc_url=stub_server.url, openstack_project="testproject", **kwargs)
+
+
+@pytest.fixture
+def hiera_server(stub_server):
+    stub_server.add_route("GET", HIERA_PATH, (200, "hiera: 'key: value'\n", {}))
+    stub_server.add_route("POST", HIERA_PATH, (200, "", {}))
+    return stub_server
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503, 504])
+def test_get_is_retried_on_retryable_statuses(hiera_server, status):
+    hiera_server.inject_faults(status, status)
+    connection = get_connection(hiera_server, retries=3)
+
+    response = connection.get_prefix_hiera(prefix="myprefix")
+
+    assert response.status_code == 200
+    assert len(hiera_server.requests) == 3
+
+
+def test_get_is_retried_on_connection_errors(hiera_server):
+    hiera_server.inject_faults("drop")
+    connection = get_connection(hiera_server, retries=1)
+
+    assert connection.get_prefix_hiera(prefix="myprefix").status_code == 200
+    assert len(hiera_server.requests) == 2
+
+
+def test_get_is_not_retried_on_client_errors(stub_server):
+    connection = get_connection(stub_server, retries=3)
+
+    with pytest.raises(EncNotFoundError):
+        connection.get_prefix_hiera(prefix="myprefix")
+
+    assert len(stub_server.requests) == 1
+
+
+def test_get_fails_after_exhausting_the_retries(hiera_server):
+    hiera_server.inject_faults(503, 503, 503)
+    connection = get_connection(hiera_server, retries=2)
+
+    with pytest.raises(EncError, match="Unable to get prefix data"):
+        connection.get_prefix_hiera(prefix="myprefix")
+
+    assert len(hiera_server.requests) == 3
+
+
+def test_post_is_not_retried(hiera_server):
+    hiera_server.inject_faults(503)
+    connection = get_connection(hiera_server, retries=3)
+
+    with pytest.raises(EncError, match="Unable to set prefix data"):
+        connection.set_prefix_hiera(prefix="myprefix", data="hiera: ''")
+
+    assert [request[0] for request in hiera_server.requests] == ["POST"]
+
+
+def test_read_timeout(stub_server):
+    def slow_route(method, path, body):
+        time.sleep(0.5)
+        return 200, "hiera: ''", {}
+
+    stub_server.add_route("GET", HIERA_PATH, slow_route)
+    connection = get_connection(stub_server, retries=0, read_timeout=0.1)
+
+    with pytest.raises(EncError, match="Error contacting the enc"):
+        connection.get_prefix_hiera(prefix="myprefix")
+
+
+def test_backoff_is_exponential_with_full_jitter(hiera_server):
+    hiera_server.inject_faults(503, 503, 503)
+    connection = get_connection(hiera_server, retries=3, backoff_factor=0.5)
+
+    with mock.patch.object(enc_connection.time, "sleep") as sleep_mock, \
+            mock.patch.object(enc_connection.random, "uniform", side_effect=lambda low, high: high) as uniform_mock:
+        connection.get_prefix_hiera(prefix="myprefix")
+
+    assert [call.args for call in uniform_mock.call_args_list] == [(0, 0.5), (0, 1.0), (0, 2.0)]
+    assert [call.args for call in sleep_mock.call_args_list] == [(0.5,), (1.0,), (2.0,)]
+
+
+def test_circuit_breaker_opens_after_threshold_failures(hiera_server):
+    hiera_server.inject_faults(503, 503, 503)
+    connection = get_connection(hiera_server, retries=5, circuit_breaker=CircuitBreaker(threshold=3, reset=60))
+
+    with pytest.raises(EncError, match="Too many consecutive errors"):
+        connection.get_prefix_hiera(prefix="myprefix")
+
+    # fails fast without contacting the enc
+    with pytest.raises(EncRequestNotSentError, match="Too many consecutive errors"):
+        connection.get_prefix_hiera(prefix="myprefix")
+
+    assert len(hiera_server.requests) == 3
+
+
+def test_circuit_breaker_is_shared_per_enc_url():
+    assert enc_connection.get_circuit_breaker("http://enc-1") is enc_connection.get_circuit_breaker("http://enc-1")
+    assert enc_connection.get_circuit_breaker("http://enc-1") is not enc_connection.get_circuit_breaker("http://enc-2")
+
+
+def test_circuit_breaker_half_opens_after_reset():
+    breaker = CircuitBreaker(threshold=2, reset=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.is_open()
+
+    time.sleep(0.06)
+    # lets one request through
+    assert not breaker.is_open()
+
+    # and opens right away if it fails too
+    breaker.record_failure()
+    assert breaker.is_open()
+
+
+def test_circuit_breaker_half_open_lets_a_single_request_through():
+    breaker = CircuitBreaker(threshold=1, reset=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    barrier = threading.Barrier(10)
+    results = []
+
+    def check():
+        barrier.wait()
+        results.append(breaker.is_open())
+
+    threads = [threading.Thread(target=check) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == [False] + [True] * 9
+
+
+def test_circuit_breaker_half_open_trial_that_never_reports_back():
+    breaker = CircuitBreaker(threshold=1, reset=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert not breaker.is_open()
+    assert breaker.is_open()
+
+    # the trial got lost, let another one through
+    time.sleep(0.06)
+    assert not breaker.is_open()
+
+
+def test_circuit_breaker_closes_on_success_after_half_open():
+    breaker = CircuitBreaker(threshold=2, reset=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert not breaker.is_open()
+
+    breaker.record_success()
+    breaker.record_failure()
+    assert not breaker.is_open()
+
+
+def test_circuit_breaker_threshold_zero_never_opens():
+    breaker = CircuitBreaker(threshold=0)
+    for _ in range(10):
+        breaker.record_failure()
+
+    assert not breaker.is_open()
+
+
+def test_stats_counters(hiera_server):
+    hiera_server.inject_faults(502, 429)
+    connection = get_connection(hiera_server, retries=3)
+
+    connection.get_prefix_hiera(prefix="myprefix")
+
+    stats = connection.stats.to_dict()
+    assert stats["requests"] == 3
+    assert stats["retries"] == 2
+    assert stats["failures"] == 2
+    assert stats["cache_hits"] == 0
+    assert 0 < stats["max_latency"] <= stats["total_latency"]
+
+
+def test_requests_reuse_the_same_connection(hiera_server):
+    connection = get_connection(hiera_server)
+
+    for _ in range(5):
+        connection.get_prefix_hiera(prefix="myprefix")
+    connection.set_prefix_hiera(prefix="myprefix", data="hiera: ''")
+
+    assert len(hiera_server.requests) == 6
+    assert hiera_server.connections == 1
+
+
+def test_no_keep_alive_opens_a_connection_per_request(hiera_server):
+    connection = get_connection(hiera_server, session=enc_connection.get_session(enc_url=hiera_server.url, keep_alive=False))
+
+    for _ in range(3):
+        connection.get_prefix_hiera(prefix="myprefix")
+
+    assert hiera_server.connections == 3
+
+
+def test_sessions_are_shared_per_enc_url_and_settings():
+    session = enc_connection.get_session(enc_url="http://enc-1", pool_maxsize=4)
+
+    assert EncConnection(enc_url="http://enc-1", openstack_project="project-1", pool_maxsize=4).session is session
+    assert EncConnection(enc_url="http://enc-1", openstack_project="project-2", pool_maxsize=4).session is session
+    assert enc_connection.get_session(enc_url="http://enc-1", pool_maxsize=8) is not session
+    assert enc_connection.get_session(enc_url="http://enc-2", pool_maxsize=4) is not session
+
+
+def test_retry_after_takes_precedence_over_the_backoff():
+    assert enc_connection.get_retry_delay(attempt=3, backoff_factor=0.5, retry_after="2") == 2
+    assert 0 <= enc_connection.get_retry_delay(attempt=1, backoff_factor=0.5, retry_after="not-seconds") <= 1.0
+
+
+def test_retry_delay_is_capped():
+    assert enc_connection.get_retry_delay(attempt=0, backoff_factor=0.5, retry_after="86400", max_backoff=30) == 30
+    with mock.patch.object(enc_connection.random, "uniform", side_effect=lambda low, high: high):
+        assert enc_connection.get_retry_delay(attempt=20, backoff_factor=0.5, max_backoff=30) == 30
+
+
+def test_retry_after_is_capped_to_the_max_backoff(stub_server):
+    responses = [(429, "", {"Retry-After": "86400"}), (200, "hiera: ''\n", {})]
+    stub_server.add_route("GET", HIERA_PATH, lambda method, path, body: responses.pop(0))
+    connection = get_connection(stub_server, retries=1, max_backoff=0.01)
+
+    with mock.patch.object(enc_connection.time, "sleep") as sleep_mock:
+        connection.get_prefix_hiera(prefix="myprefix")
+
+    assert [call.args for call in sleep_mock.call_args_list] == [(0.01,)]
@@ -0,0 +1,259 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import io
+import socket
+import time
+
+import pytest
+
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.etcd import (
+    EtcdClient,
+    EtcdError,
+    EtcdGatewayClient,
+    parse_member_list,
+    probe_endpoint,
+)
+from ansible_collections.wikimedia.wmcs.tests.unit.plugins.module_utils.fake_etcd_gateway import FakeEtcdGateway
+
+# 0x5208bbf5c00e7cdf and 0xa35238e603a2372c
+MEMBER_1_ID = "5911181175087332575"
+MEMBER_2_ID = "11768531336827123500"
+
+
+def get_members():
+    return [
+        {
+            "ID": MEMBER_1_ID,
+            "name": "etcd-1",
+            "peerURLs": ["https://etcd-1:2380"],
+            "clientURLs": ["https://etcd-1:2379"],
+        },
+        {
+            "ID": MEMBER_2_ID,
+            "name": "etcd-2",
+            "peerURLs": ["https://etcd-2:2380"],
+            "clientURLs": ["https://etcd-2:2379"],
+        },
+    ]
+
+
+def get_unused_endpoint():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return "http://%s:%s" % sock.getsockname()
+
+
+@pytest.fixture
+def gateway(stub_server):
+    return FakeEtcdGateway(server=stub_server, members=get_members(), leader_id=MEMBER_2_ID)
+
+
+@pytest.fixture
+def tls_files(tmp_path):
+    # not loaded over http, but they have to exist
+    for name in ("cert.pem", "key.pem", "ca.pem"):
+        (tmp_path / name).write_text("")
+
+    return {
+        "cert_file": str(tmp_path / "cert.pem"),
+        "key_file": str(tmp_path / "key.pem"),
+        "ca_file": str(tmp_path / "ca.pem"),
+    }
+
+
+def get_client(endpoints, tls_files):
+    return EtcdGatewayClient(endpoints=endpoints, **tls_files)
+
+
+def test_get_members_normalizes_the_ids(gateway, tls_files):
+    client = get_client(gateway.server.url, tls_files)
+
+    assert client.get_members() == [
+        {
+            "ID": "5208bbf5c00e7cdf",
+            "name": "etcd-1",
+            "peerURLs": ["https://etcd-1:2380"],
+            "clientURLs": ["https://etcd-1:2379"],
+        },
+        {
+            "ID": "a35238e603a2372c",
+            "name": "etcd-2",
+            "peerURLs": ["https://etcd-2:2380"],
+            "clientURLs": ["https://etcd-2:2379"],
+        },
+    ]
+    assert client.get_leader_id() == "a35238e603a2372c"
+
+
+@pytest.mark.parametrize(
+    "version, api_prefix",
+    [("3.5.0", "/v3"), ("3.4.15", "/v3"), ("3.3.11", "/v3beta"), ("3.2.26", "/v3alpha")],
+)
+def test_api_prefix_depends_on_the_version(stub_server, tls_files, version, api_prefix):
+    FakeEtcdGateway(server=stub_server, members=get_members(), version=version, api_prefix=api_prefix)
+    client = get_client(stub_server.url, tls_files)
+
+    assert client.api_prefix == api_prefix
+    assert len(client.get_members()) == 2
+
+
+def test_old_etcd_is_rejected(stub_server, tls_files):
+    FakeEtcdGateway(server=stub_server, members=get_members(), version="3.1.0")
+    client = get_client(stub_server.url, tls_files)
+
+    with pytest.raises(EtcdError, match="needs etcd >= 3.2"):
+        client.api_prefix
+
+
+def test_member_mutations(gateway, tls_files):
+    client = get_client(gateway.server.url, tls_files)
+
+    new_member, _ = client.add_member(name="etcd-3", peer_url="https://etcd-3:2380")
+    client.update_member(member_id="5208bbf5c00e7cdf", peer_url="https://etcd-1:2381")
+    client.remove_member(member_id="a35238e603a2372c")
+
+    assert new_member == {"ID": "a0", "name": "", "peerURLs": ["https://etcd-3:2380"], "clientURLs": []}
+    assert [(member["ID"], member["peerURLs"]) for member in client.get_members()] == [
+        ("5208bbf5c00e7cdf", ["https://etcd-1:2381"]),
+        ("a0", ["https://etcd-3:2380"]),
+    ]
+    assert [member["ID"] for member in gateway.members] == [MEMBER_1_ID, "160"]
+
+
+def test_all_the_requests_reuse_the_same_connection(gateway, tls_files):
+    client = get_client(gateway.server.url, tls_files)
+
+    client.get_members()
+    new_member, _ = client.add_member(name="etcd-3", peer_url="https://etcd-3:2380")
+    client.update_member(member_id=new_member["ID"], peer_url="https://etcd-3:2381")
+    client.remove_member(member_id=new_member["ID"])
+    client.get_leader_id()
+
+    # the version request and the 5 operations
+    assert len(gateway.server.requests) == 6
+    assert gateway.server.connections == 1
+
+
+def test_dead_endpoints_are_skipped(gateway, tls_files):
+    dead_endpoint = get_unused_endpoint()
+    client = get_client(f"{dead_endpoint},{gateway.server.url}", tls_files)
+
+    assert len(client.get_members()) == 2
+    # remembers the one that works
+    assert client.endpoints[client._current_endpoint] == gateway.server.url
+
+
+def test_no_endpoint_available(tls_files):
+    client = get_client(get_unused_endpoint(), tls_files)
+
+    with pytest.raises(EtcdError, match="Unable to contact any etcd endpoint"):
+        client.get_members()
+
+
+def test_probe_endpoint(gateway, tls_files):
+    result = probe_endpoint(endpoint=gateway.server.url, timeout=5, **tls_files)
+
+    assert result["error"] is None
+    assert result["healthy"]
+    assert result["leader"] == "a35238e603a2372c"
+
+
+def test_probe_endpoint_deadline_covers_all_the_requests(gateway, tls_files):
+    def slow(route):
+        def _handle(method, path, body):
+            time.sleep(0.3)
+            return route(method, path, body) if callable(route) else route
+
+        return _handle
+
+    routes = gateway.server.routes
+    for key in (("GET", "/version"), ("GET", "/health"), ("POST", "/v3/maintenance/status")):
+        routes[key] = slow(routes[key])
+
+    result = probe_endpoint(endpoint=gateway.server.url, timeout=0.5, **tls_files)
+
+    assert not result["healthy"]
+    # each request alone is under the timeout, but not all three together
+    assert result["elapsed"] < 0.75
+
+
+def test_incomplete_clients_fail_when_built():
+    class IncompleteClient(EtcdClient):
+        def get_members(self):
+            return []
+
+    with pytest.raises(TypeError, match="remove_member"):
+        IncompleteClient()
+
+
+def test_error_responses_raise(stub_server, tls_files):
+    FakeEtcdGateway(server=stub_server, members=get_members())
+    stub_server.inject_faults(None, 500)
+    client = get_client(stub_server.url, tls_files)
+
+    with pytest.raises(EtcdError, match="failed: 500"):
+        client.get_members()
+
+
+MEMBER_LIST_OUTPUT = (
+    "5208bbf5c00e7cdf: name=etcd-1 peerURLs=https://etcd-1:2380 clientURLs=https://etcd-1:2379 isLeader=true\n"
+    "a35238e603a2372c[unstarted]: peerURLs=https://etcd-2:2380\n"
+    "\n"
+    "1234: name=etcd-3 peerURLs=https://etcd-3:2380 clientURLs=https://etcd-3:2379/?a=b isLeader=false\n"
+)
+
+
+def parse_to_dict(lines):
+    return {record.member_id: record.to_dict() for record in parse_member_list(lines)}
+
+
+def test_parse_member_list():
+    assert parse_to_dict(MEMBER_LIST_OUTPUT) == {
+        "5208bbf5c00e7cdf": {
+            "member_id": "5208bbf5c00e7cdf",
+            "status": "up",
+            "name": "etcd-1",
+            "peerURLs": "https://etcd-1:2380",
+            "clientURLs": "https://etcd-1:2379",
+            "isLeader": True,
+        },
+        "a35238e603a2372c": {
+            "member_id": "a35238e603a2372c",
+            "status": "unstarted",
+            "peerURLs": "https://etcd-2:2380",
+        },
+        # digit only ids are still ids, not ints, and values can have '='
+        "1234": {
+            "member_id": "1234",
+            "status": "up",
+            "name": "etcd-3",
+            "peerURLs": "https://etcd-3:2380",
+            "clientURLs": "https://etcd-3:2379/?a=b",
+            "isLeader": False,
+        },
+    }
+
+
+def test_parse_member_list_streams_files():
+    # file lines keep the trailing newline
+    assert parse_to_dict(io.StringIO(MEMBER_LIST_OUTPUT)) == parse_to_dict(MEMBER_LIST_OUTPUT)
+
+
+def test_member_record_converts_values_on_get():
+    record = next(parse_member_list(MEMBER_LIST_OUTPUT))
+
+    assert record.raw_fields["isLeader"] == "true"
+    assert record.get("isLeader") is True
+    assert record.get("missing", "default") == "default"
+
+
+@pytest.mark.parametrize(
+    "line, error",
+    [
+        ("not a member line", "Unable to parse etcdctl member line"),
+        ("5208bbf5c00e7cdf: name=etcd-1 clientURLs=https://etcd-1:2379", "missing peerURLs"),
+    ],
+)
+def test_parse_member_list_rejects_malformed_lines(line, error):
+    with pytest.raises(EtcdError, match=error):
+        list(parse_member_list(MEMBER_LIST_OUTPUT + line + "\n"))
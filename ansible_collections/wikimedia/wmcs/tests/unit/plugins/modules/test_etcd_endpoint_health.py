@@ -0,0 +1,50 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import json
+
+import pytest
+from ansible.module_utils.testing import patch_module_args
+
+from ansible_collections.wikimedia.wmcs.plugins.modules import etcd_endpoint_health
+from ansible_collections.wikimedia.wmcs.tests.unit.plugins.module_utils.fake_etcd_gateway import FakeEtcdGateway
+
+
+def run_module(capsys, tmp_path, endpoints, **args):
+    # not loaded over http, but they have to exist
+    for name in ("cert.pem", "key.pem", "ca.pem"):
+        (tmp_path / name).write_text("")
+    module_args = {
+        "endpoints": endpoints,
+        "cert_file": str(tmp_path / "cert.pem"),
+        "key_file": str(tmp_path / "key.pem"),
+        "ca_file": str(tmp_path / "ca.pem"),
+        "discover_members": False,
+    }
+    module_args.update(args)
+    with patch_module_args(module_args):
+        with pytest.raises(SystemExit):
+            etcd_endpoint_health.main()
+
+    return json.loads(capsys.readouterr().out)
+
+
+def test_probes_the_endpoints(capsys, tmp_path, stub_server):
+    FakeEtcdGateway(
+        server=stub_server,
+        members=[{"ID": "1", "name": "etcd-1", "peerURLs": ["https://etcd-1:2380"], "clientURLs": [stub_server.url]}],
+        leader_id="1",
+    )
+
+    result = run_module(capsys, tmp_path, stub_server.url)
+
+    assert not result.get("failed"), result
+    assert result["healthy"]
+    assert result["leader"] == "1"
+
+
+def test_max_workers_lower_than_one_is_rejected(capsys, tmp_path, stub_server):
+    result = run_module(capsys, tmp_path, stub_server.url, max_workers=0)
+
+    assert result["failed"]
+    assert result["msg"] == "max_workers must be at least 1, got 0"
+    assert not stub_server.requests
@@ -0,0 +1,230 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import json
+from unittest import mock
+
+import pytest
+from ansible.module_utils.testing import patch_module_args
+
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.etcd import EtcdClient, EtcdError
+from ansible_collections.wikimedia.wmcs.plugins.modules import etcd_members
+
+
+def get_member(member_id, fqdn):
+    return {
+        "ID": member_id,
+        "name": fqdn,
+        "peerURLs": [f"https://{fqdn}:2380"],
+        "clientURLs": [f"https://{fqdn}:2379"],
+    }
+
+
+class FakeEtcdClient(EtcdClient):
+    """
+    In memory cluster that stops answering once the member it talks to is
+    removed, new members start right away.
+    """
+
+    def __init__(self, members, endpoint_id, leader_id):
+        self.members = members
+        self.endpoint_id = endpoint_id
+        self.leader_id = leader_id
+        self.next_id = 0xa0
+
+    def _check_endpoint(self):
+        if not any(member["ID"] == self.endpoint_id for member in self.members):
+            raise EtcdError("connection refused")
+
+    def get_members(self):
+        self._check_endpoint()
+        return [dict(member) for member in self.members]
+
+    def get_leader_id(self):
+        self._check_endpoint()
+        return self.leader_id
+
+    def is_member_healthy(self, member):
+        return True
+
+    def add_member(self, name, peer_url):
+        self._check_endpoint()
+        member_id = f"{self.next_id:x}"
+        self.next_id += 1
+        self.members.append(get_member(member_id, name))
+        return {"ID": member_id, "name": "", "peerURLs": [peer_url], "clientURLs": []}, "added"
+
+    def update_member(self, member_id, peer_url):
+        self._check_endpoint()
+        next(member for member in self.members if member["ID"] == member_id)["peerURLs"] = [peer_url]
+        return "updated"
+
+    def remove_member(self, member_id):
+        self._check_endpoint()
+        self.members = [member for member in self.members if member["ID"] != member_id]
+        return "removed"
+
+
+def run_module(capsys, client, args):
+    module_args = {
+        "endpoints": "https://etcd-1:2379",
+        "cert_file": "/tmp/cert.pem",
+        "key_file": "/tmp/key.pem",
+        "wait_for": "started",
+    }
+    module_args.update(args)
+    with patch_module_args(module_args), mock.patch.object(etcd_members, "get_etcd_client", return_value=client):
+        with pytest.raises(SystemExit):
+            etcd_members.main()
+
+    return json.loads(capsys.readouterr().out)
+
+
+def test_get_plan_removes_the_endpoint_and_leader_last():
+    current_members = [get_member("1", "etcd-1"), get_member("2", "etcd-2"), get_member("3", "etcd-3")]
+    desired_members = [
+        {"fqdn": fqdn, "peer_url": f"https://{fqdn}:2380"}
+        for fqdn in ("etcd-4", "etcd-5", "etcd-6")
+    ]
+
+    plan = etcd_members.get_plan(
+        current_members=current_members,
+        desired_members=desired_members,
+        remove_unlisted=True,
+        endpoints=["https://etcd-1:2379"],
+        leader_id="2",
+    )
+
+    assert [(step["action"], step["name"]) for step in plan] == [
+        ("add", "etcd-4"),
+        ("remove", "etcd-3"),
+        ("add", "etcd-5"),
+        ("add", "etcd-6"),
+        ("remove", "etcd-2"),
+        ("remove", "etcd-1"),
+    ]
+
+
+def test_get_plan_removes_unstarted_members_before_updating():
+    unstarted_member = {"ID": "3", "name": "", "peerURLs": ["https://etcd-3:2380"], "clientURLs": []}
+    current_members = [get_member("1", "etcd-1"), get_member("2", "etcd-2"), unstarted_member]
+    desired_members = [
+        {"fqdn": "etcd-1", "peer_url": "https://etcd-1:2380"},
+        {"fqdn": "etcd-2", "peer_url": "https://etcd-2:2381"},
+    ]
+
+    plan = etcd_members.get_plan(
+        current_members=current_members,
+        desired_members=desired_members,
+        remove_unlisted=True,
+        endpoints=["https://etcd-1:2379"],
+        leader_id="1",
+    )
+
+    assert [(step["action"], step["member_id"]) for step in plan] == [("remove", "3"), ("update", "2")]
+
+
+def test_get_applied_members():
+    current_members = [get_member("1", "etcd-1"), get_member("2", "etcd-2")]
+    results = [
+        {"action": "add", "member_id": "a0", "name": "etcd-3", "peer_url": "https://etcd-3:2380"},
+        {"action": "update", "member_id": "2", "name": "etcd-2", "peer_url": "https://etcd-2:2381"},
+        {"action": "remove", "member_id": "1", "name": "etcd-1", "peer_url": "https://etcd-1:2380"},
+    ]
+
+    members, leader_id = etcd_members.get_applied_members(
+        current_members=current_members,
+        leader_id="1",
+        results=results,
+    )
+
+    assert members == [
+        dict(get_member("2", "etcd-2"), peerURLs=["https://etcd-2:2381"]),
+        {"ID": "a0", "name": "", "peerURLs": ["https://etcd-3:2380"], "clientURLs": []},
+    ]
+    # the leader was removed
+    assert leader_id is None
+
+
+def test_main_dropping_the_endpoint_member(capsys):
+    client = FakeEtcdClient(
+        members=[get_member("1", "etcd-1"), get_member("2", "etcd-2"), get_member("3", "etcd-3")],
+        endpoint_id="1",
+        leader_id="1",
+    )
+
+    result = run_module(
+        capsys,
+        client,
+        {"members": [{"fqdn": "etcd-2"}, {"fqdn": "etcd-3"}, {"fqdn": "etcd-4"}]},
+    )
+
+    assert not result.get("failed"), result
+    assert result["changed"]
+    assert [(step["action"], step["name"]) for step in result["results"]] == [("add", "etcd-4"), ("remove", "etcd-1")]
+    assert sorted(result["members"]) == ["2", "3", "a0"]
+    assert result["members"]["a0"]["status"] == "unstarted"
+    assert not any(member["isLeader"] for member in result["members"].values())
+
+
+def test_main_with_more_additions_than_removals(capsys):
+    client = FakeEtcdClient(
+        members=[get_member("1", "etcd-1"), get_member("2", "etcd-2"), get_member("3", "etcd-3")],
+        endpoint_id="1",
+        leader_id="2",
+    )
+
+    result = run_module(
+        capsys,
+        client,
+        {
+            "members": [{"fqdn": "etcd-2"}, {"fqdn": "etcd-3"}, {"fqdn": "etcd-4"}, {"fqdn": "etcd-5"}],
+            "wait_timeout": 1,
+        },
+    )
+
+    assert not result.get("failed"), result
+    assert [(step["action"], step["name"]) for step in result["results"]] == [
+        ("add", "etcd-4"),
+        ("add", "etcd-5"),
+        ("remove", "etcd-1"),
+    ]
+    assert sorted(result["members"]) == ["2", "3", "a0", "a1"]
+
+
+def test_main_updating_with_unstarted_members_to_remove(capsys):
+    unstarted_member = {"ID": "3", "name": "", "peerURLs": ["https://etcd-3:2380"], "clientURLs": []}
+    client = FakeEtcdClient(
+        members=[get_member("1", "etcd-1"), get_member("2", "etcd-2"), unstarted_member],
+        endpoint_id="1",
+        leader_id="1",
+    )
+
+    result = run_module(
+        capsys,
+        client,
+        {
+            "members": [{"fqdn": "etcd-1"}, {"fqdn": "etcd-2", "peer_url": "https://etcd-2:2381"}],
+            "wait_timeout": 1,
+        },
+    )
+
+    assert not result.get("failed"), result
+    assert [(step["action"], step["member_id"]) for step in result["results"]] == [("remove", "3"), ("update", "2")]
+    assert client.members == [
+        get_member("1", "etcd-1"),
+        dict(get_member("2", "etcd-2"), peerURLs=["https://etcd-2:2381"]),
+    ]
+
+
+def test_main_check_mode_does_not_change_anything(capsys):
+    client = FakeEtcdClient(members=[get_member("1", "etcd-1")], endpoint_id="1", leader_id="1")
+
+    result = run_module(
+        capsys,
+        client,
+        {"members": [{"fqdn": "etcd-1"}, {"fqdn": "etcd-2"}], "_ansible_check_mode": True},
+    )
+
+    assert result["changed"]
+    assert [step["action"] for step in result["plan"]] == ["add"]
+    assert [member["ID"] for member in client.members] == ["1"]
@@ -0,0 +1,91 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import json
+
+import pytest
+from ansible.module_utils.testing import patch_module_args
+
+from ansible_collections.wikimedia.wmcs.plugins.modules import k8s_control_apiserver_etcd_servers
+
+MANIFEST = b"""apiVersion: v1
+kind: Pod
+spec:
+  containers:
+  - command:
+    - kube-apiserver
+    # the etcd cluster
+    - "--etcd-servers=https://etcd-1:2379,https://etcd-2:2379"
+    - --etcd-prefix=/registry
+"""
+
+
+def run_module(capsys, args):
+    with patch_module_args(args):
+        with pytest.raises(SystemExit):
+            k8s_control_apiserver_etcd_servers.main()
+
+    return json.loads(capsys.readouterr().out)
+
+
+def test_replace_etcd_servers_arg_keeps_the_rest_of_the_manifest():
+    old_arg, new_manifest = k8s_control_apiserver_etcd_servers.replace_etcd_servers_arg(
+        manifest=MANIFEST,
+        new_arg="--etcd-servers=https://etcd-3:2379",
+    )
+
+    assert old_arg == "--etcd-servers=https://etcd-1:2379,https://etcd-2:2379"
+    assert new_manifest == MANIFEST.replace(
+        b"https://etcd-1:2379,https://etcd-2:2379", b"https://etcd-3:2379"
+    )
+
+
+def test_replace_etcd_servers_arg_needs_exactly_one_arg():
+    manifest = MANIFEST + b"    - --etcd-servers=https://etcd-4:2379\n"
+
+    assert k8s_control_apiserver_etcd_servers.replace_etcd_servers_arg(
+        manifest=manifest, new_arg="--etcd-servers=https://etcd-3:2379"
+    ) == (None, None)
+
+
+def test_main_fails_cleanly_if_the_manifest_does_not_exist(capsys, tmp_path):
+    result = run_module(
+        capsys,
+        {"etcd_members": ["https://etcd-3:2379"], "apiserver_yaml_path": str(tmp_path / "missing.yaml")},
+    )
+
+    assert result["failed"]
+    assert result["msg"].endswith("missing.yaml does not exist.")
+
+
+def test_main_fails_cleanly_without_exactly_one_arg(capsys, tmp_path):
+    manifest_path = tmp_path / "kube-apiserver.yaml"
+    manifest_path.write_bytes(b"spec: {}\n")
+
+    result = run_module(
+        capsys,
+        {"etcd_members": ["https://etcd-3:2379"], "apiserver_yaml_path": str(manifest_path)},
+    )
+
+    assert result["failed"]
+    assert not result["changed"]
+    assert "Unable to find exactly one etcd-servers command arg" in result["msg"]
+
+
+def test_main_rewrites_only_the_arg(capsys, tmp_path):
+    manifest_path = tmp_path / "kube-apiserver.yaml"
+    manifest_path.write_bytes(MANIFEST)
+
+    result = run_module(
+        capsys,
+        {
+            "etcd_members": ["https://etcd-3:2379", "https://etcd-2:2379"],
+            "apiserver_yaml_path": str(manifest_path),
+        },
+    )
+
+    assert result["changed"]
+    assert result["new_members"] == "--etcd-servers=https://etcd-2:2379,https://etcd-3:2379"
+    assert manifest_path.read_bytes() == MANIFEST.replace(
+        b"https://etcd-1:2379,https://etcd-2:2379", b"https://etcd-2:2379,https://etcd-3:2379"
+    )
+    assert [path.name for path in tmp_path.iterdir()] == ["kube-apiserver.yaml"]
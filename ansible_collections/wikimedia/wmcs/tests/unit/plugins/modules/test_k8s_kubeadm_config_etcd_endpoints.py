@@ -0,0 +1,84 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import json
+from unittest import mock
+
+import pytest
+import yaml
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.testing import patch_module_args
+
+from ansible_collections.wikimedia.wmcs.plugins.modules import k8s_kubeadm_config_etcd_endpoints
+
+CLUSTER_CONFIGURATION = """apiVersion: kubeadm.k8s.io/v1beta3
+kind: ClusterConfiguration
+clusterName: toolforge
+etcd:
+  external:
+    caFile: /etc/kubernetes/pki/etcd/ca.crt
+    endpoints:
+    - https://etcd-2:2379
+    - https://etcd-1:2379
+kubernetesVersion: v1.24.17
+"""
+
+
+def get_configmap():
+    return {
+        "apiVersion": "v1",
+        "kind": "ConfigMap",
+        "metadata": {"name": "kubeadm-config", "namespace": "kube-system", "resourceVersion": "1234"},
+        "data": {"ClusterConfiguration": CLUSTER_CONFIGURATION, "ClusterStatus": "apiEndpoints: {}\n"},
+    }
+
+
+def run_module(capsys, etcd_members, check_mode=False):
+    calls = []
+
+    def run_command(args, data=None, **kwargs):
+        calls.append((args, data))
+        if "get" in args:
+            return 0, json.dumps(get_configmap()), ""
+
+        return 0, "configmap/kubeadm-config replaced", ""
+
+    module_args = {"etcd_members": etcd_members, "_ansible_check_mode": check_mode}
+    with patch_module_args(module_args), mock.patch.object(AnsibleModule, "run_command", side_effect=run_command):
+        with pytest.raises(SystemExit):
+            k8s_kubeadm_config_etcd_endpoints.main()
+
+    return json.loads(capsys.readouterr().out), calls
+
+
+def test_unchanged_endpoints_are_not_replaced(capsys):
+    result, calls = run_module(capsys, ["https://etcd-1:2379", "https://etcd-2:2379"])
+
+    assert not result.get("failed"), result
+    assert not result["changed"]
+    assert [args[2:] for args, _ in calls] == [["get", "configmap", "kubeadm-config", "--output=json"]]
+
+
+def test_check_mode_does_not_replace(capsys):
+    result, calls = run_module(capsys, ["https://etcd-1:2379", "https://etcd-3:2379"], check_mode=True)
+
+    assert result["changed"]
+    assert result["new_endpoints"] == ["https://etcd-1:2379", "https://etcd-3:2379"]
+    assert len(calls) == 1
+
+
+def test_replace_keeps_the_rest_of_the_configmap(capsys):
+    result, calls = run_module(capsys, ["https://etcd-3:2379", "https://etcd-1:2379"])
+
+    assert result["changed"]
+    assert result["old_endpoints"] == ["https://etcd-2:2379", "https://etcd-1:2379"]
+    replace_args, replace_data = calls[-1]
+    assert replace_args == ["kubectl", "--namespace=kube-system", "replace", "--filename=-"]
+
+    new_configmap = json.loads(replace_data)
+    new_cluster_config = yaml.safe_load(new_configmap.pop("data").pop("ClusterConfiguration"))
+    expected_configmap = get_configmap()
+    expected_cluster_config = yaml.safe_load(expected_configmap.pop("data").pop("ClusterConfiguration"))
+    expected_cluster_config["etcd"]["external"]["endpoints"] = ["https://etcd-1:2379", "https://etcd-3:2379"]
+    # the resource version is kept, so the replace fails if it changed in between
+    assert new_configmap == expected_configmap
+    assert new_cluster_config == expected_cluster_config
@@ -0,0 +1,37 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import json
+
+import pytest
+from ansible.module_utils.testing import patch_module_args
+
+from ansible_collections.wikimedia.wmcs.plugins.modules import node_enc_consolidated_info
+
+
+def run_module(capsys, stub_server, args):
+    module_args = {"enc_url": stub_server.url, "openstack_project": "testproject"}
+    module_args.update(args)
+    with patch_module_args(module_args):
+        with pytest.raises(SystemExit):
+            node_enc_consolidated_info.main()
+
+    return json.loads(capsys.readouterr().out)
+
+
+def test_fetches_many_nodes(capsys, stub_server):
+    stub_server.add_route("GET", "/testproject/node/node-1", (200, "hiera: {key: node-1}\nroles: []\n", {}))
+
+    result = run_module(capsys, stub_server, {"fqdns": ["node-1", "missing"], "max_workers": 2})
+
+    assert not result.get("failed"), result
+    assert result["enc_data"] == {"node-1": {"hiera": {"key": "node-1"}, "roles": []}}
+    assert list(result["errors"]) == ["missing"]
+
+
+@pytest.mark.parametrize("max_workers", [0, -1])
+def test_max_workers_lower_than_one_is_rejected(capsys, stub_server, max_workers):
+    result = run_module(capsys, stub_server, {"fqdns": ["node-1"], "max_workers": max_workers})
+
+    assert result["failed"]
+    assert result["msg"] == f"max_workers must be at least 1, got {max_workers}"
+    assert not stub_server.requests
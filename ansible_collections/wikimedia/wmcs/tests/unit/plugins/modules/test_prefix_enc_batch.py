@@ -0,0 +1,71 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+import json
+from unittest import mock
+
+import pytest
+from ansible.module_utils.testing import patch_module_args
+
+from ansible_collections.wikimedia.wmcs.plugins.module_utils.enc_connection import EncRequestNotSentError
+from ansible_collections.wikimedia.wmcs.plugins.modules import prefix_enc_batch
+
+OPERATIONS = [{"op": "append_unique", "key": "nodes", "value": "etcd-4"}]
+
+
+@pytest.fixture
+def enc_server(stub_server):
+    for prefix in ("ok", "broken"):
+        stub_server.add_route("GET", f"/testproject/prefix/{prefix}/hiera", (200, "hiera: 'nodes: [etcd-1]'\n", {}))
+    stub_server.add_route("POST", "/testproject/prefix/ok/hiera", (200, "{}", {}))
+    stub_server.add_route("POST", "/testproject/prefix/broken/hiera", (500, "", {}))
+    return stub_server
+
+
+def run_module(capsys, enc_server, prefixes, **args):
+    module_args = {
+        "enc_url": enc_server.url,
+        "openstack_project": "testproject",
+        "prefixes": prefixes,
+        "enc_backoff_factor": 0,
+    }
+    module_args.update(args)
+    with patch_module_args(module_args):
+        with pytest.raises(SystemExit):
+            prefix_enc_batch.main()
+
+    return json.loads(capsys.readouterr().out)
+
+
+def test_updates_the_prefixes(capsys, enc_server):
+    result = run_module(capsys, enc_server, {"ok": OPERATIONS})
+
+    assert not result.get("failed"), result
+    assert result["changed"]
+    assert result["prefixes"]["ok"] == {"changed": True, "hiera": {"nodes": ["etcd-1", "etcd-4"]}}
+
+
+def test_failed_update_might_have_been_applied(capsys, enc_server):
+    result = run_module(capsys, enc_server, {"ok": OPERATIONS, "broken": OPERATIONS})
+
+    assert result["failed"]
+    assert result["changed"]
+    assert result["prefixes"]["broken"]["changed"]
+    assert "Unable to set prefix data" in result["prefixes"]["broken"]["error"]
+
+
+def test_update_not_sent_is_not_changed(capsys, enc_server):
+    with mock.patch.object(prefix_enc_batch, "set_new_hiera", side_effect=EncRequestNotSentError("not sent")):
+        result = run_module(capsys, enc_server, {"ok": OPERATIONS})
+
+    assert result["failed"]
+    assert not result["changed"]
+    assert result["prefixes"]["ok"]["changed"] is False
+    assert result["prefixes"]["ok"]["error"] == "not sent"
+
+
+def test_max_workers_lower_than_one_is_rejected(capsys, enc_server):
+    result = run_module(capsys, enc_server, {"ok": OPERATIONS}, max_workers=0)
+
+    assert result["failed"]
+    assert result["msg"] == "max_workers must be at least 1, got 0"
+    assert not enc_server.requests